@@ -6,6 +6,7 @@ from infra.libs.git2.util import INVALID
 from infra.libs.git2.util import CalledProcessError
 
 from infra.libs.git2.commit import Commit
+from infra.libs.git2.commit_cache import CommitCache
 from infra.libs.git2.ref import Ref
 
 from infra.libs.git2.repo import Repo
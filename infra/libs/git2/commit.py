@@ -17,13 +17,16 @@ LOGGER = logging.getLogger(__name__)
 class Commit(object):
   """Represents the identity of a commit in a git repo."""
 
-  def __init__(self, repo, hsh):
+  def __init__(self, repo, hsh, data=None):
     """
     @type repo: Repo
+    @type data: CommitData, if already known (e.g. read in bulk by the Repo).
     """
     assert CommitData.HASH_RE.match(hsh)
     self._repo = repo
     self._hsh = hsh
+    if data is not None:
+      self._data = data
 
   # Comparison & Representation
   def __eq__(self, other):
@@ -48,10 +51,17 @@ class Commit(object):
   @cached_property
   def data(self):
     """Get a structured data representation of this commit."""
-    try:
-      raw_data = self.repo.run('cat-file', 'commit', self.hsh)
-    except CalledProcessError:
+    obj = self.repo.read_object(self.hsh)
+    if obj is None:
       return INVALID
+    if obj.typ == 'commit':
+      raw_data = obj.data
+    else:
+      # Let git peel tags (or reject other object types) for us.
+      try:
+        raw_data = self.repo.run('cat-file', 'commit', self.hsh)
+      except CalledProcessError:
+        return INVALID
     return CommitData.from_raw(raw_data)
 
   @cached_property
@@ -67,14 +77,15 @@ class Commit(object):
     return self.repo.get_commit(parents[0]) if parents else None
 
   # Methods
-  def alter(self, **kwargs):
+  def alter(self, defer=False, **kwargs):
     """Get a new Commit which is the same as this one, except for alterations
     specified by kwargs.
 
-    This will intern the new Commit object into the Repo.
+    This will intern the new Commit object into the Repo. If ``defer`` is True,
+    the object is queued and written in bulk later (see ``Repo.intern``).
     """
     return self.repo.get_commit(
-        self.repo.intern(self.data.alter(**kwargs), 'commit'))
+        self.repo.intern(self.data.alter(**kwargs), 'commit', defer=defer))
 
   def notes(self, ref='refs/notes/commits'):
     """Get git-notes content for this commit"""
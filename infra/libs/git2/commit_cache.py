@@ -0,0 +1,166 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import collections
+import errno
+import logging
+import os
+import tempfile
+import threading
+
+from infra.libs.git2.data import CommitData
+from infra_libs import ts_mon
+
+LOGGER = logging.getLogger(__name__)
+
+
+hits = ts_mon.CounterMetric('git2/commit_cache/hits',
+    description='Number of Repo.get_commit lookups served from the cache, '
+                'by tier (memory or disk)')
+misses = ts_mon.CounterMetric('git2/commit_cache/misses',
+    description='Number of Repo.get_commit lookups which missed the cache, '
+                'by tier (memory or disk)')
+evictions = ts_mon.CounterMetric('git2/commit_cache/evictions',
+    description='Number of commits evicted from the in-memory commit cache')
+
+
+class CommitCache(object):
+  """A thread-safe LRU cache of Commit objects for a Repo.
+
+  The in-memory tier is bounded by ``max_entries`` and, optionally, by
+  ``max_bytes`` (measured as the size of the raw commit objects). Whichever
+  bound is hit first triggers eviction of the least-recently-used commits.
+
+  Since commits are immutable, the cache may also be backed by an on-disk
+  tier (``persist_dir``) which stores the raw commit objects keyed by hash.
+  This survives process restarts, so that a restarted service doesn't have to
+  re-read its working set from git.
+
+  Hit, miss and eviction counts are reported via ts_mon.
+  """
+  DEFAULT_MAX_ENTRIES = 1024
+
+  def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None,
+               persist_dir=None):
+    """
+    Args:
+      max_entries (int): Maximum number of commits kept in memory.
+      max_bytes (int): If set, the maximum total size (in bytes of raw commit
+        data) of the commits kept in memory.
+      persist_dir (str): If set, a directory in which to persist commits
+        between runs.
+    """
+    assert max_entries > 0
+    assert max_bytes is None or max_bytes > 0
+    self._max_entries = max_entries
+    self._max_bytes = max_bytes
+    self._persist_dir = persist_dir
+
+    self._lock = threading.Lock()
+    self._entries = collections.OrderedDict()  # {hsh: (Commit, size)}
+    self._bytes = 0
+    self._persisted = set()
+
+  # Accessors
+  # pylint: disable=W0212
+  max_entries = property(lambda self: self._max_entries)
+  max_bytes = property(lambda self: self._max_bytes)
+  persist_dir = property(lambda self: self._persist_dir)
+  size_bytes = property(lambda self: self._bytes)
+
+  def __contains__(self, hsh):
+    return hsh in self._entries
+
+  def __len__(self):
+    return len(self._entries)
+
+  def keys(self):
+    """Returns the cached hashes, least-recently-used first."""
+    with self._lock:
+      return self._entries.keys()
+
+  def clear(self):
+    """Drops the in-memory tier (the on-disk tier is kept)."""
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+
+  def get(self, hsh):
+    """Returns the cached Commit for ``hsh`` (marking it as recently used), or
+    None.
+    """
+    with self._lock:
+      entry = self._entries.pop(hsh, None)
+      if entry is None:
+        misses.increment({'tier': 'memory'})
+        return None
+      self._entries[hsh] = entry
+    hits.increment({'tier': 'memory'})
+    return entry[0]
+
+  def put(self, commit):
+    """Adds ``commit`` (whose data must exist) as the most-recently-used entry,
+    evicting other entries as necessary, and persists it if enabled."""
+    raw = str(commit.data)
+    size = len(raw)
+    evicted = 0
+    with self._lock:
+      old = self._entries.pop(commit.hsh, None)
+      if old is not None:
+        self._bytes -= old[1]
+      self._entries[commit.hsh] = (commit, size)
+      self._bytes += size
+      while len(self._entries) > 1 and (
+          len(self._entries) > self._max_entries or
+          (self._max_bytes is not None and self._bytes > self._max_bytes)):
+        _, (_, old_size) = self._entries.popitem(last=False)
+        self._bytes -= old_size
+        evicted += 1
+    if evicted:
+      evictions.increment_by(evicted)
+    if self._persist_dir is not None:
+      self._persist(commit.hsh, raw)
+
+  def load(self, hsh):
+    """Returns the CommitData for ``hsh`` from the on-disk tier, or None."""
+    if self._persist_dir is None:
+      return None
+    try:
+      with open(self._path_for(hsh), 'rb') as f:
+        raw = f.read()
+    except IOError as e:
+      if e.errno != errno.ENOENT:  # pragma: no cover
+        LOGGER.warning('Could not read persisted commit %s: %s', hsh, e)
+      misses.increment({'tier': 'disk'})
+      return None
+    hits.increment({'tier': 'disk'})
+    with self._lock:
+      self._persisted.add(hsh)
+    return CommitData.from_raw(raw)
+
+  def _path_for(self, hsh):
+    return os.path.join(self._persist_dir, hsh[:2], hsh[2:])
+
+  def _persist(self, hsh, raw):
+    with self._lock:
+      if hsh in self._persisted:
+        return
+      self._persisted.add(hsh)
+    path = self._path_for(hsh)
+    if os.path.exists(path):
+      return
+    try:
+      dirname = os.path.dirname(path)
+      try:
+        os.makedirs(dirname)
+      except OSError as e:
+        if e.errno != errno.EEXIST:
+          raise  # pragma: no cover
+      # Write + rename so that concurrent readers never see a partial object.
+      fd, tmp_path = tempfile.mkstemp(dir=dirname)
+      with os.fdopen(fd, 'wb') as f:
+        f.write(raw)
+      os.rename(tmp_path, path)
+    except (IOError, OSError):  # pragma: no cover
+      LOGGER.exception('Could not persist commit %s', hsh)
@@ -0,0 +1,182 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import collections
+import errno
+import logging
+import subprocess
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+
+#: Result of ``ObjectReader.info``.
+ObjectInfo = collections.namedtuple('ObjectInfo', 'hsh typ size')
+
+#: Result of ``ObjectReader.read``.
+GitObject = collections.namedtuple('GitObject', 'hsh typ data')
+
+
+class ObjectReaderError(Exception):
+  """Raised when a `git cat-file` coprocess keeps failing after a restart."""
+
+
+def parse_batch_output(raw):
+  """Parses the complete output of a one-shot `git cat-file --batch`.
+
+  Yields a GitObject for every object name fed to git, in order, or None for
+  names which were missing (or ambiguous).
+  """
+  pos = 0
+  while pos < len(raw):
+    eol = raw.index('\n', pos)
+    header = raw[pos:eol + 1]
+    pos = eol + 1
+    if header.endswith((' missing\n', ' ambiguous\n')):
+      yield None
+      continue
+    hsh, typ, size = header.split()
+    size = int(size)
+    yield GitObject(hsh, typ, raw[pos:pos + size])
+    assert raw[pos + size] == '\n', 'malformed cat-file output'
+    pos += size + 1
+
+
+def parse_batch_check_output(raw):
+  """Parses the complete output of a one-shot `git cat-file --batch-check`.
+
+  Yields an ObjectInfo for every object name fed to git, in order, or None for
+  names which were missing (or ambiguous).
+  """
+  for line in raw.splitlines(True):
+    if line.endswith((' missing\n', ' ambiguous\n')):
+      yield None
+    else:
+      hsh, typ, size = line.split()
+      yield ObjectInfo(hsh, typ, int(size))
+
+
+class _CatFileProcess(object):
+  """A single long-lived `git cat-file --batch[-check]` coprocess.
+
+  The process is spawned lazily on the first request, and is transparently
+  restarted if it dies (or the pipe breaks) in the middle of a request. All
+  requests are serialized with a lock, so one instance may be shared between
+  threads.
+  """
+  def __init__(self, mode, popen_kwargs_fn):
+    """
+    Args:
+      mode (str): Either '--batch' or '--batch-check'.
+      popen_kwargs_fn (callable): Returns the kwargs for subprocess.Popen
+        (cwd, env, ...) to use when (re)starting the process.
+    """
+    assert mode in ('--batch', '--batch-check')
+    self._mode = mode
+    self._popen_kwargs_fn = popen_kwargs_fn
+    self._lock = threading.Lock()
+    self._proc = None
+
+  def _start(self):
+    kwargs = self._popen_kwargs_fn()
+    kwargs['stdin'] = subprocess.PIPE
+    kwargs['stdout'] = subprocess.PIPE
+    cmd = ('git', 'cat-file', self._mode)
+    LOGGER.debug('Starting %r', cmd)
+    self._proc = subprocess.Popen(cmd, **kwargs)
+
+  def _stop(self):
+    proc, self._proc = self._proc, None
+    if proc is None:
+      return
+    try:
+      proc.stdin.close()
+    except IOError:  # pragma: no cover
+      pass
+    if proc.poll() is None:
+      try:
+        proc.terminate()
+      except OSError as e:  # pragma: no cover
+        if e.errno != errno.ESRCH:
+          raise
+    proc.wait()
+    proc.stdout.close()
+
+  def _request(self, name):
+    """Returns (header_tokens, data) for a single object name.
+
+    data is None in --batch-check mode. Returns (None, None) if the object
+    is missing (or ambiguous).
+    """
+    if self._proc is None:
+      self._start()
+    self._proc.stdin.write(name + '\n')
+    self._proc.stdin.flush()
+
+    header = self._proc.stdout.readline()
+    if not header.endswith('\n'):
+      raise IOError(errno.EPIPE, 'git cat-file %s died' % self._mode)
+    if header.endswith((' missing\n', ' ambiguous\n')):
+      return None, None
+    tokens = header.split()
+
+    data = None
+    if self._mode == '--batch':
+      size = int(tokens[2])
+      data = self._proc.stdout.read(size)
+      trailer = self._proc.stdout.read(1)
+      if len(data) != size or trailer != '\n':
+        raise IOError(errno.EPIPE, 'git cat-file %s died' % self._mode)
+    return tokens, data
+
+  def request(self, name):
+    assert '\n' not in name, 'object names may not contain newlines'
+    with self._lock:
+      for attempt in (1, 2):
+        try:
+          return self._request(name)
+        except (IOError, OSError) as e:
+          LOGGER.warning('git cat-file %s failed on %r (attempt %d): %s',
+                         self._mode, name, attempt, e)
+          self._stop()
+      raise ObjectReaderError(
+          'git cat-file %s failed twice for %r' % (self._mode, name))
+
+  def close(self):
+    with self._lock:
+      self._stop()
+
+
+class ObjectReader(object):
+  """Reads objects out of a git repo over persistent `git cat-file` pipes.
+
+  Replaces a `git cat-file`/`git rev-parse` fork per lookup with a single
+  round-trip to a pair of long-lived coprocesses (one `--batch` for content,
+  one `--batch-check` for type/size/hash lookups). Accepts anything which
+  `git rev-parse` would, e.g. hashes, ref names, or `<commit>:<path>`.
+
+  Thread safe.
+  """
+  def __init__(self, popen_kwargs_fn):
+    self._batch = _CatFileProcess('--batch', popen_kwargs_fn)
+    self._batch_check = _CatFileProcess('--batch-check', popen_kwargs_fn)
+
+  def info(self, name):
+    """Returns an ObjectInfo for ``name``, or None if it doesn't exist."""
+    tokens, _ = self._batch_check.request(name)
+    if tokens is None:
+      return None
+    return ObjectInfo(tokens[0], tokens[1], int(tokens[2]))
+
+  def read(self, name):
+    """Returns a GitObject for ``name``, or None if it doesn't exist."""
+    tokens, data = self._batch.request(name)
+    if tokens is None:
+      return None
+    return GitObject(tokens[0], tokens[1], data)
+
+  def close(self):
+    """Stops the coprocesses. They will be restarted on the next request."""
+    self._batch.close()
+    self._batch_check.close()
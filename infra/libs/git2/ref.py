@@ -2,7 +2,6 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-from infra.libs.git2.util import CalledProcessError
 from infra.libs.git2.util import INVALID
 
 class Ref(object):
@@ -67,14 +66,16 @@ class Ref(object):
     """Get the Commit at the tip of this Ref."""
     if self._ref is INVALID:
       return INVALID
-    try:
-      return self._repo.get_commit(
-        self._repo.run('rev-parse', self._ref).strip())
-    except CalledProcessError:
+    found, hsh = self._repo.snapshot_lookup(self._ref)
+    if not found:
+      info = self._repo.object_info(self._ref)
+      hsh = info.hsh if info else None
+    if hsh is None:
       return INVALID
+    return self._repo.get_commit(hsh)
 
   # Methods
-  def to(self, other, path=None, first_parent=False):
+  def to(self, other, path=None, first_parent=False, prefetch=False):
     """Generate Commit()'s which occur from `self..other`.
 
     If the current ref is INVAILD, list all of the commits reachable from
@@ -86,6 +87,9 @@ class Ref(object):
       path - A string indicating a repo-root-relative path to filter commits on.
              Only Commits which change this path will be yielded. See help for
              `git rev-list self..other -- <path>`.
+      prefetch - Read the data for the whole range up front with a single git
+         process (see ``Repo.get_commits``), instead of one lookup per Commit.
+         Useful when walking long ranges.
     """
     args = ['rev-list', '--reverse']
     if first_parent:
@@ -96,8 +100,13 @@ class Ref(object):
       args.append('%s..%s' % (self.ref, other.ref))
     if path:
       args.extend(['--', path])
-    for hsh in self.repo.run(*args).splitlines():
-      yield self.repo.get_commit(hsh)
+    hshs = self.repo.run(*args).splitlines()
+    if prefetch:
+      for commit in self.repo.get_commits(hshs):
+        yield commit
+    else:
+      for hsh in hshs:
+        yield self.repo.get_commit(hsh)
 
   def update_to(self, commit):
     """Update the local copy of the ref to ``commit``."""
@@ -6,6 +6,7 @@ import collections
 import errno
 import logging
 import os
+import re
 import shutil
 import signal
 import subprocess
@@ -16,8 +17,16 @@ import time
 import urlparse
 
 from infra.libs.git2.commit import Commit
+from infra.libs.git2.commit_cache import CommitCache
+from infra.libs.git2.object_reader import GitObject
+from infra.libs.git2.object_reader import ObjectInfo
+from infra.libs.git2.object_reader import ObjectReader
+from infra.libs.git2.object_reader import parse_batch_check_output
+from infra.libs.git2.object_reader import parse_batch_output
 from infra.libs.git2.ref import Ref
+from infra.libs.git2.data import CommitData
 from infra.libs.git2.util import CalledProcessError, INVALID
+from infra.libs.git2.util import git_hash, make_pack
 
 LOGGER = logging.getLogger(__name__)
 
@@ -27,18 +36,38 @@ class Repo(object):
 
   Manages the (bare) on-disk mirror of the remote repo.
   """
-  MAX_CACHE_SIZE = 1024
-
-  def __init__(self, url):
+  # git commands which never modify refs, and so don't invalidate the
+  # snapshot taken by ``snapshot_refs``.
+  READ_ONLY_COMMANDS = frozenset([
+      'cat-file', 'config', 'for-each-ref', 'hash-object', 'log', 'ls-tree',
+      'merge-base', 'mktree', 'rev-list', 'rev-parse', 'show',
+      'unpack-objects',
+  ])
+  # Characters which make a ref name a revision expression.
+  _REV_SYNTAX_RE = re.compile(r'[~^:@{}\s*?\[\\]')
+
+  def __init__(self, url, commit_cache=None):
+    """
+    Args:
+      url (str): The url of the remote repo.
+      commit_cache (CommitCache): The cache to use for Commit objects. Defaults
+        to an in-memory CommitCache with default settings.
+    """
     self.dry_run = False
     self.repos_dir = None
     self.netrc_file = None
 
     self._url = url
     self._repo_path = None
-    self._commit_cache = collections.OrderedDict()
+    self._commit_cache = commit_cache or CommitCache()
     self._log = LOGGER.getChild('Repo')
     self._queued_refs = {}
+    self._object_reader = None
+    self._object_reader_lock = threading.Lock()
+    self._pending_objects = collections.OrderedDict()  # {hsh: (typ, data)}
+    self._pending_objects_lock = threading.RLock()
+    self._flushing = False
+    self._ref_snapshot = None
 
   def __hash__(self):
     return hash((self._url, self._repo_path))
@@ -52,6 +81,26 @@ class Repo(object):
   url = property(lambda self: self._url)
   repo_path = property(lambda self: self._repo_path)
 
+  @property
+  def commit_cache(self):
+    return self._commit_cache
+
+  @commit_cache.setter
+  def commit_cache(self, cache):
+    """Replaces the CommitCache for this Repo (e.g. to tune its size)."""
+    self._commit_cache = cache
+
+  @property
+  def object_reader(self):
+    """The ObjectReader (persistent `git cat-file --batch`) for this Repo."""
+    if self._object_reader is None:
+      with self._object_reader_lock:
+        if self._object_reader is None:
+          assert self._repo_path is not None
+          self._object_reader = ObjectReader(
+              lambda: self._popen_kwargs({'cwd': self._repo_path}))
+    return self._object_reader
+
   def reify(self, share_from=None):
     """Ensures the local mirror of this Repo exists.
 
@@ -142,28 +191,95 @@ class Repo(object):
   def get_commit(self, hsh):
     """Creates a new ``Commit`` object for this ``Repo``.
 
-    Uses a very basic LRU cache for commit objects, keeping up to
-    ``MAX_CACHE_SIZE`` before eviction. This cuts down on the number of
-    redundant git commands by > 50%, and allows expensive cached_property's to
-    remain for the life of the process.
+    Uses an LRU cache for commit objects (see ``CommitCache``). This cuts down
+    on the number of redundant git commands by > 50%, and allows expensive
+    cached_property's to remain for the life of the process.
 
     If the ``Commit`` does not exist in this ``Repo``, return INVALID and do
     not cache the result.
     """
-    if hsh in self._commit_cache:
+    r = self._commit_cache.get(hsh)
+    if r is not None:
       self._log.debug('Hit %s', hsh)
-      r = self._commit_cache.pop(hsh)
-    else:
-      self._log.debug('Miss %s', hsh)
-      if len(self._commit_cache) >= self.MAX_CACHE_SIZE:
-        self._commit_cache.popitem(last=False)
-      r = Commit(self, hsh)
-      if r.data is INVALID:
-        return INVALID
-
-    self._commit_cache[hsh] = r
+      return r
+
+    self._log.debug('Miss %s', hsh)
+    data = self._commit_cache.load(hsh)
+    pending = self._pending_objects.get(hsh)
+    if data is None and pending is not None and pending[0] == 'commit':
+      data = CommitData.from_raw(pending[1])
+    r = Commit(self, hsh, data)
+    if r.data is INVALID:
+      return INVALID
+    self._commit_cache.put(r)
     return r
 
+  def get_commits(self, hshs):
+    """Like ``get_commit``, but for a whole sequence of hashes at once.
+
+    All of the commits which are not already in the commit cache (in memory or
+    on disk) are read with a single `git cat-file --batch` process (instead of
+    one round-trip per commit), and are added to the commit cache.
+
+    Returns a list of ``Commit`` objects (or INVALID) in the same order as
+    ``hshs``.
+    """
+    hshs = list(hshs)
+    fetched = {}
+    missing = []
+    for hsh in sorted(set(h for h in hshs if h not in self._commit_cache)):
+      data = self._commit_cache.load(hsh)
+      if data is not None:
+        fetched[hsh] = Commit(self, hsh, data)
+      else:
+        missing.append(hsh)
+    if missing:
+      self._log.debug('Prefetching %d commits', len(missing))
+      raw = self.run('cat-file', '--batch', indata='\n'.join(missing) + '\n')
+      for hsh, obj in zip(missing, parse_batch_output(raw)):
+        if obj is None or obj.typ != 'commit':
+          # Let get_commit sort out anything unusual (tags, missing objects).
+          continue
+        fetched[hsh] = Commit(self, hsh, CommitData.from_raw(obj.data))
+
+    ret = []
+    for hsh in hshs:
+      c = fetched.pop(hsh, None)
+      if c is not None:
+        self._commit_cache.put(c)
+      else:
+        c = self.get_commit(hsh)
+      ret.append(c)
+    return ret
+
+  def snapshot_refs(self):
+    """Loads the value of every ref in the repo with a single
+    `git for-each-ref`.
+
+    Until the snapshot is invalidated, ``Ref.commit`` for plain ref names is
+    answered from memory. Running any git command which may move refs (e.g.
+    fetch, push) invalidates the snapshot; ``Ref.update_to`` keeps it up to
+    date.
+    """
+    refs = self.run('for-each-ref', '--format=%(objectname) %(refname)')
+    self._ref_snapshot = dict(
+        reversed(line.split(' ', 1)) for line in refs.splitlines())
+
+  def snapshot_lookup(self, ref):
+    """Returns (True, hash or None) if ``ref`` can be answered by the current
+    ref snapshot, or (False, None) otherwise (e.g. there's no snapshot, or
+    ``ref`` is a revision expression rather than a plain ref name).
+    """
+    snapshot = self._ref_snapshot
+    if snapshot is None or not isinstance(ref, basestring):
+      return False, None
+    if ref in snapshot:
+      return True, snapshot[ref]
+    if ref.startswith('refs/') and not self._REV_SYNTAX_RE.search(ref):
+      # A plain ref name which didn't exist when the snapshot was taken.
+      return True, None
+    return False, None
+
   def refglob(self, *globstrings):
     """Yield every Ref in this repo which matches a ``globstring`` according to
     the rules of git-for-each-ref.
@@ -188,6 +304,7 @@ class Repo(object):
       kwargs: passed through to subprocess.Popen()
     """
     assert args, args
+    self.flush_interned()
     if args[0] == 'push' and self.dry_run:
       self._log.warn('DRY-RUN: Would have pushed %r', args[1:])
       return
@@ -209,15 +326,7 @@ class Repo(object):
       assert 'stdin' not in kwargs
       kwargs['stdin'] = subprocess.PIPE
 
-    # Point git to a fake HOME with custom .netrc. An alternative is to use
-    # credential.helper == 'store --file=...', but git always tries to use
-    # HOME/.netrc before credential helper. So faking home is necessary anyway.
-    if self.netrc_file:
-      fake_home = os.path.abspath(os.path.join(kwargs['cwd'], 'fake_home'))
-      if os.path.exists(fake_home):
-        env = kwargs.get('env', os.environ).copy()
-        env['HOME'] = fake_home
-        kwargs['env'] = env
+    kwargs = self._popen_kwargs(kwargs)
 
     # Git spawns subprocesses, we want to be able to kill them all.
     assert 'preexec_fn' not in kwargs
@@ -228,6 +337,17 @@ class Repo(object):
     timeout = kwargs.pop('timeout', None)
     cmd = ('git',) + args
 
+    # A plain `update-ref <ref> <hash>` is reflected in the ref snapshot once it
+    # succeeds; anything else which may move refs invalidates it.
+    snapshot_update = None
+    if args[0] not in self.READ_ONLY_COMMANDS:
+      if (args[0] == 'update-ref' and len(args) == 3 and
+          not args[1].startswith('-') and len(args[2]) == 40 and
+          CommitData.HASH_RE.match(args[2])):
+        snapshot_update = args[1:]
+      else:
+        self._ref_snapshot = None
+
     log_func('Running %r', cmd)
     started = time.time()
     process = subprocess.Popen(cmd, **kwargs)
@@ -262,13 +382,134 @@ class Repo(object):
     if retcode not in ok_ret:
       raise CalledProcessError(retcode, cmd, output, errout)
 
+    snapshot = self._ref_snapshot
+    if snapshot_update and snapshot is not None:
+      ref, hsh = snapshot_update
+      snapshot[ref] = hsh
+
     if errout:
       sys.stderr.write(errout)
     return output
 
-  def intern(self, data, typ='blob'):
-    return self.run(
-        'hash-object', '-w', '-t', typ, '--stdin', indata=str(data)).strip()
+  def _popen_kwargs(self, kwargs):
+    """Returns a copy of ``kwargs`` with the environment git needs."""
+    kwargs = dict(kwargs)
+    # Point git to a fake HOME with custom .netrc. An alternative is to use
+    # credential.helper == 'store --file=...', but git always tries to use
+    # HOME/.netrc before credential helper. So faking home is necessary anyway.
+    if self.netrc_file:
+      fake_home = os.path.abspath(os.path.join(kwargs['cwd'], 'fake_home'))
+      if os.path.exists(fake_home):
+        env = kwargs.get('env', os.environ).copy()
+        env['HOME'] = fake_home
+        kwargs['env'] = env
+    return kwargs
+
+  def object_info(self, name):
+    """Returns an ObjectInfo(hsh, typ, size) for ``name``, or None if it does
+    not resolve to an object.
+
+    ``name`` is anything `git rev-parse` accepts (hash, ref,
+    ``<commit>:<path>``, etc.). Costs one round-trip to the persistent
+    `git cat-file --batch-check` process instead of a `git rev-parse` +
+    `git cat-file -t` fork.
+    """
+    pending = self._pending_objects.get(name)
+    if pending is not None:
+      return ObjectInfo(name, pending[0], len(pending[1]))
+    return self.object_reader.info(name)
+
+  def object_infos(self, names):
+    """Like ``object_info``, but for a whole sequence of names at once, using a
+    single `git cat-file --batch-check` process.
+
+    Returns a list of ObjectInfo (or None) in the same order as ``names``.
+    """
+    names = list(names)
+    if not names:
+      return []
+    assert not any('\n' in n for n in names)
+    raw = self.run('cat-file', '--batch-check', indata='\n'.join(names) + '\n')
+    ret = list(parse_batch_check_output(raw))
+    assert len(ret) == len(names), 'malformed cat-file output'
+    return ret
+
+  def path_infos(self, commits, path):
+    """Resolves ``<commit>:<path>`` for every commit in ``commits`` in one pass.
+
+    Args:
+      commits: a sequence of Commit objects (or hashes).
+      path (str): a repo-root-relative path.
+
+    Returns:
+      {commit hash: ObjectInfo or None (if path doesn't exist in that commit)}
+    """
+    hshs = [getattr(c, 'hsh', c) for c in commits]
+    infos = self.object_infos('%s:%s' % (hsh, path) for hsh in hshs)
+    return dict(zip(hshs, infos))
+
+  def read_object(self, name):
+    """Returns a GitObject(hsh, typ, data) for ``name``, or None if it does not
+    resolve to an object.
+
+    Costs one round-trip to the persistent `git cat-file --batch` process.
+    """
+    pending = self._pending_objects.get(name)
+    if pending is not None:
+      return GitObject(name, pending[0], pending[1])
+    return self.object_reader.read(name)
+
+  def close(self):
+    """Stops any persistent git processes owned by this Repo.
+
+    They are transparently restarted if this Repo is used again.
+    """
+    if self._object_reader is not None:
+      self._object_reader.close()
+
+  def intern(self, data, typ='blob', defer=False):
+    """Writes ``data`` to the repo as an object of type ``typ``, and returns its
+    hash.
+
+    Args:
+      data (str): the object content (anything str()-able, e.g. CommitData).
+      typ (str): the git object type.
+      defer (bool): If True, compute the hash locally and queue the object,
+        instead of spawning `git hash-object` for it. Queued objects are
+        written in bulk by ``flush_interned``, which happens automatically
+        before any other git command runs. Until then, deferred commits are
+        still visible through ``get_commit``.
+    """
+    data = str(data)
+    if not defer:
+      return self.run(
+          'hash-object', '-w', '-t', typ, '--stdin', indata=data).strip()
+    hsh = git_hash(typ, data)
+    with self._pending_objects_lock:
+      self._pending_objects[hsh] = (typ, data)
+    return hsh
+
+  def flush_interned(self):
+    """Writes all objects queued by ``intern(defer=True)`` to the repo with a
+    single `git unpack-objects`."""
+    with self._pending_objects_lock:
+      # run() flushes too; don't recurse from the unpack-objects below.
+      if not self._pending_objects or self._flushing:
+        return
+      # Write while holding the lock, so that no other thread can run a git
+      # command which expects these objects to exist before they're written.
+      # They stay in _pending_objects until they are on disk, so that readers
+      # in other threads (e.g. get_commit) never miss them in the meantime.
+      pending = self._pending_objects.items()
+      self._log.debug('Writing %d deferred objects', len(pending))
+      self._flushing = True
+      try:
+        self.run('unpack-objects', '-q',
+                 indata=make_pack(obj for _, obj in pending))
+      finally:
+        self._flushing = False
+      for hsh, _ in pending:
+        del self._pending_objects[hsh]
 
   def fetch(self):
     """Update all local repo state to match remote.
@@ -278,6 +519,8 @@ class Repo(object):
     self._queued_refs = {}
     LOGGER.debug('fetching %r', self)
     self.run('fetch', stdout=sys.stdout, stderr=sys.stderr)
+    # fetch may repack/gc; make the object reader pick up the new packs.
+    self.close()
 
   def fast_forward_push(self, refs_and_commits,
                         include_err=False, timeout=None):
@@ -360,8 +603,29 @@ class Repo(object):
     """
     obj = obj.ref if isinstance(obj, Ref) else obj
     ref = ref.ref if isinstance(ref, Ref) else ref
-    try:
-      args = ['notes'] + (['--ref', ref] if ref else []) + ['show', obj]
-      return self.run(*args)
-    except CalledProcessError:
+    # Same expansion as `git notes --ref`.
+    if ref is None:
+      ref = 'refs/notes/commits'
+    elif ref.startswith('notes/'):
+      ref = 'refs/' + ref
+    elif not ref.startswith('refs/notes/'):
+      ref = 'refs/notes/' + ref
+
+    info = self.object_info(obj)
+    if info is None or self.object_info(ref) is None:
       return None
+    hsh = info.hsh
+
+    # Notes trees are keyed by object hash, but may be 'fanned out' into
+    # subdirectories of 2 hex digits each (e.g. 'ab/cd/ef01...'), depending on
+    # how many notes there are. Walk down the fanout levels until we find the
+    # note, or the directory for the next level doesn't exist.
+    prefix = ''
+    for i in xrange(0, len(hsh) - 2, 2):
+      note = self.read_object('%s:%s%s' % (ref, prefix, hsh[i:]))
+      if note is not None and note.typ == 'blob':
+        return note.data
+      prefix += hsh[i:i+2] + '/'
+      if self.object_info('%s:%s' % (ref, prefix)) is None:
+        return None
+    return None  # pragma: no cover
@@ -0,0 +1,98 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import collections
+import shutil
+import tempfile
+import unittest
+
+from infra.libs.git2 import commit_cache
+from infra.libs.git2 import data
+from infra_libs import ts_mon
+
+
+FakeCommit = collections.namedtuple('FakeCommit', 'hsh data')
+
+
+def make_commit(i, message='message'):
+  user = data.CommitUser('Some User', 'user@example.com',
+                         data.CommitTimestamp(1400000000 + i, '+', 0, 0))
+  d = data.CommitData(None, [], user, user, (), [message], (), False)
+  return FakeCommit('%040x' % i, d)
+
+
+class TestCommitCache(unittest.TestCase):
+  def setUp(self):
+    super(TestCommitCache, self).setUp()
+    ts_mon.reset_for_unittest()
+    self.tempdir = tempfile.mkdtemp(suffix='.commit_cache_test')
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+    super(TestCommitCache, self).tearDown()
+
+  def testLRU(self):
+    c = commit_cache.CommitCache(max_entries=2)
+    a, b, d = make_commit(1), make_commit(2), make_commit(3)
+    c.put(a)
+    c.put(b)
+    self.assertIs(c.get(a.hsh), a)  # b is now the LRU entry
+    c.put(d)
+    self.assertEqual(c.keys(), [a.hsh, d.hsh])
+    self.assertIsNone(c.get(b.hsh))
+    self.assertIn(a.hsh, c)
+    self.assertEqual(len(c), 2)
+
+    self.assertEqual(1, commit_cache.hits.get({'tier': 'memory'}))
+    self.assertEqual(1, commit_cache.misses.get({'tier': 'memory'}))
+    self.assertEqual(1, commit_cache.evictions.get())
+
+  def testMaxBytes(self):
+    small = make_commit(1)
+    size = len(str(small.data))
+    c = commit_cache.CommitCache(max_entries=100, max_bytes=size * 2)
+    c.put(small)
+    c.put(make_commit(2))
+    self.assertEqual(len(c), 2)
+    self.assertEqual(c.size_bytes, size * 2)
+
+    c.put(make_commit(3))
+    self.assertEqual(len(c), 2)
+    self.assertIsNone(c.get(small.hsh))
+
+    # A single huge entry is still cached, but evicts everything else.
+    huge = make_commit(4, 'x' * size * 3)
+    c.put(huge)
+    self.assertEqual(c.keys(), [huge.hsh])
+    self.assertEqual(c.size_bytes, len(str(huge.data)))
+
+  def testReplace(self):
+    c = commit_cache.CommitCache()
+    a = make_commit(1)
+    c.put(a)
+    c.put(a)
+    self.assertEqual(len(c), 1)
+    self.assertEqual(c.size_bytes, len(str(a.data)))
+    c.clear()
+    self.assertEqual(len(c), 0)
+    self.assertEqual(c.size_bytes, 0)
+
+  def testPersist(self):
+    a = make_commit(1)
+    c = commit_cache.CommitCache(persist_dir=self.tempdir)
+    self.assertIsNone(c.load(a.hsh))
+    c.put(a)
+    c.put(a)  # already persisted
+
+    c2 = commit_cache.CommitCache(persist_dir=self.tempdir)
+    self.assertIsNone(c2.get(a.hsh))
+    self.assertEqual(c2.load(a.hsh), a.data)
+
+    self.assertEqual(1, commit_cache.hits.get({'tier': 'disk'}))
+    self.assertEqual(1, commit_cache.misses.get({'tier': 'disk'}))
+
+  def testNoPersist(self):
+    c = commit_cache.CommitCache()
+    c.put(make_commit(1))
+    self.assertIsNone(c.load(make_commit(1).hsh))
@@ -62,6 +62,21 @@ class TestRef(test_util.TestBasis):
         [self.repo[c] for c in 'DM']
     )
 
+  def testPathInfos(self):
+    # Repo.path_infos lives here for the COMMIT_* content above.
+    r = self.mkRepo()
+    A = r['refs/heads/root_A']
+    O = r['refs/heads/branch_O']
+    commits = list(A.to(O))
+    infos = r.path_infos(commits + [A.commit.hsh], 'path')
+    self.assertIsNone(infos[A.commit.hsh])
+    self.assertIsNone(infos[self.repo['C']])
+    self.assertEqual(infos[self.repo['O']].typ, 'tree')
+    self.assertEqual(infos[self.repo['O']],
+                     r.object_info('%s:path' % self.repo['O']))
+    self.assertEqual(infos[self.repo['M']].hsh, infos[self.repo['O']].hsh)
+    self.assertNotEqual(infos[self.repo['D']].hsh, infos[self.repo['M']].hsh)
+
   def testToFirstParent(self):
     r = self.mkRepo()
 
@@ -89,6 +104,23 @@ class TestRef(test_util.TestBasis):
         [self.repo[c] for c in 'BCDLMNOPQRS'] + [merge.hsh]
     )
 
+  def testToPrefetch(self):
+    # pylint: disable=W0212
+    r = self.mkRepo()
+    A = r['refs/heads/root_A']
+    O = r['refs/heads/branch_O']
+    r._commit_cache.clear()
+    commits = list(A.to(O, prefetch=True))
+    self.assertEqual(
+        [c.hsh for c in commits],
+        [self.repo[c] for c in 'BCDLMNO']
+    )
+    self.assertEqual(
+        [c.data for c in commits],
+        [c.data for c in A.to(O)]
+    )
+    self.assertIs(r.get_commit(self.repo['M']), commits[4])
+
   def testInvalidTo(self):
     r = self.mkRepo()
     dne = r['refs/heads/doesnt_exist_yet']
@@ -9,6 +9,7 @@ import shutil
 import sys
 
 from infra.libs import git2
+from infra.libs.git2 import object_reader
 from infra.libs.git2 import repo
 from infra.libs.git2.test import test_util
 
@@ -107,7 +108,7 @@ class TestRepo(test_util.TestBasis):
   def testGetCommitEviction(self):
     # pylint: disable=W0212
     r = self.mkRepo()
-    r.MAX_CACHE_SIZE = 2
+    r.commit_cache = git2.CommitCache(max_entries=2)
     L = r.get_commit(self.repo['L'])
     self.assertIs(L, r.get_commit(self.repo['L']))
     self.assertEqual(len(r._commit_cache), 1)
@@ -124,17 +125,109 @@ class TestRepo(test_util.TestBasis):
 
     self.assertIsNot(L, r.get_commit(self.repo['L']))
 
+  def testGetCommitPersisted(self):
+    persist_dir = os.path.join(self.repos_dir, 'commit_cache')
+    r = self.mkRepo()
+    r.commit_cache = git2.CommitCache(persist_dir=persist_dir)
+    O = r.get_commit(self.repo['O'])
+
+    r2 = self.mkRepo()
+    r2.commit_cache = git2.CommitCache(persist_dir=persist_dir)
+    self.mock(r2, 'read_object', lambda _name: self.fail('read from git'))
+    O2 = r2.get_commit(self.repo['O'])
+    self.assertIsNot(O, O2)
+    self.assertEqual(O.data, O2.data)
+    self.assertEqual(O2.data.committer.email, 'commitish@example.com')
+
+  def testGetCommits(self):
+    # pylint: disable=W0212
+    r = self.mkRepo()
+    L = r.get_commit(self.repo['L'])
+    bogus = 'deadbeefdeadbeefdeadbeefdeadbeefdeadbeef'
+    commits = r.get_commits([self.repo['O'], bogus, self.repo['L'],
+                             self.repo['O']])
+    self.assertEqual(commits[0].hsh, self.repo['O'])
+    self.assertEqual(commits[0].data.committer.email, 'commitish@example.com')
+    self.assertIs(commits[1], git2.INVALID)
+    self.assertIs(commits[2], L)
+    self.assertIs(commits[3], commits[0])
+    self.assertEqual(set(r.commit_cache.keys()),
+                     {self.repo['L'], self.repo['O']})
+
   def testIntern(self):
     r = self.mkRepo()
     hsh = r.intern('catfood')
     self.assertEqual(hsh, hashlib.sha1('blob 7\0catfood').hexdigest())
     self.assertEqual('catfood', r.run('cat-file', 'blob', hsh))
 
+  def testInternDeferred(self):
+    r = self.mkRepo()
+    O = r['refs/heads/branch_O'].commit
+    hsh = r.intern('catfood', defer=True)
+    self.assertEqual(hsh, hashlib.sha1('blob 7\0catfood').hexdigest())
+    self.assertEqual(r.read_object(hsh).data, 'catfood')
+    self.assertEqual(r.object_info(hsh).size, 7)
+
+    new = O.alter(defer=True, message_lines=['deferred'])
+    self.assertEqual(new.data.message_lines, ('deferred',))
+    self.assertEqual(new.parent, O.parent)
+    loose = os.path.join(r.repo_path, 'objects', new.hsh[:2], new.hsh[2:])
+    self.assertFalse(os.path.exists(loose))
+
+    # Any other git command writes the pending objects first.
+    self.assertEqual(r.run('cat-file', 'blob', hsh), 'catfood')
+    self.assertEqual(r.run('cat-file', '-t', new.hsh).strip(), 'commit')
+    self.assertEqual(r.run('cat-file', 'commit', new.hsh), str(new.data))
+    self.assertTrue(os.path.exists(loose))
+    r.flush_interned()  # nothing left to do
+
+  def testInternDeferredVisibleWhileFlushing(self):
+    r = self.mkRepo()
+    hsh = r.intern('catfood', defer=True)
+    seen = []
+    run = r.run
+    def checking_run(*args, **kwargs):
+      # What another thread would see while the objects are being written.
+      if args[0] == 'unpack-objects':
+        seen.append(r.read_object(hsh))
+      return run(*args, **kwargs)
+    r.run = checking_run
+    r.flush_interned()
+    self.assertEqual(['catfood'], [obj.data for obj in seen])
+    self.assertEqual('catfood', r.read_object(hsh).data)
+
   def testGetRef(self):
     r = self.mkRepo()
     self.assertEqual(r['refs/heads/branch_Z'].commit.hsh,
                      'cd2277651786a3f5a8cefb6be22ab42988f25cd9')
 
+  def testSnapshotRefs(self):
+    # pylint: disable=W0212
+    r = self.mkRepo()
+    r.snapshot_refs()
+    Z = r['refs/heads/branch_Z']
+    self.assertEqual(r._ref_snapshot[Z.ref], self.repo['Z'])
+
+    # Plain ref names are answered from the snapshot...
+    r._ref_snapshot[Z.ref] = self.repo['O']
+    self.assertEqual(Z.commit.hsh, self.repo['O'])
+    self.assertIs(r['refs/heads/nonexistent'].commit, git2.INVALID)
+    # ...but revision expressions still go to git.
+    self.assertEqual(r['refs/heads/branch_Z~0'].commit.hsh, self.repo['Z'])
+    self.assertEqual(r['branch_Z'].commit.hsh, self.repo['Z'])
+
+    # update-ref keeps the snapshot up to date.
+    Z.update_to(r.get_commit(self.repo['F']))
+    self.assertEqual(r._ref_snapshot[Z.ref], self.repo['F'])
+    self.assertEqual(Z.commit.hsh, self.repo['F'])
+
+    # Read-only commands leave the snapshot alone; anything else drops it.
+    r.run('rev-parse', 'HEAD')
+    self.assertIsNotNone(r._ref_snapshot)
+    r.run('update-ref', '-d', Z.ref)
+    self.assertIsNone(r._ref_snapshot)
+    self.assertIs(Z.commit, git2.INVALID)
+
   def testNonFastForward(self):
     r = self.mkRepo()
     O = r['refs/heads/branch_O']
@@ -293,3 +386,70 @@ class TestRepo(test_util.TestBasis):
     r.run('notes', 'add', 'refs/heads/branch_O', '-m', 'sup', env=env)
     self.assertEqual(r.notes(r['refs/heads/branch_O'], 'refs/notes/commits'),
                      'sup\n')
+
+  def testObjectInfo(self):
+    r = self.mkRepo()
+    info = r.object_info('refs/heads/branch_O')
+    self.assertEqual(info.hsh, self.repo['O'])
+    self.assertEqual(info.typ, 'commit')
+    self.assertEqual(r.object_info(self.repo['O'] + '^{tree}').typ, 'tree')
+    self.assertIsNone(r.object_info('refs/heads/bogus'))
+    self.assertIsNone(r.object_info('%s:not/a/path' % self.repo['O']))
+
+  def testObjectInfos(self):
+    r = self.mkRepo()
+    self.assertEqual(r.object_infos([]), [])
+    infos = r.object_infos(['refs/heads/branch_O', 'refs/heads/bogus',
+                            self.repo['O'] + '^{tree}'])
+    self.assertEqual(infos[0], r.object_info('refs/heads/branch_O'))
+    self.assertIsNone(infos[1])
+    self.assertEqual(infos[2].typ, 'tree')
+
+  def testReadObject(self):
+    r = self.mkRepo()
+    hsh = r.intern('catfood\nwith newlines\n')
+    obj = r.read_object(hsh)
+    self.assertEqual(obj.hsh, hsh)
+    self.assertEqual(obj.typ, 'blob')
+    self.assertEqual(obj.data, 'catfood\nwith newlines\n')
+    self.assertIsNone(r.read_object('deadbeefdeadbeefdeadbeefdeadbeefdeadbeef'))
+
+  def testObjectReaderRestart(self):
+    # pylint: disable=W0212
+    r = self.mkRepo()
+    self.assertEqual(r.read_object(self.repo['O']).typ, 'commit')
+    proc = r.object_reader._batch._proc
+    proc.kill()
+    proc.wait()
+    self.assertEqual(r.read_object(self.repo['N']).hsh, self.repo['N'])
+    self.assertIsNot(r.object_reader._batch._proc, proc)
+
+    r.close()
+    self.assertIsNone(r.object_reader._batch._proc)
+    self.assertEqual(r.read_object(self.repo['O']).hsh, self.repo['O'])
+
+  def testObjectReaderGivesUp(self):
+    r = self.mkRepo()
+    orig_proc = object_reader.subprocess.Popen
+    def mocked_Popen(cmd, *args, **kwargs):
+      if cmd[:2] != ('git', 'cat-file'):  # pragma: no cover
+        return orig_proc(cmd, *args, **kwargs)
+      return orig_proc(['true'], *args, **kwargs)
+    self.mock(object_reader.subprocess, 'Popen', mocked_Popen)
+    with self.assertRaises(object_reader.ObjectReaderError):
+      r.object_info('refs/heads/branch_O')
+
+  def testNotesFanout(self):
+    env = os.environ.copy()
+    env.update(self.repo.get_git_commit_env())
+
+    r = self.mkRepo()
+    # Enough notes to make git fan the notes tree out into subdirectories.
+    blobs = [r.intern('blob %d' % i) for i in xrange(300)]
+    for i, hsh in enumerate(blobs):
+      r.run('notes', '--ref', 'fanout', 'add', hsh, '-m', 'note %d' % i,
+            env=env)
+    self.assertEqual(r.notes(blobs[7], 'fanout'), 'note 7\n')
+    self.assertEqual(r.notes(blobs[7], 'refs/notes/fanout'), 'note 7\n')
+    self.assertIsNone(r.notes(r.intern('no note'), 'fanout'))
+    self.assertIsNone(r.notes(blobs[7], 'notes/bogus'))
@@ -2,8 +2,11 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-import unittest
+import hashlib
+import struct
 import textwrap
+import unittest
+import zlib
 
 from infra.libs.git2 import util
 
@@ -61,3 +64,37 @@ class TestCalledProcessError(unittest.TestCase):
       Cat says the dog smells funny.
       Cat is not amused.
     '''))
+
+
+class TestGitHash(unittest.TestCase):
+  def testBasic(self):
+    # `echo -n catfood | git hash-object --stdin`
+    self.assertEqual(util.git_hash('blob', 'catfood'),
+                     hashlib.sha1('blob 7\0catfood').hexdigest())
+    # The empty tree.
+    self.assertEqual(util.git_hash('tree', ''),
+                     '4b825dc642cb6eb9a060e54bf8d69288fbee4904')
+
+
+class TestMakePack(unittest.TestCase):
+  def testBasic(self):
+    big = 'x' * 1000
+    pack = util.make_pack([('blob', 'catfood'), ('blob', big)])
+    self.assertEqual(pack[:12], 'PACK' + struct.pack('>II', 2, 2))
+    self.assertEqual(pack[-20:], hashlib.sha1(pack[:-20]).digest())
+
+    # blob (3), size 7: fits in the first byte.
+    self.assertEqual(pack[12], chr(0x37))
+    d = zlib.decompressobj()
+    self.assertEqual(d.decompress(pack[13:]), 'catfood')
+
+    # blob (3), size 1000 = 0b1111101000: low 4 bits first, then 7 more.
+    rest = d.unused_data
+    self.assertEqual(rest[:2], chr(0x80 | 0x38) + chr(1000 >> 4))
+    d = zlib.decompressobj()
+    self.assertEqual(d.decompress(rest[2:]), big)
+    self.assertEqual(d.unused_data, pack[-20:])
+
+  def testEmpty(self):
+    pack = util.make_pack([])
+    self.assertEqual(len(pack), 12 + 20)
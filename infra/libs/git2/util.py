@@ -1,6 +1,10 @@
 # Copyright 2014 The Chromium Authors. All rights reserved.
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
+import hashlib
+import struct
+import zlib
+
 from cStringIO import StringIO
 
 
@@ -60,3 +64,40 @@ class CalledProcessError(Exception):
       r += '\n'
     return r
 
+
+
+def git_hash(typ, data):
+  """Returns the hash git would assign to an object of type ``typ`` with
+  content ``data`` (i.e. what `git hash-object -t <typ>` would print)."""
+  return hashlib.sha1('%s %d\0%s' % (typ, len(data), data)).hexdigest()
+
+
+_PACK_TYPES = {'commit': 1, 'tree': 2, 'blob': 3, 'tag': 4}
+
+def make_pack(objects):
+  """Returns a (non-delta) git packfile containing ``objects``.
+
+  The result is suitable for `git unpack-objects` or `git index-pack --stdin`.
+
+  Args:
+    objects: a sequence of (typ, data) tuples.
+  """
+  objects = list(objects)
+  ret = StringIO()
+  ret.write('PACK' + struct.pack('>II', 2, len(objects)))
+  for typ, data in objects:
+    # Variable length header: 3 bits of type and 4 bits of size in the first
+    # byte, then 7 bits of size per byte, with the MSB as the continuation bit.
+    size = len(data)
+    byte = (_PACK_TYPES[typ] << 4) | (size & 0x0f)
+    size >>= 4
+    header = []
+    while size:
+      header.append(byte | 0x80)
+      byte = size & 0x7f
+      size >>= 7
+    header.append(byte)
+    ret.write(struct.pack('%dB' % len(header), *header))
+    ret.write(zlib.compress(data))
+  pack = ret.getvalue()
+  return pack + hashlib.sha1(pack).digest()
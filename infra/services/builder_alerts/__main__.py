@@ -23,6 +23,7 @@ from infra.libs.service_utils import outer_loop
 
 from infra.services.builder_alerts import alert_builder
 from infra.services.builder_alerts import analysis
+from infra.services.builder_alerts import build_store
 from infra.services.builder_alerts import buildbot
 from infra.services.builder_alerts import crbug_issues
 from infra.services.builder_alerts import gatekeeper_extras
@@ -40,7 +41,7 @@ sys.path.insert(0, build_scripts_dir)
 from slave import gatekeeper_ng_config  # pylint: disable=F0401
 
 
-CACHE_PATH = 'build_cache'
+CACHE_PATH = 'build_cache.sqlite'
 # We have 13 masters. No point in spawning more processes
 PARALLEL_TASKS = 13
 CONCURRENT_TASKS = 16
@@ -60,7 +61,7 @@ class SubProcess(object):
 
   def __call__(self, master_url):
     try:
-      master_json = buildbot.fetch_master_json(master_url)
+      master_json = buildbot.fetch_master_json(master_url, self._cache)
       if not master_json:
         return (None, None, None, master_url)
 
@@ -214,7 +215,9 @@ def inner_loop(args):
   master_urls = gatekeeper_extras.fetch_master_urls(gatekeeper, args)
   start_time = datetime.datetime.utcnow()
 
-  cache = buildbot.DiskCache(CACHE_PATH)
+  cache = build_store.open_store(CACHE_PATH)
+  # Forked pool workers inherit the in-memory tier of finished builds.
+  cache.refresh()
 
   old_alerts = {}
   if old_api_endpoint:
@@ -253,6 +256,7 @@ def inner_loop(args):
                                      args.jobs), master_urls)
   pool.close()
   pool.join()
+  logging.debug('Evicted %d entries from the build store.', cache.evict())
 
   for data in master_datas:
     # TODO(ojan): We should put an alert in the JSON for this master so
@@ -12,6 +12,7 @@ import time
 import traceback
 import urllib
 
+from infra.services.builder_alerts import build_store
 from infra.services.builder_alerts import buildbot
 from infra.services.builder_alerts import reasons_splitter
 from infra.services.builder_alerts import string_helpers
@@ -139,7 +140,10 @@ def reasons_for_failure(cache, step, build, builder_name, master_url):
   if not splitter:
     return None
   reasons = splitter.split_step(step, build, builder_name, master_url)
-  cache.set(cache_key, reasons)
+  # The log of a finished step never changes, so once it has been split it
+  # never needs to be downloaded again. A failure to split (e.g. because the
+  # log couldn't be fetched) is only remembered until the entry expires.
+  cache.set(cache_key, reasons, immutable=bool(reasons))
   return reasons
 
 
@@ -340,6 +344,36 @@ def alert_for_stale_master_data(master_url, master_json):  # pragma: no cover
   }
 
 
+def builder_state_key(master_url, builder_name):
+  master_name = buildbot.master_name_from_url(master_url)
+  return os.path.join('builder_state', master_name, '%s.json' % builder_name)
+
+
+def builder_fingerprint(builder_name, recent_build_ids, active_builds):
+  """Returns everything alerts_for_builder's result depends on which may change
+  between two passes: the newest build, and how far each running build of the
+  builder has got. Lists rather than tuples, so that it survives a round-trip
+  through json.
+  """
+  running = sorted(
+      [build['number'],
+       len([s for s in build.get('steps', []) if s.get('isFinished')])]
+      for build in active_builds if build['builderName'] == builder_name)
+  return [max(recent_build_ids), running]
+
+
+def retained_alerts(cache, state_key, fingerprint):
+  """Returns the alerts a previous pass computed for a builder, or None if the
+  builder has changed since (or they need to be recomputed anyway)."""
+  state = cache.get(state_key)
+  if not state or state['fingerprint'] != fingerprint:
+    return None
+  # Transitions which weren't filled in for lack of time are retried.
+  if any(alert['failing_build'] is None for alert in state['alerts']):
+    return None
+  return state['alerts']
+
+
 def alerts_for_master(cache, master_url, master_json, old_alerts,
                       builder_name_filter=None, jobs=1):  # pragma: no cover
   active_builds = []
@@ -360,10 +394,23 @@ def alerts_for_master(cache, master_url, master_json, old_alerts,
       if not recent_build_ids:
         return None
 
+      # Only builders which have new (or progressing) builds since the
+      # previous pass are fetched and re-analyzed.
+      state_key = builder_state_key(master_url, builder_name)
+      fingerprint = builder_fingerprint(
+          builder_name, recent_build_ids, active_builds)
+      alerts = retained_alerts(cache, state_key, fingerprint)
+      if alerts is not None:
+        logging.debug('No new builds on %s:%s, keeping %d alerts.',
+                      master_url, builder_name, len(alerts))
+        return alerts
+
       buildbot.warm_build_cache(cache, master_url, builder_name,
                                 recent_build_ids, active_builds)
-      return alerts_for_builder(cache, master_url, builder_name,
-                                recent_build_ids, old_alerts)
+      alerts = alerts_for_builder(cache, master_url, builder_name,
+                                  recent_build_ids, old_alerts)
+      cache.set(state_key, {'fingerprint': fingerprint, 'alerts': alerts})
+      return alerts
     except:
       # Put all exception text into an exception and raise that so it doesn't
       # get eaten by the multiprocessing code.
@@ -395,8 +442,8 @@ def main(args):  # pragma: no cover
   match = url_regexp.match(args.builder_url)
 
   # FIXME: HACK
-  CACHE_PATH = 'build_cache'
-  cache = buildbot.DiskCache(CACHE_PATH)
+  CACHE_PATH = 'build_cache.sqlite'
+  cache = build_store.BuildStore(CACHE_PATH)
 
   master_url = match.group('master_url')
   builder_name = urllib.unquote_plus(match.group('builder_name'))
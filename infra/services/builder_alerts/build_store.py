@@ -0,0 +1,270 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import collections
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from infra_libs import ts_mon
+
+
+hits = ts_mon.CounterMetric('builder_alerts/build_store/hits',
+    description='Number of BuildStore lookups which were hits, by tier '
+                '(memory or sqlite)')
+misses = ts_mon.CounterMetric('builder_alerts/build_store/misses',
+    description='Number of BuildStore lookups which missed both tiers')
+evictions = ts_mon.CounterMetric('builder_alerts/build_store/evictions',
+    description='Number of entries evicted from the BuildStore database')
+
+
+# Stores opened by this process (or inherited from the parent over fork), by
+# path. See BuildStore.__reduce__.
+_stores = {}
+
+
+def is_finished_build(value):
+  """Returns True if value is the json of a build which has finished.
+
+  Finished builds never change, so they never need to be refetched.
+  """
+  return (isinstance(value, dict) and 'number' in value and
+          value.get('results') is not None)
+
+
+def open_store(path, **kwargs):
+  """Returns the BuildStore already open for path in this process (so that its
+  front tier is kept across iterations), or opens a new one."""
+  store = _stores.get(path)
+  if store is None:
+    store = BuildStore(path, **kwargs)
+  return store
+
+
+def _unpickle_store(path, kwargs):
+  return open_store(path, **kwargs)
+
+
+class BuildStore(object):
+  """A cache of build json (and other json blobs) for builder_alerts.
+
+  Entries are kept zlib-compressed in a single, indexed sqlite database, which
+  may be shared between processes. Mutable entries (in-progress builds, master
+  json, ...) are evicted once they are older than ``max_age_secs``; beyond
+  that the least-recently-used entries are evicted once there are more than
+  ``max_entries`` of them (see evict()).
+
+  Immutable entries (finished builds, see is_finished_build) are also kept in
+  an in-memory LRU front tier of at most ``memory_entries`` entries, and are
+  never rewritten. The front tier is inherited by the workers of a
+  multiprocessing.Pool: pickling a BuildStore only pickles its path, and
+  unpickling it in a forked worker yields the parent's instance. Calling
+  refresh() before starting the pool loads the immutable entries written by
+  the previous pool into it.
+
+  Drop-in replacement for the former DiskCache: has(), get(), set() and
+  key_age() behave the same way.
+  """
+  DEFAULT_MAX_ENTRIES = 200000
+  DEFAULT_MAX_AGE_SECS = 24 * 60 * 60
+  DEFAULT_MEMORY_ENTRIES = 4096
+  # Don't bother recording accesses more often than this, to avoid turning
+  # every read into a write.
+  ACCESS_RESOLUTION_SECS = 10 * 60
+
+  def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES,
+               max_age_secs=DEFAULT_MAX_AGE_SECS,
+               memory_entries=DEFAULT_MEMORY_ENTRIES,
+               is_immutable=is_finished_build):
+    """
+    Args:
+      path (str): Path to the sqlite database, created if necessary.
+      max_entries (int): Maximum number of entries kept in the database.
+      max_age_secs (float): Age after which mutable entries are evicted.
+      memory_entries (int): Maximum number of immutable entries kept in
+        memory.
+      is_immutable (callable): Returns whether a value will never change.
+    """
+    assert max_entries > 0
+    assert memory_entries >= 0
+    self._path = path
+    self._max_entries = max_entries
+    self._max_age_secs = max_age_secs
+    self._memory_entries = memory_entries
+    self._is_immutable = is_immutable
+
+    self._lock = threading.Lock()
+    self._db = None
+    self._db_pid = None
+    self._memory = collections.OrderedDict()  # {key: (blob, updated)}
+    self._refreshed_until = 0
+
+    with self._lock:
+      self._connection()
+    _stores[path] = self
+
+  path = property(lambda self: self._path)
+
+  def __reduce__(self):
+    return _unpickle_store, (self._path, {
+        'max_entries': self._max_entries,
+        'max_age_secs': self._max_age_secs,
+        'memory_entries': self._memory_entries,
+        'is_immutable': self._is_immutable,
+    })
+
+  def _connection(self):
+    """Returns this process' connection to the database. Needs self._lock."""
+    pid = os.getpid()
+    # sqlite connections must not be shared with a forked child.
+    if self._db is None or self._db_pid != pid:
+      dirname = os.path.dirname(os.path.abspath(self._path))
+      if not os.path.isdir(dirname):  # pragma: no cover
+        os.makedirs(dirname)
+      self._db = sqlite3.connect(self._path, timeout=60,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+      self._db.execute('PRAGMA journal_mode=WAL')
+      self._db.execute(
+          'CREATE TABLE IF NOT EXISTS entries ('
+          '  key TEXT PRIMARY KEY,'
+          '  value BLOB NOT NULL,'
+          '  immutable INTEGER NOT NULL,'
+          '  updated REAL NOT NULL,'
+          '  accessed REAL NOT NULL)')
+      self._db.execute(
+          'CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+      self._db.execute(
+          'CREATE INDEX IF NOT EXISTS entries_updated ON entries (updated)')
+      self._db_pid = pid
+    return self._db
+
+  def _remember(self, key, blob, updated):
+    """Adds an immutable entry to the front tier. Needs self._lock."""
+    if not self._memory_entries:
+      return
+    self._memory.pop(key, None)
+    self._memory[key] = (blob, updated)
+    while len(self._memory) > self._memory_entries:
+      self._memory.popitem(last=False)
+
+  def _lookup(self, key):
+    """Returns (blob, updated) for key, or (None, None)."""
+    with self._lock:
+      entry = self._memory.pop(key, None)
+      if entry is not None:
+        self._memory[key] = entry
+        hits.increment({'tier': 'memory'})
+        return entry
+
+      row = self._connection().execute(
+          'SELECT value, immutable, updated, accessed FROM entries '
+          'WHERE key = ?', (key,)).fetchone()
+      if row is None:
+        misses.increment()
+        return None, None
+      blob, immutable, updated, accessed = row
+      blob = str(blob)
+      now = time.time()
+      if now - accessed > self.ACCESS_RESOLUTION_SECS:
+        self._connection().execute(
+            'UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+      if immutable:
+        self._remember(key, blob, updated)
+    hits.increment({'tier': 'sqlite'})
+    return blob, updated
+
+  def has(self, key):
+    with self._lock:
+      if key in self._memory:
+        return True
+      return self._connection().execute(
+          'SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is not None
+
+  def key_age(self, key):
+    """Returns the datetime at which key was last set."""
+    _, updated = self._lookup(key)
+    return datetime.datetime.fromtimestamp(updated)
+
+  def get(self, key):
+    blob, _ = self._lookup(key)
+    if blob is None:
+      return None
+    try:
+      return json.loads(zlib.decompress(blob))
+    except (zlib.error, ValueError):
+      logging.critical('Key exists, but is not valid json: %s' % key)
+      return None
+
+  def set(self, key, json_object, immutable=None):
+    """Stores json_object under key.
+
+    immutable overrides the store's is_immutable for this entry.
+    """
+    if immutable is None:
+      immutable = self._is_immutable(json_object)
+    if immutable:
+      with self._lock:
+        if key in self._memory:
+          return
+    blob = zlib.compress(json.dumps(json_object))
+    now = time.time()
+    with self._lock:
+      self._connection().execute(
+          'INSERT OR REPLACE INTO entries '
+          '(key, value, immutable, updated, accessed) VALUES (?, ?, ?, ?, ?)',
+          (key, sqlite3.Binary(blob), int(immutable), now, now))
+      if immutable:
+        self._remember(key, blob, now)
+
+  def refresh(self):
+    """Loads the immutable entries written (by any process) since the last
+    refresh into the front tier."""
+    with self._lock:
+      rows = self._connection().execute(
+          'SELECT key, value, updated FROM entries '
+          'WHERE immutable = 1 AND updated > ? '
+          'ORDER BY updated DESC LIMIT ?',
+          (self._refreshed_until, self._memory_entries)).fetchall()
+      for key, blob, updated in reversed(rows):
+        self._remember(key, str(blob), updated)
+      if rows:
+        self._refreshed_until = rows[0][2]
+    return len(rows)
+
+  def evict(self):
+    """Evicts expired mutable entries, then the least-recently-used entries
+    beyond max_entries. Returns the number of evicted entries."""
+    with self._lock:
+      db = self._connection()
+      db.execute('BEGIN')
+      expired = db.execute(
+          'DELETE FROM entries WHERE immutable = 0 AND updated < ?',
+          (time.time() - self._max_age_secs,)).rowcount
+      count = db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+      excess = max(0, count - self._max_entries)
+      if excess:
+        keys = db.execute('SELECT key FROM entries ORDER BY accessed LIMIT ?',
+                          (excess,)).fetchall()
+        db.executemany('DELETE FROM entries WHERE key = ?', keys)
+        for (key,) in keys:
+          self._memory.pop(key, None)
+      db.execute('COMMIT')
+    if expired + excess:
+      evictions.increment_by(expired + excess)
+    return expired + excess
+
+  def close(self):
+    with self._lock:
+      if self._db is not None and self._db_pid == os.getpid():
+        self._db.close()
+      self._db = None
+      self._memory.clear()
+    if _stores.get(self._path) is self:
+      del _stores[self._path]
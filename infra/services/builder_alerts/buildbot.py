@@ -4,7 +4,7 @@
 
 import collections
 import datetime
-import json
+import functools
 import logging
 import operator
 import os
@@ -15,6 +15,7 @@ import time
 
 import requests
 
+from infra.services.builder_alerts import http_client
 from infra.services.builder_alerts import string_helpers
 
 HUNG_BUILDER_ALERT_THRESHOLD = 3 * 60 * 60
@@ -23,45 +24,6 @@ IDLE_BUILDER_PENDING_ALERT_THRESHOLD = 50
 
 CBE_BASE = 'https://chrome-build-extract.appspot.com'
 
-# Unclear if this should be specific to builds.
-
-
-class DiskCache(object):
-
-  def __init__(self, root_path):
-    self.root_path = root_path
-
-  # Could be in operator.
-  def has(self, key):
-    path = os.path.join(self.root_path, key)
-    return os.path.exists(path)
-
-  def key_age(self, key):
-    path = os.path.join(self.root_path, key)
-    return datetime.datetime.fromtimestamp(os.path.getmtime(path))
-
-  # Could be attr getter.
-  def get(self, key):
-    if not self.has(key):
-      return None
-    path = os.path.join(self.root_path, key)
-    with open(path) as cached:
-      try:
-        return json.load(cached)
-      except ValueError:
-        logging.critical('Key exists, but is not valid json: %s' % key)
-        # Somehow the disk cache got a non json entry and we'd crash here.
-        return None
-
-  # Could be attr setter.
-  def set(self, key, json_object):
-    path = os.path.join(self.root_path, key)
-    cache_dir = os.path.dirname(path)
-    if not os.path.exists(cache_dir):
-      os.makedirs(cache_dir)
-    with open(path, 'w') as cached:
-      cached.write(json.dumps(json_object))
-
 
 def master_name_from_url(master_url):
   return urlparse.urlparse(master_url).path.split('/')[-1]
@@ -78,8 +40,7 @@ def cache_key_for_build(master_url, builder_name, build_number):
   return os.path.join(master_name, builder_name, '%s.json' % build_number)
 
 
-def fetch_json(url):  # pragma: no cover
-  response = requests.get(url)
+def _json_from_response(url, response):  # pragma: no cover
   if response.status_code != 200:
     logging.error('Failed (%.1fs, %s) %s', response.elapsed.total_seconds(),
                   response.status_code, url)
@@ -96,13 +57,70 @@ def fetch_json(url):  # pragma: no cover
     return None
 
 
-def fetch_master_json(master_url):  # pragma: no cover
+def fetch_json(url):  # pragma: no cover
+  try:
+    response = http_client.get(url)
+  except requests.exceptions.RequestException, e:
+    logging.error('Failed (%s) %s', e, url)
+    return None
+  return _json_from_response(url, response)
+
+
+def cache_key_for_url(url):
+  parsed = urlparse.urlparse(url)
+  return os.path.join('conditional', parsed.netloc,
+                      '%s.json' % urllib.quote(parsed.path, safe=''))
+
+
+def fetch_json_if_modified(cache, url):
+  """Fetches JSON from url, revalidating the copy kept in cache (if any).
+
+  The ETag and Last-Modified validators of the previous response are sent
+  along, so that an unchanged document costs a 304 Not Modified rather than
+  a full download and parse.
+  """
+  cache_key = cache_key_for_url(url)
+  cached = cache.get(cache_key)
+  headers = {}
+  if cached:
+    if cached.get('etag'):
+      headers['If-None-Match'] = cached['etag']
+    if cached.get('last_modified'):
+      headers['If-Modified-Since'] = cached['last_modified']
+
+  try:
+    response = http_client.get(url, headers=headers)
+  except requests.exceptions.RequestException, e:
+    logging.error('Failed (%s) %s', e, url)
+    return None
+  if cached and response.status_code == 304:
+    logging.debug('Not modified (%.1fs) %s',
+                  response.elapsed.total_seconds(), url)
+    return cached['json']
+
+  data = _json_from_response(url, response)
+  etag = response.headers.get('ETag')
+  last_modified = response.headers.get('Last-Modified')
+  if data and (etag or last_modified):
+    cache.set(cache_key, {
+        'etag': etag,
+        'last_modified': last_modified,
+        'json': data,
+    })
+  return data
+
+
+def fetch_master_json(master_url, cache=None):  # pragma: no cover
+  fetch = fetch_json
+  if cache is not None:
+    fetch = functools.partial(fetch_json_if_modified, cache)
+
   master_name = master_name_from_url(master_url)
   url = '%s/get_master/%s' % (CBE_BASE, master_name)
-  response = fetch_json(url)
+  response = fetch(url)
 
   if not response:
-    response = fetch_json('%s/json' % master_url)
+    response = fetch('%s/json' % master_url)
 
   return response
 
@@ -111,7 +129,13 @@ def prefill_builds_cache(cache, master_url, builder_name):  # pragma: no cover
   master_name = master_name_from_url(master_url)
   builds_url = '%s/get_builds' % CBE_BASE
   params = {'master': master_name, 'builder': builder_name}
-  response = requests.get(builds_url, params=params)
+  try:
+    response = http_client.get(builds_url, params=params)
+  except requests.exceptions.RequestException, e:
+    logging.error(
+        'Failed to fetch builds from master: %s, builder: %s: %s',
+        master_name, builder_name, e)
+    return []
   builds = []
   try:
     builds = response.json()['builds']
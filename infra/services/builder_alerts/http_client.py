@@ -0,0 +1,89 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""A shared, pooled HTTP session for builder_alerts.
+
+Requests made through get() reuse keep-alive connections from a per-host
+pool instead of opening a new (TLS) connection each time, are retried with
+exponential backoff on connection errors and transient server errors, and
+have their latency reported to ts_mon by host (the 'http/*' metrics from
+infra_libs.instrumented_requests, with the host as the request name).
+
+Once the retries are exhausted, get() raises a
+requests.exceptions.RequestException: with the pinned requests 2.5, a
+ConnectionError wrapping urllib3's MaxRetryError, even when the server did
+answer (with one of RETRY_STATUSES). Callers must handle it like a failed
+response.
+
+One session is created lazily per process, so it is safe to use from the
+workers of a multiprocessing.Pool, and it is shared between the threads of
+each worker.
+"""
+
+import os
+import threading
+import urlparse
+
+import requests
+from requests.packages.urllib3.util import retry
+
+from infra_libs import instrumented_requests
+
+# Number of hosts to keep a connection pool for, and the number of idle
+# connections kept per host (one per alert_builder job thread).
+POOL_CONNECTIONS = 32
+POOL_MAXSIZE = 16
+
+MAX_RETRIES = 3
+# Sleeps 0s, 1s, 2s, ... between retries.
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+
+# requests_cache.install_cache() (see __main__.inner_loop) replaces
+# requests.Session with a caching subclass which reads every response in full,
+# defeating streaming. Responses fetched here are cached by the BuildStore
+# instead, so hold on to the real class.
+_SESSION_CLASS = requests.Session
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+
+def _instrument(response, *_args, **_kwargs):
+  host = urlparse.urlparse(response.request.url).netloc
+  instrumented_requests.instrumentation_hook(host)(response)
+
+
+def new_session():
+  """Returns a requests.Session with pooling, retries and instrumentation."""
+  session = _SESSION_CLASS()
+  adapter = requests.adapters.HTTPAdapter(
+      pool_connections=POOL_CONNECTIONS,
+      pool_maxsize=POOL_MAXSIZE,
+      max_retries=retry.Retry(
+          total=MAX_RETRIES,
+          backoff_factor=BACKOFF_FACTOR,
+          status_forcelist=RETRY_STATUSES))
+  session.mount('http://', adapter)
+  session.mount('https://', adapter)
+  session.hooks['response'].append(_instrument)
+  return session
+
+
+def session():
+  """Returns this process' shared session, creating it if necessary."""
+  global _session, _session_pid
+  pid = os.getpid()
+  with _lock:
+    # Pooled sockets must not be shared with a forked child.
+    if _session is None or _session_pid != pid:
+      _session = new_session()
+      _session_pid = pid
+    return _session
+
+
+def get(url, **kwargs):
+  """Like requests.get, but over the shared session."""
+  return session().get(url, **kwargs)
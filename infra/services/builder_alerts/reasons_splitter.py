@@ -3,6 +3,8 @@
 # found in the LICENSE file.
 
 import argparse
+import contextlib
+import itertools
 import logging
 import os
 import re
@@ -10,11 +12,13 @@ import requests
 import sys
 import urllib
 
-import requests_cache
-
 from infra.services.builder_alerts import buildbot
+from infra.services.builder_alerts import http_client
 
-requests_cache.install_cache('reasons')
+# Stdio logs are read in chunks of this many bytes.
+STDIO_CHUNK_SIZE = 64 * 1024
+# Stop reading a stdio log once this many failures have been found in it.
+MAX_STDIO_FAILURES = 100
 
 
 import infra
@@ -24,17 +28,35 @@ top_dir = os.path.dirname(infra_dir)
 sys.path.insert(0, os.path.join(top_dir, 'build', 'scripts'))
 
 
-def stdio_for_step(master_url, builder_name, build, step):  # pragma: no cover
+def stdio_lines_for_step(master_url, builder_name, build,
+                         step):  # pragma: no cover
+  """Yields the lines of the stdio log of step, as they are downloaded.
+
+  Only a chunk of the log is held in memory at a time, and the download is
+  abandoned as soon as the generator is closed.
+  """
   # FIXME: Should get this from the step in some way?
   base_url = buildbot.build_url(master_url, builder_name, build['number'])
   stdio_url = '%s/steps/%s/logs/stdio/text' % (base_url, step['name'])
 
   try:
-    return requests.get(stdio_url).text
-  except requests.exceptions.ConnectionError, e:
-    # Some builders don't save logs for whatever reason.
+    response = http_client.get(stdio_url, stream=True)
+  except requests.exceptions.RequestException, e:
+    # Some builders don't save logs for whatever reason, or the server kept
+    # failing through all the retries.
     logging.error('Failed to fetch %s: %s', stdio_url, e)
-    return None
+    return
+
+  try:
+    if response.status_code != 200:
+      logging.error('Failed to fetch %s: %s', stdio_url, response.status_code)
+      return
+    for line in response.iter_lines(chunk_size=STDIO_CHUNK_SIZE):
+      yield line
+  except requests.exceptions.RequestException, e:
+    logging.error('Failed to read %s: %s', stdio_url, e)
+  finally:
+    response.close()
 
 
 def request_test_results_json(step, build, builder_name, master_url):
@@ -48,7 +70,13 @@ def request_test_results_json(step, build, builder_name, master_url):
       'testtype': test_type,
   }
   base_url = 'https://test-results.appspot.com/testfile'
-  response = requests.get(base_url, params=params)
+  try:
+    response = http_client.get(base_url, params=params)
+  except requests.exceptions.RequestException, e:
+    logging.warn(
+        'test-results failed %s %s %s %s: %s', master_url, builder_name,
+        build['number'], step['name'], e)
+    return None
 
   if response.status_code != 200:
     logging.warn(
@@ -120,26 +148,33 @@ class JUnitSplitter(object):
 
   FAILED_REGEXP = re.compile(r'\[\s+FAILED\s+\] (?P<test_name>\S+)( \(.*\))?$')
 
-  def failed_tests_from_stdio(self, stdio):  # pragma: no cover
+  def failed_tests_from_stdio(self, stdio):
+    return self.failed_tests_from_lines(stdio.split('\n'))
+
+  def failed_tests_from_lines(self, lines):
     failed_tests = []
-    for line in stdio.split('\n'):
+    for line in lines:
       match = self.FAILED_REGEXP.search(line)
       if match:
         failed_tests.append(match.group('test_name'))
+        if len(failed_tests) >= MAX_STDIO_FAILURES:
+          break
     return failed_tests
 
   # "line too long" pylint: disable=C0301
   def split_step(self, step, build, builder_name, master_url):  # pragma: no cover
-    stdio_log = stdio_for_step(master_url, builder_name, build, step)
-    # Can't split if we can't get the logs.
-    if not stdio_log:
-      return None
-
-    failed_tests = self.failed_tests_from_stdio(stdio_log)
+    with contextlib.closing(stdio_lines_for_step(
+        master_url, builder_name, build, step)) as lines:
+      first_line = next(lines, None)
+      # Can't split if we can't get the logs.
+      if first_line is None:
+        return None
+      failed_tests = self.failed_tests_from_lines(
+          itertools.chain([first_line], lines))
     if failed_tests:
       return failed_tests
     # Failed to split, just group with the general failures.
-    logging.debug('First Line: %s', stdio_log.split('\n')[0])
+    logging.debug('First Line: %s', first_line)
     return None
 
 
@@ -267,31 +302,34 @@ class CompileSplitter(object):
   # FAILED: /b/build/goma/gomacc ...
   # obj/chrome/browser/extensions/interactive_ui_tests.extension_commands_global_registry_apitest.o:extension_commands_global_registry_apitest.cc:function extensions::SendNativeKeyEventToXDisplay(ui::KeyboardCode, bool, bool, bool): error: undefined reference to 'gfx::GetXDisplay()'
 
-  @staticmethod
-  def split_step(step, build, builder_name, master_url):  # pragma: no cover
-    stdio = stdio_for_step(master_url, builder_name, build, step)
-    # Can't split if we can't get the logs.
-    if not stdio:
-      return None
-
-    compile_regexp = re.compile(
-        r'(?P<path>.*):(?P<line>\d+):(?P<column>\d+): error:')
+  COMPILE_REGEXP = re.compile(
+      r'(?P<path>.*):(?P<line>\d+):(?P<column>\d+): error:')
 
+  @staticmethod
+  def failure_from_lines(lines):
+    """Returns [path:line] for the first error following a 'FAILED: ' line, or
+    None. Stops reading lines as soon as it is found."""
     # FIXME: I'm sure there is a cleaner way to do this.
     next_line_is_failure = False
-    for line in stdio.split('\n'):
+    for line in lines:
       if not next_line_is_failure:
         if line.startswith('FAILED: '):
           next_line_is_failure = True
         continue
 
-      match = compile_regexp.match(line)
+      match = CompileSplitter.COMPILE_REGEXP.match(line)
       if match:
         return ['%s:%s' % (match.group('path'), match.group('line'))]
       break
 
     return None
 
+  @staticmethod
+  def split_step(step, build, builder_name, master_url):  # pragma: no cover
+    with contextlib.closing(stdio_lines_for_step(
+        master_url, builder_name, build, step)) as lines:
+      return CompileSplitter.failure_from_lines(lines)
+
 
 STEP_SPLITTERS = [
     CompileSplitter(),
@@ -413,9 +413,9 @@ class AlertBuilderTest(unittest.TestCase):
       alert_builder.complete_steps_by_type = old_complete_steps_by_type
 
 
-class AlertBuilderTestWithDiskCache(buildbot_test.TestCaseWithDiskCache):
+class AlertBuilderTestWithBuildStore(buildbot_test.TestCaseWithBuildStore):
   def test_reasons_for_failure(self):
-    cache = buildbot.DiskCache(self.cache_path)
+    cache = self.cache
 
     build = AlertBuilderTest.k_example_failing_build
     step = build['steps'][0]
@@ -450,7 +450,7 @@ class AlertBuilderTestWithDiskCache(buildbot_test.TestCaseWithDiskCache):
       reasons_splitter.splitter_for_step = old_splitter_for_step
 
   def test_reasons_for_failure_no_splitter(self):
-    cache = buildbot.DiskCache(self.cache_path)
+    cache = self.cache
 
     build = AlertBuilderTest.k_example_failing_build
     step = build['steps'][0]
@@ -470,3 +470,42 @@ class AlertBuilderTestWithDiskCache(buildbot_test.TestCaseWithDiskCache):
       self.assertTrue(not reasons)
     finally:
       reasons_splitter.splitter_for_step = old_splitter_for_step
+
+  def test_builder_state_key(self):
+    self.assertEqual(
+        alert_builder.builder_state_key(
+            'https://build.chromium.org/p/chromium.lkgr', 'Linux'),
+        'builder_state/chromium.lkgr/Linux.json')
+
+  def test_builder_fingerprint(self):
+    active_builds = [
+      {'builderName': 'Linux', 'number': 12,
+       'steps': [{'isFinished': True}, {'isFinished': False}]},
+      {'builderName': 'Linux', 'number': 11},
+      {'builderName': 'Mac', 'number': 3, 'steps': [{'isFinished': True}]},
+    ]
+    self.assertEqual(
+        alert_builder.builder_fingerprint('Linux', [10, 12, 11], active_builds),
+        [12, [[11, 0], [12, 1]]])
+    self.assertEqual(
+        alert_builder.builder_fingerprint('Win', [5], active_builds), [5, []])
+
+  def test_retained_alerts(self):
+    key = alert_builder.builder_state_key('http://foo/p/bar', 'baz')
+    fingerprint = [12, [[12, 1]]]
+    self.assertIsNone(alert_builder.retained_alerts(self.cache, key,
+                                                    fingerprint))
+
+    alerts = [{'step_name': 'compile', 'failing_build': 11}]
+    self.cache.set(key, {'fingerprint': fingerprint, 'alerts': alerts})
+    self.assertEqual(
+        alert_builder.retained_alerts(self.cache, key, fingerprint), alerts)
+    self.assertIsNone(
+        alert_builder.retained_alerts(self.cache, key, [12, [[12, 2]]]))
+    self.assertIsNone(
+        alert_builder.retained_alerts(self.cache, key, [13, []]))
+
+    alerts.append({'step_name': 'tests', 'failing_build': None})
+    self.cache.set(key, {'fingerprint': fingerprint, 'alerts': alerts})
+    self.assertIsNone(alert_builder.retained_alerts(self.cache, key,
+                                                    fingerprint))
@@ -0,0 +1,167 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import datetime
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import mock
+
+from infra.services.builder_alerts import build_store
+from infra_libs import ts_mon
+
+
+FINISHED_BUILD = {'number': 1, 'results': 0, 'steps': []}
+RUNNING_BUILD = {'number': 2, 'results': None, 'steps': []}
+
+
+class BuildStoreTest(unittest.TestCase):
+  def setUp(self):
+    ts_mon.reset_for_unittest()
+    self.tempdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tempdir, 'builds.sqlite')
+    self.store = build_store.BuildStore(self.path)
+
+  def tearDown(self):
+    self.store.close()
+    shutil.rmtree(self.tempdir, ignore_errors=True)
+
+  def test_build_cache(self):
+    test_key = 'foo/bar'
+    self.assertFalse(self.store.has(test_key))
+
+    test_data = ['test']
+    self.store.set(test_key, test_data)
+    # Set it a second time to hit the "already there" case.
+    self.store.set(test_key, test_data)
+
+    self.assertTrue(self.store.has(test_key))
+    self.assertEquals(self.store.get(test_key), test_data)
+
+    self.assertIsNone(self.store.get('does_not_exist'))
+    self.assertIsInstance(self.store.key_age(test_key), datetime.datetime)
+
+    db = sqlite3.connect(self.path)
+    db.execute('UPDATE entries SET value = ?', (sqlite3.Binary('foo'),))
+    db.commit()
+    db.close()
+    self.assertIsNone(self.store.get(test_key))
+
+    self.assertEqual(1, build_store.misses.get())
+    self.assertEqual(3, build_store.hits.get({'tier': 'sqlite'}))
+
+  def test_is_finished_build(self):
+    self.assertTrue(build_store.is_finished_build(FINISHED_BUILD))
+    self.assertFalse(build_store.is_finished_build(RUNNING_BUILD))
+    self.assertFalse(build_store.is_finished_build({'results': 0}))
+    self.assertFalse(build_store.is_finished_build(['test']))
+
+  def test_memory_tier(self):
+    self.store.set('finished', FINISHED_BUILD)
+    self.store.set('running', RUNNING_BUILD)
+    self.assertTrue(self.store.has('finished'))
+    self.assertEqual(FINISHED_BUILD, self.store.get('finished'))
+    self.assertEqual(RUNNING_BUILD, self.store.get('running'))
+    self.assertEqual(1, build_store.hits.get({'tier': 'memory'}))
+    self.assertEqual(1, build_store.hits.get({'tier': 'sqlite'}))
+
+    # Finished builds are never rewritten.
+    self.store.set('finished', dict(FINISHED_BUILD, results=2))
+    self.assertEqual(FINISHED_BUILD, self.store.get('finished'))
+
+  def test_immutable_override(self):
+    self.store.set('reasons', ['test1'], immutable=True)
+    self.store.set('build', FINISHED_BUILD, immutable=False)
+    self.store.get('reasons')
+    self.store.get('build')
+    self.assertEqual(1, build_store.hits.get({'tier': 'memory'}))
+    self.assertEqual(1, build_store.hits.get({'tier': 'sqlite'}))
+
+  def test_memory_tier_bounded(self):
+    store = build_store.BuildStore(self.path, memory_entries=1)
+    store.set('a', FINISHED_BUILD)
+    store.set('b', FINISHED_BUILD)
+    self.assertEqual(store.get('a'), FINISHED_BUILD)
+    self.assertEqual(1, build_store.hits.get({'tier': 'sqlite'}))
+    self.assertEqual(store.get('a'), FINISHED_BUILD)
+    self.assertEqual(1, build_store.hits.get({'tier': 'memory'}))
+
+    store = build_store.BuildStore(self.path, memory_entries=0)
+    store.set('c', FINISHED_BUILD)
+    store.get('c')
+    self.assertEqual(2, build_store.hits.get({'tier': 'sqlite'}))
+
+  def test_refresh(self):
+    other = build_store.BuildStore(self.path)
+    other.set('a', FINISHED_BUILD)
+    other.set('b', RUNNING_BUILD)
+
+    self.assertEqual(1, self.store.refresh())
+    self.assertEqual(0, self.store.refresh())
+    self.assertEqual(FINISHED_BUILD, self.store.get('a'))
+    self.assertEqual(1, build_store.hits.get({'tier': 'memory'}))
+
+  @mock.patch('time.time')
+  def test_access_time(self, time_fn):
+    time_fn.return_value = 1000.0
+    self.store.set('a', ['a'])
+    self.store.set('b', ['b'])
+
+    # Reads within ACCESS_RESOLUTION_SECS aren't recorded.
+    time_fn.return_value += 1
+    self.store.get('a')
+    time_fn.return_value += self.store.ACCESS_RESOLUTION_SECS
+    self.store.get('b')
+
+    db = sqlite3.connect(self.path)
+    self.assertEqual(
+        [('a', 1000.0), ('b', 1000.0 + 1 + self.store.ACCESS_RESOLUTION_SECS)],
+        db.execute('SELECT key, accessed FROM entries ORDER BY key').fetchall())
+    db.close()
+
+  @mock.patch('time.time')
+  def test_evict(self, time_fn):
+    store = build_store.BuildStore(self.path, max_entries=3, max_age_secs=100)
+    for now, key, value in ((1000.0, 'lru', FINISHED_BUILD),
+                            (1010.0, 'finished', FINISHED_BUILD),
+                            (1020.0, 'running', RUNNING_BUILD),
+                            (1030.0, 'master', {'builders': {}})):
+      time_fn.return_value = now
+      store.set(key, value)
+
+    # The least recently used entry goes first.
+    self.assertEqual(1, store.evict())
+    self.assertFalse(store.has('lru'))
+    self.assertEqual(0, store.evict())
+
+    # Then mutable entries expire, while finished builds stay.
+    time_fn.return_value = 1125.0
+    self.assertEqual(1, store.evict())
+    self.assertFalse(store.has('running'))
+    self.assertTrue(store.has('master'))
+    self.assertTrue(store.has('finished'))
+    self.assertEqual(2, build_store.evictions.get())
+
+  def test_pickle(self):
+    self.assertIs(self.store, pickle.loads(pickle.dumps(self.store)))
+
+    self.store.close()
+    unpickled = pickle.loads(pickle.dumps(self.store))
+    self.assertIsNot(self.store, unpickled)
+    self.assertEqual(self.path, unpickled.path)
+    self.assertIs(unpickled, build_store.open_store(self.path))
+    unpickled.close()
+
+  @mock.patch('os.getpid')
+  def test_reconnect_after_fork(self, getpid):
+    getpid.return_value = 1
+    store = build_store.BuildStore(self.path)
+    store.set('a', ['a'])
+    getpid.return_value = 2
+    self.assertEqual(['a'], store.get('a'))
+    store.close()
@@ -9,46 +9,28 @@ import tempfile
 import time
 import unittest
 
+import requests
+
+from infra.services.builder_alerts import build_store
 from infra.services.builder_alerts import buildbot
 
 
 # Unused argument - pylint: disable=W0613
 
 
-class TestCaseWithDiskCache(unittest.TestCase):
+class TestCaseWithBuildStore(unittest.TestCase):
   def setUp(self):
     self.cache_path = tempfile.mkdtemp()
-    self.cache = buildbot.DiskCache(self.cache_path)
+    self.cache = build_store.BuildStore(
+        os.path.join(self.cache_path, 'builds.sqlite'))
 
   def tearDown(self):
+    self.cache.close()
     self.cache = None
     shutil.rmtree(self.cache_path, ignore_errors=True)
 
 
-class DiskCacheTest(TestCaseWithDiskCache):
-  def test_build_cache(self):
-    def write_garbage(key):
-      path = os.path.join(self.cache_path, key)
-      with open(path, 'w') as cached:
-        cached.write("foo")
-
-    test_key = 'foo/bar'
-    self.assertFalse(self.cache.has(test_key))
-
-    test_data = ['test']
-    self.cache.set(test_key, test_data)
-    # Set it a second time to hit the "already there" case.
-    self.cache.set(test_key, test_data)
-
-    self.assertTrue(self.cache.has(test_key))
-    self.assertEquals(self.cache.get(test_key), test_data)
-
-    self.assertIsNone(self.cache.get('does_not_exist'))
-    self.assertIsNotNone(self.cache.key_age(test_key))
-
-    write_garbage(test_key)
-    self.assertIsNone(self.cache.get(test_key))
-
+class BuildbotTestWithBuildStore(TestCaseWithBuildStore):
   def test_latest_builder_info_and_alerts_for_master(self):
     k_example_master_json = {
       "builders": {
@@ -424,7 +406,7 @@ class BuildbotTest(unittest.TestCase):
     self.assertEqual(buildbot.is_in_progress({'results': 2}), False)
 
 
-class FetchBuildJsonTest(TestCaseWithDiskCache):
+class FetchBuildJsonTest(TestCaseWithBuildStore):
   # Note that the self.cache is rebuilt for every test case; no data sharing.
 
   def test_fetch_from_cache(self):
@@ -510,7 +492,86 @@ class FetchBuildJsonTest(TestCaseWithDiskCache):
       buildbot.fetch_and_cache_build = _real_fetch_and_cache_build
 
 
-class RevisionsForMasterTest(TestCaseWithDiskCache):
+class FakeResponse(object):
+  def __init__(self, status_code=200, data=None, headers=None):
+    self.status_code = status_code
+    self.data = data
+    self.headers = headers or {}
+    self.elapsed = datetime.timedelta(seconds=1)
+
+  def json(self):
+    return self.data
+
+
+class FetchJsonIfModifiedTest(TestCaseWithBuildStore):
+  url = 'https://build.chromium.org/p/chromium/json'
+
+  def fetch(self, response):
+    requests_headers = []
+    def _mock_get(url, headers):
+      self.assertEqual(url, self.url)
+      requests_headers.append(headers)
+      if isinstance(response, Exception):
+        raise response
+      return response
+    _real_get = buildbot.http_client.get
+
+    try:
+      buildbot.http_client.get = _mock_get
+      data = buildbot.fetch_json_if_modified(self.cache, self.url)
+    finally:
+      buildbot.http_client.get = _real_get
+    return data, requests_headers[0]
+
+  def test_cache_key_for_url(self):
+    self.assertEqual(
+        buildbot.cache_key_for_url(self.url),
+        'conditional/build.chromium.org/%2Fp%2Fchromium%2Fjson.json')
+
+  def test_revalidate(self):
+    data, headers = self.fetch(FakeResponse(
+        data={'builders': {}},
+        headers={'ETag': '"abc"', 'Last-Modified': 'yesterday'}))
+    self.assertEqual(data, {'builders': {}})
+    self.assertEqual(headers, {})
+
+    data, headers = self.fetch(FakeResponse(status_code=304))
+    self.assertEqual(data, {'builders': {}})
+    self.assertEqual(headers, {
+        'If-None-Match': '"abc"',
+        'If-Modified-Since': 'yesterday',
+    })
+
+  def test_modified(self):
+    self.fetch(FakeResponse(data={'builders': {}}, headers={'ETag': '"abc"'}))
+    data, headers = self.fetch(FakeResponse(
+        data={'builders': {'foo': {}}}, headers={'Last-Modified': 'today'}))
+    self.assertEqual(data, {'builders': {'foo': {}}})
+    self.assertEqual(headers, {'If-None-Match': '"abc"'})
+
+    _, headers = self.fetch(FakeResponse(status_code=304))
+    self.assertEqual(headers, {'If-Modified-Since': 'today'})
+
+  def test_no_validators(self):
+    data, _ = self.fetch(FakeResponse(data={'builders': {}}))
+    self.assertEqual(data, {'builders': {}})
+    self.assertFalse(self.cache.has(buildbot.cache_key_for_url(self.url)))
+
+  def test_failure_not_cached(self):
+    data, _ = self.fetch(FakeResponse(status_code=500, headers={'ETag': 'x'}))
+    self.assertIsNone(data)
+    self.assertFalse(self.cache.has(buildbot.cache_key_for_url(self.url)))
+
+  def test_retries_exhausted(self):
+    self.fetch(FakeResponse(data={'builders': {}}, headers={'ETag': '"abc"'}))
+    # What requests 2.5 raises when a 503 persists through all the retries.
+    data, headers = self.fetch(requests.exceptions.ConnectionError(
+        'Max retries exceeded'))
+    self.assertIsNone(data)
+    self.assertEqual(headers, {'If-None-Match': '"abc"'})
+
+
+class RevisionsForMasterTest(TestCaseWithBuildStore):
   def test_builder_info_for_master(self):
     """
     Tests latest_builder_info_and_alerts_for_master.
@@ -0,0 +1,62 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import datetime
+import unittest
+
+import mock
+import requests
+
+from infra.services.builder_alerts import http_client
+from infra_libs import ts_mon
+from infra_libs.ts_mon.common import http_metrics
+
+
+class HttpClientTest(unittest.TestCase):
+  def setUp(self):
+    ts_mon.reset_for_unittest()
+    http_client._session = None
+    http_client._session_pid = None
+
+  def tearDown(self):
+    http_client._session = None
+    http_client._session_pid = None
+
+  def test_new_session(self):
+    session = http_client.new_session()
+    adapter = session.get_adapter('https://build.chromium.org/p/foo/json')
+    self.assertIsInstance(adapter, requests.adapters.HTTPAdapter)
+    self.assertIs(adapter, session.get_adapter('http://example.com'))
+    self.assertEqual(http_client.MAX_RETRIES, adapter.max_retries.total)
+    self.assertIn(503, adapter.max_retries.status_forcelist)
+    self.assertIn(http_client._instrument, session.hooks['response'])
+
+  @mock.patch('os.getpid')
+  def test_session_per_process(self, getpid):
+    getpid.return_value = 1
+    session = http_client.session()
+    self.assertIs(session, http_client.session())
+
+    getpid.return_value = 2
+    self.assertIsNot(session, http_client.session())
+
+  def test_get(self):
+    with mock.patch.object(http_client, 'session') as session:
+      http_client.get('http://example.com', params={'a': 1})
+    session.return_value.get.assert_called_once_with(
+        'http://example.com', params={'a': 1})
+
+  def test_instrument(self):
+    response = mock.Mock(
+        status_code=200, headers={'content-length': '10'},
+        elapsed=datetime.timedelta(seconds=0.5))
+    response.request.url = 'https://build.chromium.org/p/chromium/json'
+    response.request.headers = {}
+    http_client._instrument(response)
+
+    fields = {'name': 'build.chromium.org', 'client': 'requests'}
+    self.assertEqual(1, http_metrics.durations.get(fields).count)
+    self.assertEqual(500, http_metrics.durations.get(fields).sum)
+    self.assertEqual(1, http_metrics.response_status.get(
+        dict(fields, status=200)))
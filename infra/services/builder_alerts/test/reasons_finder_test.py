@@ -21,3 +21,25 @@ C   59.798s Main  [  FAILED  ] org.chromium.mojo.system.impl.CoreImplTest#testAs
       'org.chromium.mojo.system.impl.CoreImplTest#testAsyncWaiterWaitingOnDefaultInvalidHandle',
     ]
     self.assertEquals(splitter.failed_tests_from_stdio(stdio), expected)
+
+  def test_failed_tests_from_lines(self):
+    splitter = reasons_splitter.JUnitSplitter()
+    lines = [
+      '[ RUN      ] org.chromium.FooTest#testBar',
+      '[  FAILED  ] org.chromium.FooTest#testBar (12 ms)',
+      '[       OK ] org.chromium.FooTest#testBaz',
+      '[  FAILED  ] org.chromium.FooTest#testQux',
+    ]
+    self.assertEqual(splitter.failed_tests_from_lines(lines),
+                     ['org.chromium.FooTest#testBar',
+                      'org.chromium.FooTest#testQux'])
+    self.assertEqual(splitter.failed_tests_from_lines([]), [])
+
+  def test_failed_tests_from_lines_stops_early(self):
+    def lines():
+      for i in xrange(reasons_splitter.MAX_STDIO_FAILURES):
+        yield '[  FAILED  ] test%d' % i
+      self.fail('read past MAX_STDIO_FAILURES')  # pragma: no cover
+
+    failed = reasons_splitter.JUnitSplitter().failed_tests_from_lines(lines())
+    self.assertEqual(len(failed), reasons_splitter.MAX_STDIO_FAILURES)
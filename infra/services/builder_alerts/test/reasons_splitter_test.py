@@ -6,6 +6,7 @@ import unittest
 
 import requests
 
+from infra.services.builder_alerts import http_client
 from infra.services.builder_alerts import reasons_splitter
 
 
@@ -36,32 +37,46 @@ class SplitterTests(unittest.TestCase):
         }
       })
 
-    old_requests_get = requests.get
+    old_requests_get = http_client.get
     # TODO(ojan): Import httpretty so we don't have to do these try/finally
     # shenanigans.
     try:
-      requests.get = mock_requests_get
+      http_client.get = mock_requests_get
       failures = reasons_splitter.GTestSplitter.split_step(
           k_mock_step, k_mock_build, k_mock_builder_name, k_mock_master_url)
       self.assertEqual(failures, ['test2'])
     finally:
-      requests.get = old_requests_get
+      http_client.get = old_requests_get
 
   def test_gtest_split_step_404(self):
     def mock_requests_get(base_url, params):
       # Unused argument - pylint: disable=W0613
       return MockJsonResponse(status_code=404)
 
-    old_requests_get = requests.get
+    old_requests_get = http_client.get
     # TODO(ojan): Import httpretty so we don't have to do these try/finally
     # shenanigans.
     try:
-      requests.get = mock_requests_get
+      http_client.get = mock_requests_get
       failures = reasons_splitter.GTestSplitter.split_step(
           k_mock_step, k_mock_build, k_mock_builder_name, k_mock_master_url)
       self.assertIsNone(failures)
     finally:
-      requests.get = old_requests_get
+      http_client.get = old_requests_get
+
+  def test_gtest_split_step_retries_exhausted(self):
+    def mock_requests_get(base_url, params):
+      # Unused argument - pylint: disable=W0613
+      raise requests.exceptions.ConnectionError('Max retries exceeded')
+
+    old_requests_get = http_client.get
+    try:
+      http_client.get = mock_requests_get
+      failures = reasons_splitter.GTestSplitter.split_step(
+          k_mock_step, k_mock_build, k_mock_builder_name, k_mock_master_url)
+      self.assertIsNone(failures)
+    finally:
+      http_client.get = old_requests_get
 
   def test_layout_test_split_step(self):
     def mock_requests_get(base_url, params):
@@ -75,33 +90,33 @@ class SplitterTests(unittest.TestCase):
         }
       })
 
-    old_requests_get = requests.get
+    old_requests_get = http_client.get
     # TODO(ojan): Import httpretty so we don't have to do these try/finally
     # shenanigans.
     try:
-      requests.get = mock_requests_get
+      http_client.get = mock_requests_get
       failures = reasons_splitter.LayoutTestsSplitter.split_step(
           {'name': 'webkit_tests'}, k_mock_build, k_mock_builder_name,
           k_mock_master_url)
       self.assertEqual(failures, ['test2:FAIL'])
     finally:
-      requests.get = old_requests_get
+      http_client.get = old_requests_get
 
   def test_layout_test_split_step_404(self):
     def mock_requests_get(base_url, params):
       # Unused argument - pylint: disable=W0613
       return MockJsonResponse(status_code=404)
 
-    old_requests_get = requests.get
+    old_requests_get = http_client.get
     # TODO(ojan): Import httpretty so we don't have to do these try/finally
     # shenanigans.
     try:
-      requests.get = mock_requests_get
+      http_client.get = mock_requests_get
       failures = reasons_splitter.LayoutTestsSplitter.split_step(
           k_mock_step, k_mock_build, k_mock_builder_name, k_mock_master_url)
       self.assertIsNone(failures)
     finally:
-      requests.get = old_requests_get
+      http_client.get = old_requests_get
 
   def test_failed_tests(self):
     tests = {
@@ -120,6 +135,20 @@ class SplitterTests(unittest.TestCase):
     self.assertTrue('test5' in failed)
     self.assertFalse('test6' in failed)
 
+  def test_compile_failure_from_lines(self):
+    failure_from_lines = reasons_splitter.CompileSplitter.failure_from_lines
+    def lines():
+      yield 'ninja: Entering directory `out/Release\''
+      yield 'FAILED: /b/build/goma/gomacc ...'
+      yield '../../v8/src/base/time.cc:590:7: error: use of undeclared'
+      self.fail('read past the failure')  # pragma: no cover
+
+    self.assertEqual(failure_from_lines(lines()),
+                     ['../../v8/src/base/time.cc:590'])
+    self.assertIsNone(failure_from_lines(['FAILED: foo', 'no location']))
+    self.assertIsNone(failure_from_lines(['all good']))
+    self.assertIsNone(failure_from_lines([]))
+
   def test_handles_step(self):
     name_tests = [
       ('compile', reasons_splitter.CompileSplitter),
@@ -35,6 +35,10 @@ GIT_SVN_ID = 'git-svn-id'
 C_PICK = re.compile(r'\(cherry picked from commit [a-fA-F0-9]{40}\)')
 
 
+# Maximum number of commit contents memoized by ``content_of``.
+CONTENT_CACHE_SIZE = 4096
+_content_cache = collections.OrderedDict()  # {commit hash: CommitData}
+
 # How long to wait for 'git push' to complete before forcefully killing it.
 PUSH_TIMEOUT = 18 * 60
 
@@ -120,12 +124,14 @@ def content_of(commit):
     * the 'git-svn-id' footer.
     * the '(cherry picked from ...)' line.
 
-  Stores a cached copy of the result data on the ``commit`` instance itself.
+  Results are memoized by commit hash (in a bounded LRU), so they survive the
+  Commit instance itself being evicted from the Repo's commit cache.
   """
-  if commit is None:
+  if commit is None or commit is git2.INVALID:
     return git2.INVALID
 
-  if not hasattr(commit, '_cr_content'):
+  content = _content_cache.pop(commit.hsh, None)
+  if content is None:
     d = commit.data
 
     d = tweak_cherry_pick(d)
@@ -136,11 +142,14 @@ def content_of(commit):
       if k.startswith(FOOTER_PREFIX):
         footers[k] = None
 
-    commit._cr_content = d.alter(
+    content = d.alter(
         parents=(),
         committer=d.committer.alter(timestamp=git2.data.NULL_TIMESTAMP),
         footers=footers)
-  return commit._cr_content  # pylint: disable=W0212
+    while len(_content_cache) >= CONTENT_CACHE_SIZE:
+      _content_cache.popitem(last=False)
+  _content_cache[commit.hsh] = content
+  return content
 
 
 def content_difference(ref_a, ref_b):
@@ -276,7 +285,9 @@ def synthesize_commit(commit, new_parent, ref, git_svn_mode, clock=time):
   if git_svn_mode and git_svn_footer:
     d = d.alter(footers={GIT_SVN_ID: git_svn_footer})
 
-  return repo.get_commit(repo.intern(d, 'commit'))
+  # The synthesized commits are only needed once they're pushed, so let the
+  # repo write them all in one go.
+  return repo.get_commit(repo.intern(d, 'commit', defer=True))
 
 
 def generate_footers_from_parent(new_parent, ref):
@@ -366,7 +377,7 @@ def get_new_commits(real_ref, pending_tag, pending_tip):
     [git2.Commit] or None
   """
   assert pending_tag.commit != pending_tip.commit
-  new_commits = list(pending_tag.to(pending_tip))
+  new_commits = list(pending_tag.to(pending_tip, prefetch=True))
   if not new_commits:
     LOGGER.error('%r doesn\'t match %r, but there are no new_commits?',
                  pending_tag.ref, pending_tip.ref)
@@ -487,6 +498,10 @@ def process_repo(repo, cref, clock=time):
     assert ref.ref.startswith('refs/')
     return repo['/'.join((prefix, ref.ref[len('refs/'):]))]
 
+  # Resolve every ref up front with a single `git for-each-ref`, rather than a
+  # lookup per real ref/pending tag/pending tip.
+  repo.snapshot_refs()
+
   success = True
   synthesized_commits = []
   for refglob in enabled_refglobs:
@@ -652,3 +652,20 @@ def cherry_pick_x_regression(origin, _local, _config_ref, RUN, CHECKPOINT):
   CHECKPOINT('Now we see a double-cherry-pick')
   RUN()
   CHECKPOINT('Should see two Cr-Original footers')
+
+
+@gnumbd_test
+def content_cache_eviction(origin, _local, _config_ref, _RUN, _CHECKPOINT):
+  old_size = gnumbd.CONTENT_CACHE_SIZE
+  gnumbd.CONTENT_CACHE_SIZE = 1
+  try:
+    first = origin[REAL].make_full_tree_commit(
+      'First commit', footers=gnumbd_footers(origin[REAL], 100))
+    second = origin[REAL].make_full_tree_commit('Second commit')
+    content = content_of(first)
+    assert content_of(first) is content
+    assert content_of(second) is not content
+    assert content_of(first) == content
+    assert len(gnumbd._content_cache) == 1  # pylint: disable=W0212
+  finally:
+    gnumbd.CONTENT_CACHE_SIZE = old_size
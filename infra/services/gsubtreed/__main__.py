@@ -41,6 +41,15 @@ def parse_args(args):  # pragma: no cover
                             '(default: %(default)s)'))
   parser.add_argument('--json_output', metavar='PATH',
                       help='Path to write JSON with results of the run to')
+  parser.add_argument('--commit_cache_size', metavar='N', type=int,
+                      default=git2.CommitCache.DEFAULT_MAX_ENTRIES,
+                      help=('Max number of commits to keep in memory '
+                            '(default: %(default)s)'))
+  parser.add_argument('--commit_cache_max_bytes', metavar='BYTES', type=int,
+                      help='Max total size of the commits kept in memory')
+  parser.add_argument('--commit_cache_dir', metavar='DIR',
+                      help=('Directory in which to persist the commit cache '
+                            'across restarts'))
   parser.add_argument('repo', nargs=1, help='The url of the repo to act on.',
                       type=check_url)
   logs.add_argparse_options(parser)
@@ -57,6 +66,11 @@ def parse_args(args):  # pragma: no cover
   repo = opts.repo[0]
   repo.dry_run = opts.dry_run
   repo.repos_dir = os.path.abspath(opts.repo_dir)
+  repo.commit_cache = git2.CommitCache(
+      max_entries=opts.commit_cache_size,
+      max_bytes=opts.commit_cache_max_bytes,
+      persist_dir=(os.path.abspath(opts.commit_cache_dir)
+                   if opts.commit_cache_dir else None))
 
   if not opts.ts_mon_task_job_name:
     opts.ts_mon_task_job_name = urlparse.urlparse(repo.url).path
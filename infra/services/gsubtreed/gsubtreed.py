@@ -7,6 +7,9 @@ import logging
 import posixpath
 import sys
 import threading
+import time
+
+from multiprocessing.pool import ThreadPool
 
 from infra.libs.git2 import CalledProcessError
 from infra.libs.git2 import INVALID
@@ -16,6 +19,7 @@ from infra.libs.git2 import repo
 from infra.services.gnumbd.gnumbd import FOOTER_PREFIX
 from infra.services.gnumbd.gnumbd import GIT_SVN_ID
 from infra.services.gnumbd.gnumbd import PUSH_TIMEOUT
+from infra_libs import ts_mon
 
 LOGGER = logging.getLogger(__name__)
 
@@ -25,6 +29,10 @@ MIRRORED_COMMIT = FOOTER_PREFIX + 'Mirrored-Commit'
 # Can be reproduced with `git mktree --batch <<< ''`
 EMPTY_TREE = '4b825dc642cb6eb9a060e54bf8d69288fbee4904'
 
+path_duration = ts_mon.FloatMetric('gsubtreed/path_duration',
+    description='Seconds spent synthesizing commits for a path in the most '
+                'recent loop (excluding the push)')
+
 ################################################################################
 # ConfigRef
 ################################################################################
@@ -53,6 +61,8 @@ class GsubtreedConfigRef(config_ref.ConfigRef):
 
     'path_extra_push': lambda self, val: {
       str(k): set(str(x) for x in v) for k, v in val.iteritems()},
+
+    'path_parallelism': lambda self, val: max(1, int(val)),
   }
 
   DEFAULTS = {
@@ -64,6 +74,8 @@ class GsubtreedConfigRef(config_ref.ConfigRef):
 
     'path_map_exceptions': {},
     'path_extra_push': {},
+
+    'path_parallelism': 1,
   }
   """These fields are documented in README.md"""
 
@@ -110,6 +122,14 @@ class Pusher(threading.Thread):
     return self._success
 
   def _push(self):
+    try:
+      self._push_all()
+    finally:
+      # Stops the git cat-file processes of the subtree repo, which is
+      # created anew for every loop.
+      self._repo.close()
+
+  def _push_all(self):
     try:
       self._output = self._repo.fast_forward_push(
           self._pushspec, include_err=True, timeout=PUSH_TIMEOUT)
@@ -142,6 +162,30 @@ def process_path(path, origin_repo, config):
   if path in config['path_map_exceptions']:
     subtree_repo_path = config['path_map_exceptions'][path]
   subtree_repo = repo.Repo(posixpath.join(base_url, subtree_repo_path))
+  try:
+    success, synthed_count, subtree_repo_push = _synthesize_path(
+        path, origin_repo, subtree_repo, mirror_url, config)
+  except Exception:
+    subtree_repo.close()
+    raise
+
+  # The synthesized commits were interned lazily into origin_repo; make sure
+  # they're on disk before subtree_repo (which borrows its objects) pushes them.
+  origin_repo.flush_interned()
+  # Closes subtree_repo once it has pushed.
+  t = Pusher(path, subtree_repo, subtree_repo_push,
+             config['path_extra_push'].get(path, []))
+  t.start()
+
+  return success, synthed_count, t
+
+
+def _synthesize_path(path, origin_repo, subtree_repo, mirror_url, config):
+  """Synthesizes the subtree commits of path for all the enabled refs.
+
+  Returns:
+    (success, #commits_synthesized, {subtree Ref: commit to push})
+  """
   subtree_repo.repos_dir = origin_repo.repos_dir
   subtree_repo.reify(share_from=origin_repo)
   subtree_repo_push = {}
@@ -183,23 +227,20 @@ def process_path(path, origin_repo, config):
 
       LOGGER.info('starting with tree %r', synth_parent.data.tree)
 
-      for commit in origin_repo[processed.hsh].to(ref, path, first_parent=True):
+      commits = list(origin_repo[processed.hsh].to(
+          ref, path, first_parent=True, prefetch=True))
+      path_infos = origin_repo.path_infos(commits, path)
+      for commit in commits:
         LOGGER.info('processing %s', commit)
-        obj_name = '{.hsh}:{}'.format(commit, path)
-        dir_tree = None
-        try:
-          typ = origin_repo.run('cat-file', '-t', obj_name).strip()
-          if typ != 'tree':
-            LOGGER.warn('path %r is not a tree in commit %s', path, commit)
-            continue
-          else:
-            dir_tree = origin_repo.run('rev-parse', obj_name).strip()
-        except CalledProcessError as ex:
-          if ex.returncode == 128 and 'Not a valid object name' in ex.stderr:
-            LOGGER.warn('path %r was deleted in commit %s', path, commit)
-            dir_tree = EMPTY_TREE
-          else:
-            raise  # pragma: no cover
+        info = path_infos[commit.hsh]
+        if info is None:
+          LOGGER.warn('path %r was deleted in commit %s', path, commit)
+          dir_tree = EMPTY_TREE
+        elif info.typ != 'tree':
+          LOGGER.warn('path %r is not a tree in commit %s', path, commit)
+          continue
+        else:
+          dir_tree = info.hsh
 
         LOGGER.info('found new tree %r', dir_tree)
 
@@ -223,6 +264,7 @@ def process_path(path, origin_repo, config):
 
         synthed_count += 1
         synth_parent = commit.alter(
+          defer=True,
           parents=[synth_parent.hsh] if synth_parent is not INVALID else [],
           tree=dir_tree,
           footers=collections.OrderedDict(footers),
@@ -231,11 +273,7 @@ def process_path(path, origin_repo, config):
       if synth_parent is not INVALID and synth_parent != last_push:
         subtree_repo_push[subtree_repo[ref.ref]] = synth_parent
 
-  t = Pusher(path, subtree_repo, subtree_repo_push,
-             config['path_extra_push'].get(path, []))
-  t.start()
-
-  return success, synthed_count, t
+  return success, synthed_count, subtree_repo_push
 
 
 def inner_loop(origin_repo, config):
@@ -248,19 +286,45 @@ def inner_loop(origin_repo, config):
   origin_repo.fetch()
   config.evaluate()
 
-  threads = []
-  success = True
-  processed = {}
-  for path in config['enabled_paths']:
+  def run_path(path):
     LOGGER.info('processing path %r', path)
+    start = time.time()
     try:
-      path_success, num_synthed, t = process_path(path, origin_repo, config)
-      threads.append(t)
-      success = path_success and success
-      processed[path] = num_synthed
+      return process_path(path, origin_repo, config)
     except Exception:  # pragma: no cover
       LOGGER.exception('Caught in inner_loop')
+      return None
+    finally:
+      duration = time.time() - start
+      LOGGER.debug('path %r took %.1f sec', path, duration)
+      path_duration.set(duration, fields={'path': path})
+
+  # Paths are independent of each other (they only share origin_repo, which is
+  # safe to use from multiple threads), so they may be synthesized
+  # concurrently.
+  paths = config['enabled_paths']
+  parallelism = min(config['path_parallelism'], len(paths))
+  if parallelism > 1:
+    pool = ThreadPool(parallelism)
+    try:
+      results = pool.map(run_path, paths)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    results = map(run_path, paths)
+
+  threads = []
+  success = True
+  processed = {}
+  for path, result in zip(paths, results):
+    if result is None:  # pragma: no cover
       success = False
+      continue
+    path_success, num_synthed, t = result
+    threads.append(t)
+    success = path_success and success
+    processed[path] = num_synthed
 
   for t in threads:
     rslt = t.get_result()
@@ -0,0 +1,126 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Checks properties of gsubtreed.inner_loop which the expectations of
+gsubtreed_test can't capture."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import psutil
+
+from infra.libs.git2 import testing_support
+from infra.services.gsubtreed import gsubtreed
+
+
+ENABLED_PATHS = ['mirrored_path/subpath', 'mirrored_path', 'other_path']
+
+
+def cat_file_children():
+  """Returns the `git cat-file` processes started by this process."""
+  children = []
+  for child in psutil.Process().children():
+    try:
+      if 'cat-file' in child.cmdline():
+        children.append(child)
+    except psutil.NoSuchProcess:  # pragma: no cover
+      pass
+  return children
+
+
+class InnerLoopTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp('.gsubtreed.remote_repos')
+    self.make_repos()
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def make_repos(self):
+    """Makes a new origin repo and new subtree mirrors, from the same clock
+    time."""
+    self.base_repo_path = tempfile.mkdtemp(dir=self.tempdir)
+    self.clock = testing_support.TestClock()
+    self.origin = testing_support.TestRepo('origin', self.clock)
+    self.mirrors = {}
+    for path in ENABLED_PATHS:
+      full_path = os.path.join(self.base_repo_path, path)
+      if not os.path.isdir(full_path):
+        os.makedirs(full_path)
+      mirror = testing_support.TestRepo(
+          'mirror(%s)' % path, self.clock, 'fake')
+      mirror._repo_path = full_path
+      mirror.run('init', '--bare')
+      self.mirrors[path] = mirror
+
+  def configure(self, **values):
+    config = {
+      'enabled_paths': ENABLED_PATHS,
+      'base_url': 'file://' + self.base_repo_path,
+    }
+    config.update(values)
+    self.origin[gsubtreed.GsubtreedConfigRef.REF].make_commit(
+        'update config', {'config.json': json.dumps(config)})
+
+  def make_commits(self):
+    mc = self.origin['refs/heads/master'].make_commit
+    mc('first commit', {'mirrored_path': {'subpath': {'file': 'a'}}})
+    mc('second commit', {
+      'mirrored_path': {'subpath': {'file': 'b'}, 'other': 'c'},
+      'other_path': {'file': 'd'},
+    })
+    mc('unrelated commit', {'unrelated': 'e'})
+    self.origin['refs/heads/branch'].make_commit(
+        'branch commit', {'other_path': {'file': 'f'}})
+
+  def run_loop(self):
+    local = testing_support.TestRepo(
+        'local', self.clock, self.origin.repo_path)
+    local.reify()
+    try:
+      return gsubtreed.inner_loop(local, gsubtreed.GsubtreedConfigRef(local))
+    finally:
+      local.close()
+
+  def test_no_cat_file_leak(self):
+    self.configure()
+    self.make_commits()
+    # Only leave the processes started by inner_loop.
+    self.origin.close()
+    self.assertEqual([], cat_file_children())
+
+    success, processed = self.run_loop()
+    self.assertTrue(success)
+    self.assertEqual(2, processed['mirrored_path'])
+
+    self.origin['refs/heads/master'].make_commit(
+        'third commit', {'mirrored_path': {'subpath': {'file': 'g'}}})
+    self.origin.close()
+    self.assertTrue(self.run_loop()[0])
+    self.assertEqual([], cat_file_children())
+
+  def test_path_parallelism(self):
+    def run_with_parallelism(parallelism):
+      self.make_repos()
+      self.configure(path_parallelism=parallelism)
+      self.make_commits()
+      success, processed = self.run_loop()
+      snaps = dict((path, mirror.snap())
+                   for path, mirror in self.mirrors.iteritems())
+      return success, processed, snaps
+
+    serial = run_with_parallelism(1)
+    self.assertEqual(
+        (True, {'mirrored_path/subpath': 2, 'mirrored_path': 2,
+                'other_path': 2}),
+        serial[:2])
+    self.assertEqual(['refs/heads/branch', 'refs/heads/master'],
+                     sorted(serial[2]['other_path']))
+
+    # Repeated, since the synthesis of the paths races in the parallel run.
+    for _ in xrange(3):
+      self.assertEqual(serial, run_with_parallelism(3))
@@ -90,6 +90,13 @@ def ParseArgs(argv):
   input_group.add_argument('--max-threads', '-j', type=int, default=4,
                            help='Maximum number of parallel json requests. A '
                                 'value of zero means full parallelism.')
+  input_group.add_argument('--collated-builds', metavar='FILE',
+                           default=NOTSET,
+                           help='Remember the builds collated from Buildbot '
+                                'JSON in this file, so that the next run only '
+                                'fetches newer builds. Defaults to '
+                                'workdir/<project>.builds.json, an empty '
+                                'value disables it.')
 
   output_group = parser.add_argument_group('Output data formats')
   output_group.add_argument('--dry-run', '-n', action='store_true',
@@ -101,7 +108,9 @@ def ParseArgs(argv):
   output_group.add_argument('--write-to-file', metavar='FILE',
                             help='Write the LKGR to the specified file.')
   output_group.add_argument('--dump-build-data', metavar='FILE',
-                            help='Dump the build data to the specified file.')
+                            help='Dump the build data to the specified file. '
+                                 'Builds known from --collated-builds are '
+                                 'dumped as null.')
   output_group.add_argument('--html', metavar='FILE',
                             help='Output data in HTML format for debugging.')
   output_group.add_argument('--email-errors', action='store_true',
@@ -169,7 +178,19 @@ def main(argv):
       config['source_vcs'], config['source_url'],
       os.path.join(os.path.dirname(os.path.abspath(__file__)),
                    'workdir', args.project))
+  try:
+    return UpdateLKGR(args, config, repo)
+  finally:
+    # Once, rather than after every lookup of new revisions.
+    repo.flush()
 
+
+def UpdateLKGR(args, config, repo):
+  """Finds the new LKGR candidate of the project, and updates its LKGR if the
+  candidate is newer.
+
+  Returns the exit code of main.
+  """
   monkeypatch_rev_map = config.get('monkeypatch_rev_map')
   if monkeypatch_rev_map:
     repo._position_cache.update(monkeypatch_rev_map)
@@ -183,10 +204,20 @@ def main(argv):
       return 1
   else:
     lkgr_builders = config['masters']
+    collated = None
+    collated_path = None
     if args.build_data:
       builds = lkgr_lib.ReadBuildData(args.build_data)
     else:
-      builds = lkgr_lib.FetchBuildData(lkgr_builders, args.max_threads)
+      collated_path = args.collated_builds
+      if collated_path is NOTSET:
+        collated_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            'workdir', '%s.builds.json' % args.project)
+      if collated_path:
+        collated = lkgr_lib.ReadCollatedBuilds(collated_path)
+      builds = lkgr_lib.FetchBuildData(lkgr_builders, args.max_threads,
+                                       collated)
 
     if args.dump_build_data:
       try:
@@ -197,7 +228,9 @@ def main(argv):
                     (args.dump_build_data, repr(e)))
 
     (build_history, revisions) = lkgr_lib.CollateRevisionHistory(
-        builds, lkgr_builders, repo)
+        builds, lkgr_builders, repo, collated)
+    if collated_path:
+      lkgr_lib.WriteCollatedBuilds(collated, collated_path)
 
     status_gen = status_generator.StatusGeneratorStub()
     if args.html:
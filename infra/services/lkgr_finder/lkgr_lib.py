@@ -11,14 +11,13 @@ import ast
 import datetime
 import json
 import logging
+import multiprocessing.dummy
 import os
-import Queue
 import re
 import smtplib
 import socket
 import subprocess
 import sys
-import threading
 import xml.etree.ElementTree as xml
 
 import requests
@@ -93,6 +92,10 @@ class VCSWrapper(object):
     latest = self.sort(revisions)[-1]
     return self.keyfunc(latest) - self.keyfunc(r)
 
+  def flush(self):  # pragma: no cover
+    """Persist what was learned about revisions, once done with them."""
+    pass
+
   @staticmethod
   def new(vcs, url, path):  # pragma: no cover
     """Factory function to return a GitWrapper or a SvnWrapper."""
@@ -104,14 +107,65 @@ class VCSWrapper(object):
       raise NotImplementedError
 
 
+def ParseCommitRecord(record):
+  """Parses one record of `git log -z --format=%H %ct%n%B`.
+
+  Returns:
+    A tuple (hash, (position_num, position_ref) or None, commit_time).
+  """
+  header, _, body = record.lstrip('\n').partition('\n')
+  hsh, ct = header.split()
+  position = None
+  for line in reversed(body.splitlines()):
+    if line.startswith('Cr-Commit-Position: '):
+      match = GitWrapper._GIT_POS_RE.match(line.split()[-1].strip())
+      if match:
+        position = (int(match.group(2)), match.group(1))
+      break
+  return hsh, position, int(ct)
+
+
+def SplitRecords(chunks, sep='\0'):
+  """Yields the sep-separated records from an iterable of string chunks."""
+  pending = ''
+  for chunk in chunks:
+    pending += chunk
+    records = pending.split(sep)
+    pending = records.pop()
+    for record in records:
+      if record:
+        yield record
+  if pending:
+    yield pending
+
+
 class GitWrapper(VCSWrapper):
+  """Git repository, with commit positions and commit times looked up in an
+  index persisted next to the checkout.
+
+  The index is extended once per run, from a single `git log` pass over the
+  commits which are new since the previous run. Commits which aren't in the
+  index (e.g. older than MAX_INDEX_COMMITS) are numbered one by one, and
+  added to the index as well. The index is only written back by flush().
+  """
   _status_path = '/git-lkgr'
   _GIT_HASH_RE = re.compile('^[a-fA-F0-9]{40}$')
   _GIT_POS_RE = re.compile('(\S+)@{#(\d+)}')
+  # Maximum number of commits read when building the index from scratch.
+  MAX_INDEX_COMMITS = 100000
+  _LOG_CHUNK_SIZE = 64 * 1024
 
-  def __init__(self, url, path):  # pragma: no cover
+  def __init__(self, url, path, index_path=None):
     self._git = git.NewGit(url, path)
     self._position_cache = {}
+    self._commit_times = {}
+    self._index_tips = []
+    self._index_updated = False
+    # Whether the index has changed since it was loaded or saved.
+    self._index_dirty = False
+    self._index_path = index_path or (
+        os.path.abspath(path).rstrip(os.sep) + '.positions.json')
+    self._load_index()
     LOGGER.debug('Local git repository located at %s', self._git.path)
 
   def check_rev(self, r):  # pragma: no cover
@@ -119,8 +173,80 @@ class GitWrapper(VCSWrapper):
       return False
     return bool(self._GIT_HASH_RE.match(r))
 
+  def _load_index(self):
+    try:
+      with open(self._index_path, 'r') as f:
+        index = json.load(f)
+    except (IOError, ValueError) as e:
+      LOGGER.debug('No commit position index at %s: %s', self._index_path, e)
+      return
+    self._index_tips = index['tips']
+    for hsh, (num, ref, ct) in index['commits'].iteritems():
+      self._position_cache[hsh] = None if num is None else (num, ref)
+      if ct is not None:
+        self._commit_times[hsh] = ct
+    LOGGER.debug('Loaded %d commits from %s', len(self._position_cache),
+                 self._index_path)
+
+  def _save_index(self):
+    commits = {}
+    for hsh, key in self._position_cache.iteritems():
+      num, ref = key or (None, None)
+      commits[hsh] = (num, ref, self._commit_times.get(hsh))
+    tmp_path = self._index_path + '.tmp'
+    try:
+      with open(tmp_path, 'w') as f:
+        json.dump({'tips': self._index_tips, 'commits': commits}, f)
+      os.rename(tmp_path, self._index_path)
+    except (IOError, OSError) as e:
+      LOGGER.warn('Could not write commit position index to %s: %s',
+                  self._index_path, e)
+
+  def _log(self, *args):
+    """Yields the records of `git log -z --format=%H %ct%n%B <args>`."""
+    cmd = ['git', 'log', '-z', '--format=%H %ct%n%B'] + list(args)
+    LOGGER.debug('Running `%s`', ' '.join(cmd))
+    proc = subprocess.Popen(cmd, cwd=self._git.path, stdout=subprocess.PIPE)
+    chunks = iter(lambda: proc.stdout.read(self._LOG_CHUNK_SIZE), '')
+    for record in SplitRecords(chunks):
+      yield record
+    if proc.wait():
+      raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+  def _update_index(self):
+    """Indexes the commits which are new since the previous run, once."""
+    if self._index_updated:
+      return
+    self._index_updated = True
+    tips = self._git('for-each-ref', '--format=%(objectname)',
+                     'refs/remotes/origin').split()
+    if set(tips) <= set(self._index_tips):
+      return
+    args = ['--max-count=%d' % self.MAX_INDEX_COMMITS] + tips
+
+    def parse(records):
+      return [ParseCommitRecord(record) for record in records]
+    try:
+      commits = parse(self._log(*(args + ['--not'] + self._index_tips)))
+    except subprocess.CalledProcessError:
+      # An old tip disappeared (e.g. was rewritten); start over.
+      commits = parse(self._log(*args))
+    for hsh, position, ct in commits:
+      # Don't override monkeypatched positions.
+      self._position_cache.setdefault(hsh, position)
+      self._commit_times.setdefault(hsh, ct)
+    self._index_tips = tips
+    self._index_dirty = True
+    LOGGER.debug('Indexed %d new commits', len(commits))
+
   def _cache(self, *revs):  # pragma: no cover
     unknown_revs = [r for r in revs if r not in self._position_cache]
+    if not unknown_revs:
+      return
+    self._update_index()
+    unknown_revs = [r for r in unknown_revs if r not in self._position_cache]
+    if not unknown_revs:
+      return
     positions = self._git.number(*unknown_revs)
     # We know we only care about revisions along a single branch.
     keys = []
@@ -132,15 +258,15 @@ class GitWrapper(VCSWrapper):
         key = None
       keys.append(key)
     self._position_cache.update(dict(zip(unknown_revs, keys)))
+    self._index_dirty = True
 
   def keyfunc(self, r):  # pragma: no cover
     # Returns a tuple (commit-position-number, commit-position-ref).
     if not self.check_rev(r):
       return (-1, '')
-    k = self._position_cache.get(r)
-    if k is None:
+    if r not in self._position_cache:
       self._cache(r)
-      k = self._position_cache.get(r)
+    k = self._position_cache.get(r)
     if k is None:
       return (-1, '')
     return k
@@ -151,7 +277,14 @@ class GitWrapper(VCSWrapper):
     return sorted(revisions, key=lambda x: self.keyfunc(keyfunc(x)))
 
   def get_lag(self, r):  # pragma: no cover
-    ts = self._git.show(r, '', '--format=format:%ct').split('\n', 1)[0].strip()
+    ts = self._commit_times.get(r)
+    if ts is None:
+      self._update_index()
+      ts = self._commit_times.get(r)
+    if ts is None:
+      ts = self._git.show(r, '', '--format=format:%ct').split('\n', 1)[0]
+      ts = self._commit_times[r] = int(ts.strip())
+      self._index_dirty = True
     dt = datetime.datetime.utcfromtimestamp(float(ts))
     return datetime.datetime.utcnow() - dt
 
@@ -159,6 +292,11 @@ class GitWrapper(VCSWrapper):
     latest = self.sort(revisions)[-1]
     return self.keyfunc(latest)[0] - self.keyfunc(r)[0]
 
+  def flush(self):
+    if self._index_dirty:
+      self._save_index()
+      self._index_dirty = False
+
 class SvnWrapper(VCSWrapper):
   _status_path = '/lkgr'
 
@@ -197,34 +335,57 @@ class SvnWrapper(VCSWrapper):
 ##################################################
 # Input Functions
 ##################################################
-def FetchBuilderJson(fetch_q):  # pragma: no cover
-  """Pull build json from buildbot masters.
+# Maximum number of builds requested from buildbot at once.
+SELECT_BATCH_SIZE = 50
+
+
+def FetchBuilderJson(session, master_url, builder,
+                     known_builds=()):  # pragma: no cover
+  """Pull build json for one builder from a buildbot master.
+
+  Only the builds which aren't in known_builds are downloaded.
 
   Args:
-    @param fetch_q: A pre-populated Queue.Queue containing tuples of:
-      master_url: Url of the buildbot master to get json from.
-      builder: Name of the builder on that master.
-      output_builds: Output dictionary of builder to build data.
-    @type fetch_q: tuple
+    @param session: requests.Session to fetch over.
+    @param master_url: Url of the buildbot master to get json from.
+    @param builder: Name of the builder on that master.
+    @param known_builds: Build numbers (as strings) which are already known
+      from a previous run.
+
+  Returns:
+    A dict of build number to build json, for all the builds the master has
+    cached. Builds in known_builds have None instead of their json. Returns
+    None if the data couldn't be fetched.
   """
-  while True:
-    try:
-      master_url, builder, output_builds = fetch_q.get(False)
-    except Queue.Empty:
-      return
-    url = '%s/json/builders/%s/builds/_all' % (master_url, builder)
-    LOGGER.debug('Fetching buildbot json from %s', url)
-    try:
-      r = requests.get(url, params={'filter': 'false'})
-      builder_history = r.json()
-      output_builds[builder] = builder_history
-    except requests.exceptions.RequestException as e:
-      LOGGER.error('RequestException while fetching %s:\n%s', url, repr(e))
+  builder_url = '%s/json/builders/%s' % (master_url, builder)
+  LOGGER.debug('Fetching buildbot json from %s', builder_url)
+  try:
+    r = session.get(builder_url)
+    r.raise_for_status()
+    cached = [str(num) for num in r.json().get('cachedBuilds', [])]
+    builds = {num: None for num in cached if num in known_builds}
+    wanted = [num for num in cached if num not in known_builds]
+    for i in xrange(0, len(wanted), SELECT_BATCH_SIZE):
+      params = [('select', num) for num in wanted[i:i + SELECT_BATCH_SIZE]]
+      params.append(('filter', 'false'))
+      r = session.get(builder_url + '/builds', params=params)
+      r.raise_for_status()
+      builds.update(r.json())
+  except requests.exceptions.RequestException as e:
+    LOGGER.error('RequestException while fetching %s:\n%s', builder_url,
+                 repr(e))
+    return None
+  LOGGER.debug('Fetched %d new builds (%d known) for %s', len(wanted),
+               len(cached) - len(wanted), builder_url)
+  return builds
 
 
-def FetchBuildData(masters, max_threads=0):  # pragma: no cover
+def FetchBuildData(masters, max_threads=0,
+                   known_builds=None):  # pragma: no cover
   """Fetch all build data about the builders in the input masters.
 
+  All requests share a pool of keep-alive connections.
+
   Args:
     @param masters: Dictionary of the form
     { master: {
@@ -235,23 +396,47 @@ def FetchBuildData(masters, max_threads=0):  # pragma: no cover
     @type masters: dict
     @param max_threads: Maximum number of parallel requests.
     @type max_threads: int
+    @param known_builds: Dictionary of the form
+    { master: { builder: [build numbers] } } of the builds which don't need to
+    be fetched again (see CollateRevisionHistory).
+    @type known_builds: dict
+
+  Returns:
+    A dict of the form { master: { builder: { build_num: build_json } } },
+    where build_json is None for known builds.
   """
+  known_builds = known_builds or {}
   build_data = {master: {} for master in masters}
-  fetch_q = Queue.Queue()
+  jobs = []
   for master, master_data in masters.iteritems():
-    master_url = master_data['base_url']
-    builders = master_data['builders']
-    for builder in builders:
-      fetch_q.put((master_url, builder, build_data[master]))
-  fetch_threads = set()
+    for builder in master_data['builders']:
+      jobs.append((master, master_data['base_url'], builder))
+  if not jobs:
+    return build_data
   if not max_threads:
-    max_threads = fetch_q.qsize()
-  for _ in xrange(max_threads):
-    th = threading.Thread(target=FetchBuilderJson, args=(fetch_q,))
-    th.start()
-    fetch_threads.add(th)
-  for th in fetch_threads:
-    th.join()
+    max_threads = len(jobs)
+  max_threads = min(max_threads, len(jobs))
+
+  session = requests.Session()
+  adapter = requests.adapters.HTTPAdapter(pool_connections=len(masters),
+                                          pool_maxsize=max_threads)
+  session.mount('http://', adapter)
+  session.mount('https://', adapter)
+
+  def fetch(job):
+    master, master_url, builder = job
+    known = known_builds.get(master, {}).get(builder, ())
+    return FetchBuilderJson(session, master_url, builder, known)
+
+  pool = multiprocessing.dummy.Pool(processes=max_threads)
+  try:
+    results = pool.map(fetch, jobs)
+  finally:
+    pool.close()
+    pool.join()
+  for (master, _, builder), builds in zip(jobs, results):
+    if builds is not None:
+      build_data[master][builder] = builds
 
   return build_data
 
@@ -306,13 +491,68 @@ def EvaluateBuildData(build_data):  # pragma: no cover
   return status
 
 
-def CollateRevisionHistory(build_data, lkgr_builders, repo):  # pragma: no cover
+def IsBuildFinished(build_data):  # pragma: no cover
+  """Returns true if build_data is of a build which will never change again."""
+  return (build_data.get('currentStep') is None and
+          (build_data.get('times') or [None])[-1] is not None)
+
+
+def CollateBuild(build_data, repo):  # pragma: no cover
+  """Returns the (revision, status) of a build, or None to ignore it."""
+  txt = build_data.get('text', [])
+  if 'exception' in txt and 'slave' in txt and 'lost' in txt:
+    return None
+  revision = None
+  for prop in build_data.get('properties', []):
+    # Revision fallthrough:
+    # * If there is a got_src_revision, we probably want to use that,
+    #   because otherwise it wouldn't be specified.
+    # * If we're in Git and there's a got_revision_git, might as well
+    #   use that since it is guaranteed to be the righ type.
+    # * Finally, just use the default got_revision.
+    if prop[0] == 'got_src_revision':
+      revision = prop[1]
+      break
+    if type(repo) is GitWrapper and prop[0] == 'got_revision_git':
+      revision = prop[1]
+      break
+    if prop[0] == 'got_revision':
+      revision = prop[1]
+      break
+  status = EvaluateBuildData(build_data)
+  if revision is None:
+    if status is STATUS.FAILURE or status is STATUS.RUNNING:
+      # The build failed too early or is still in early stage even before
+      # chromium revision was tagged. If we allow 'revision' fallback it
+      # will end up being non-chromium revision for non chromium projects.
+      # Or it may end up getting an SVN revision if the build is running.
+      return None
+  if not revision:
+    revision = build_data.get(
+        'sourceStamp', {}).get('revision', None)
+  if not revision:
+    return None
+  if type(repo) is GitWrapper and len(str(revision)) < 40:
+    # Ignore stource stamps that don't contain a proper git hash. This
+    # can happen if very old build numbers get into the build data.
+    return None
+  return (revision, status)
+
+
+def CollateRevisionHistory(build_data, lkgr_builders, repo,
+                           collated=None):  # pragma: no cover
   """Organize complex build data into a simpler form.
 
   Args:
     build_data: json-formatted build data returned by buildbot.
     lkgr_builders: List of interesting builders.
     repo (VCSWrapper): repository in which the revision occurs.
+    collated: If set, a dict of the form
+      ``{master: {builder: {build_num: (revision, status) or None}}}`` holding
+      the result of collating each finished build on previous runs. Builds
+      whose build_data is None (see FetchBuildData) are taken from it, rather
+      than collated again. It is updated in place with the finished builds of
+      build_data, so that it can be persisted for the next run.
 
   Returns:
     A dict of the following form:
@@ -322,6 +562,8 @@ def CollateRevisionHistory(build_data, lkgr_builders, repo):  # pragma: no cover
     ``build_history[master][builder]`` sorted by their revkeys.
 
   """
+  if collated is None:
+    collated = {}
   build_history = {}
   revisions = set()
   # TODO(agable): Make build_data stronly typed, so we're not messing with JSON
@@ -330,64 +572,181 @@ def CollateRevisionHistory(build_data, lkgr_builders, repo):  # pragma: no cover
       continue
     LOGGER.debug('Collating master %s', master)
     master_history = build_history.setdefault(master, {})
+    master_collated = collated.setdefault(master, {})
     for (builder, builder_data) in master_data.iteritems():
       if builder not in lkgr_builders[master]['builders']:
         continue
       LOGGER.debug('Collating builder %s', builder)
+      previous = master_collated.get(builder, {})
+      # Only keep the builds the master still knows about.
+      builder_collated = {}
       builder_history = []
       for build_num in sorted(builder_data.keys(), key=int):
         this_build_data = builder_data[build_num]
-        txt = this_build_data.get('text', [])
-        if 'exception' in txt and 'slave' in txt and 'lost' in txt:
-          continue
-        revision = None
-        for prop in this_build_data.get('properties', []):
-          # Revision fallthrough:
-          # * If there is a got_src_revision, we probably want to use that,
-          #   because otherwise it wouldn't be specified.
-          # * If we're in Git and there's a got_revision_git, might as well
-          #   use that since it is guaranteed to be the righ type.
-          # * Finally, just use the default got_revision.
-          if prop[0] == 'got_src_revision':
-            revision = prop[1]
-            break
-          if type(repo) is GitWrapper and prop[0] == 'got_revision_git':
-            revision = prop[1]
-            break
-          if prop[0] == 'got_revision':
-            revision = prop[1]
-            break
-        status = EvaluateBuildData(this_build_data)
-        if revision is None:
-          if status is STATUS.FAILURE or status is STATUS.RUNNING:
-            # The build failed too early or is still in early stage even before
-            # chromium revision was tagged. If we allow 'revision' fallback it
-            # will end up being non-chromium revision for non chromium projects.
-            # Or it may end up getting an SVN revision if the build is running.
+        if this_build_data is None:
+          # Unchanged since it was collated on a previous run.
+          if build_num not in previous:
             continue
-        if not revision:
-          revision = this_build_data.get(
-              'sourceStamp', {}).get('revision', None)
-        if not revision:
-          continue
-        if type(repo) is GitWrapper and len(str(revision)) < 40:
-          # Ignore stource stamps that don't contain a proper git hash. This
-          # can happen if very old build numbers get into the build data.
+          entry = builder_collated[build_num] = previous[build_num]
+        else:
+          entry = CollateBuild(this_build_data, repo)
+          if IsBuildFinished(this_build_data):
+            builder_collated[build_num] = entry
+        if entry is None:
           continue
+        revision, status = entry
         revisions.add(str(revision))
         builder_history.append((revision, status, build_num))
+      master_collated[builder] = builder_collated
       master_history[builder] = repo.sort(
           builder_history, keyfunc=lambda x: x[0])
   revisions = repo.sort(revisions)
   return (build_history, revisions)
 
 
+def ReadCollatedBuilds(filename):  # pragma: no cover
+  """Read the builds collated on previous runs, as written by
+  WriteCollatedBuilds. Returns an empty dict if there aren't any."""
+  try:
+    with open(filename, 'r') as fh:
+      return json.load(fh)
+  except (IOError, ValueError), e:
+    LOGGER.warn('Could not read collated builds from %s:\n%s\n', filename,
+                repr(e))
+    return {}
+
+
+def WriteCollatedBuilds(collated, filename):  # pragma: no cover
+  """Persist the builds collated by CollateRevisionHistory for the next run."""
+  tmp_filename = filename + '.tmp'
+  try:
+    with open(tmp_filename, 'w') as fh:
+      json.dump(collated, fh)
+    os.rename(tmp_filename, filename)
+  except (IOError, OSError), e:
+    LOGGER.warn('Could not write collated builds to %s:\n%s\n', filename,
+                repr(e))
+
+
+def IndexBuilderHistory(builder_history, rev_keys, revkey):
+  """Precomputes the integer positions of a builder's builds.
+
+  Merges the builds (sorted by revkey) with the sorted revision keys, so that
+  the builds can then be compared to revisions as plain integers.
+
+  Args:
+    builder_history: ``[(revision, status, build_num), ...]``, as from
+      CollateRevisionHistory.
+    rev_keys: The revkeys of the revisions, in order.
+    revkey: Keyfunc to map each revision to a sortable key.
+
+  Returns:
+    Parallel lists ``(positions, exact, statuses, build_nums)``, where
+    ``positions[j]`` is the index of the first revision whose key is not less
+    than that of build j (so that build j is at or before revision i iff
+    ``positions[j] <= i``), and ``exact[j]`` is whether it is equal.
+  """
+  positions, exact, statuses, build_nums = [], [], [], []
+  p = 0
+  num_revisions = len(rev_keys)
+  for revision, status, build_num in builder_history:
+    key = revkey(revision)
+    while p < num_revisions and rev_keys[p] < key:
+      p += 1
+    positions.append(p)
+    exact.append(p < num_revisions and rev_keys[p] == key)
+    statuses.append(status)
+    build_nums.append(build_num)
+  return positions, exact, statuses, build_nums
+
+
+def BuilderStatusRow(positions, exact, statuses, build_nums, num_revisions):
+  """Computes a builder's status at every revision, in a single pass.
+
+  Args:
+    positions, exact, statuses, build_nums: As from IndexBuilderHistory.
+    num_revisions: The number of revisions.
+
+  Returns:
+    Lists ``(row_statuses, row_build_nums)`` of length num_revisions: the
+    status of the builder at each revision, and the number of the build of
+    exactly that revision (or None).
+  """
+  row_statuses = [STATUS.UNKNOWN] * num_revisions
+  row_build_nums = [None] * num_revisions
+  newest = len(positions) - 1
+  j = newest
+  for i in xrange(num_revisions - 1, -1, -1):
+    # Find the newest build at or before revision i.
+    while j >= 0 and positions[j] > i:
+      j -= 1
+    if j < 0:
+      # Older than any build.
+      continue
+    if exact[j] and positions[j] == i:
+      row_statuses[i] = statuses[j]
+      row_build_nums[i] = build_nums[j]
+    elif j == newest or statuses[j] == STATUS.UNKNOWN:
+      # The most recent build is behind revision i.
+      continue
+    # We color space between FAILED and INPROGRESS builds as FAILED,
+    # since that is what it will eventually become.
+    elif statuses[j] == STATUS.SUCCESS and statuses[j + 1] == STATUS.RUNNING:
+      row_statuses[i] = STATUS.RUNNING
+    elif statuses[j] == statuses[j + 1] == STATUS.SUCCESS:
+      row_statuses[i] = STATUS.SUCCESS
+    else:
+      row_statuses[i] = STATUS.FAILURE
+  return row_statuses, row_build_nums
+
+
+def ComputeStatusMatrix(build_history, revisions, revkey):
+  """Computes the status of every builder at every revision.
+
+  Each revision and build is mapped to its key once, after which the builds
+  are merged with the revisions in a single pass per builder, so this takes
+  O(builders * revisions + builds) time.
+
+  Args:
+    build_history: A dict of build data, as from CollateRevisionHistory
+    revisions: A list of revisions/commits that were built, sorted by revkey
+    revkey: Keyfunc to map each revision to a sortable key
+
+  Returns:
+    A tuple ``(lkgr_index, matrix)``. lkgr_index is the index in revisions of
+    the newest revision which has the SUCCESS status on every builder, or
+    None. matrix is a list of ``(master, builder, statuses, build_nums)``, in
+    build_history's iteration order, as from BuilderStatusRow.
+  """
+  rev_keys = [revkey(revision) for revision in revisions]
+  num_revisions = len(revisions)
+  # Number of builders on which each revision succeeded.
+  successes = [0] * num_revisions
+  matrix = []
+  for master, master_history in build_history.iteritems():
+    for builder, builder_history in master_history.iteritems():
+      statuses, build_nums = BuilderStatusRow(
+          *IndexBuilderHistory(builder_history, rev_keys, revkey),
+          num_revisions=num_revisions)
+      for i, status in enumerate(statuses):
+        if status == STATUS.SUCCESS:
+          successes[i] += 1
+      matrix.append((master, builder, statuses, build_nums))
+  lkgr_index = None
+  for i in xrange(num_revisions - 1, -1, -1):
+    if successes[i] == len(matrix):
+      lkgr_index = i
+      break
+  return lkgr_index, matrix
+
+
 def FindLKGRCandidate(build_history, revisions, revkey, status_gen=None):
   """Find an lkgr candidate.
 
   This function performs the meat of the algorithm described in the module
-  docstring. It walks backwards through the revisions, searching for a
-  revision which has the SUCCESS status on every builder.
+  docstring: it searches for the newest revision which has the SUCCESS status
+  on every builder (see ComputeStatusMatrix), and reports the status of every
+  builder at every revision to status_gen, newest revision first.
 
   Returns:
     A single revision (string) chosen as the new LKGR candidate.
@@ -396,60 +755,22 @@ def FindLKGRCandidate(build_history, revisions, revkey, status_gen=None):
     build_history: A dict of build data, as from CollateRevisionHistory
     revisions: A list of revisions/commits that were built
     revkey: Keyfunc to map each revision to a sortable key
-    revcmp: A comparator to sort revisions/commits
     status_gen: An instance of StatusGenerator to output status information
   """
-  lkgr = None
-  builders = []
+  lkgr_index, matrix = ComputeStatusMatrix(build_history, revisions, revkey)
   for master, master_history in build_history.iteritems():
     status_gen.master_cb(master)
-    for builder, builder_history in master_history.iteritems():
+    for builder in master_history:
       status_gen.builder_cb(builder)
-      gen = reversed(builder_history)
-      prev = []
-      try:
-        prev.append(gen.next())
-      except StopIteration:  # pragma: no cover
-        prev.append((NOREV, STATUS.UNKNOWN, -1))
-      builders.append((master, builder, gen, prev))
-  for revision in reversed(revisions):
-    status_gen.revision_cb(revision)
-    good_revision = True
-    for master, builder, gen, prev in builders:
-      try:
-        while revkey(revision) < revkey(prev[-1][0]):
-          prev.append(gen.next())
-      except StopIteration:  # pragma: no cover
-        prev.append((NOREV, STATUS.UNKNOWN, -1))
-
-      # current build matches revision
-      if revkey(revision) == revkey(prev[-1][0]):
-        status = prev[-1][1]
-      elif len(prev) == 1:
-        assert revkey(revision) > revkey(prev[-1][0])
-        # most recent build is behind revision
-        status = STATUS.UNKNOWN
-      elif prev[-1][1] == STATUS.UNKNOWN:  # pragma: no cover
-        status = STATUS.UNKNOWN
-      else:
-        # We color space between FAILED and INPROGRESS builds as FAILED,
-        # since that is what it will eventually become.
-        if prev[-1][1] == STATUS.SUCCESS and prev[-2][1] == STATUS.RUNNING:  # pragma: no cover
-          status = STATUS.RUNNING
-        elif prev[-1][1] == prev[-2][1] == STATUS.SUCCESS:
-          status = STATUS.SUCCESS
-        else:
-          status = STATUS.FAILURE
-      build_num = None
-      if revkey(revision) == revkey(prev[-1][0]):
-        build_num = prev[-1][2]
-      status_gen.build_cb(master, builder, status, build_num)
-      if status != STATUS.SUCCESS:
-        good_revision = False
-    if not lkgr and good_revision:
-      lkgr = revision
-      status_gen.lkgr_cb(revision)
-  return lkgr
+  for i in xrange(len(revisions) - 1, -1, -1):
+    status_gen.revision_cb(revisions[i])
+    for master, builder, statuses, build_nums in matrix:
+      status_gen.build_cb(master, builder, statuses[i], build_nums[i])
+    if i == lkgr_index:
+      status_gen.lkgr_cb(revisions[i])
+  if lkgr_index is None:
+    return None
+  return revisions[lkgr_index]
 
 
 def CheckLKGRLag(lag_age, rev_gap, allowed_lag_hrs, allowed_rev_gap):
@@ -7,8 +7,12 @@
 
 
 import datetime
+import json
 import os
+import shutil
+import subprocess
 import sys
+import tempfile
 import unittest
 
 from infra.services.lkgr_finder import lkgr_lib
@@ -110,6 +114,110 @@ class FindLKGRCandidateTest(unittest.TestCase):
     self.assertEquals(candidate, 5)
 
 
+class ComputeStatusMatrixTest(unittest.TestCase):
+  good = lkgr_lib.STATUS.SUCCESS
+  fail = lkgr_lib.STATUS.FAILURE
+  running = lkgr_lib.STATUS.RUNNING
+  unknown = lkgr_lib.STATUS.UNKNOWN
+  keyfunc = lkgr_lib.SvnWrapper(None, None).keyfunc
+
+  def testIndexBuilderHistory(self):
+    positions, exact, statuses, build_nums = lkgr_lib.IndexBuilderHistory(
+        [(2, self.good, 1), (3, self.fail, 2), (9, self.good, 3)],
+        [1, 2, 4, 5], self.keyfunc)
+    self.assertEqual(positions, [1, 2, 4])
+    self.assertEqual(exact, [True, False, False])
+    self.assertEqual(statuses, [self.good, self.fail, self.good])
+    self.assertEqual(build_nums, [1, 2, 3])
+
+  def testMatrix(self):
+    build_history = {'m1': {
+        'b1': [(2, self.good, 1), (4, self.good, 2), (6, self.fail, 3)],
+        'b2': [(1, self.good, 7), (3, self.good, 8), (5, self.running, 9)],
+        'b3': [],
+    }}
+    revisions = [1, 2, 3, 4, 5, 6, 7]
+    lkgr_index, matrix = lkgr_lib.ComputeStatusMatrix(
+        build_history, revisions, self.keyfunc)
+    self.assertIsNone(lkgr_index)
+    rows = dict((builder, (statuses, build_nums))
+                for _, builder, statuses, build_nums in matrix)
+    u, g, f, r = self.unknown, self.good, self.fail, self.running
+    self.assertEqual(rows['b1'], ([u, g, g, g, f, f, u],
+                                  [None, 1, None, 2, None, 3, None]))
+    self.assertEqual(rows['b2'], ([g, g, g, r, r, u, u],
+                                  [7, None, 8, None, 9, None, None]))
+    self.assertEqual(rows['b3'], ([u] * 7, [None] * 7))
+
+    del build_history['m1']['b3']
+    lkgr_index, _ = lkgr_lib.ComputeStatusMatrix(
+        build_history, revisions, self.keyfunc)
+    self.assertEqual(lkgr_index, 2)
+
+  def testNoRevisions(self):
+    self.assertEqual(
+        lkgr_lib.ComputeStatusMatrix({'m1': {'b1': []}}, [], self.keyfunc),
+        (None, [('m1', 'b1', [], [])]))
+
+
+class CollateRevisionHistoryTest(unittest.TestCase):
+  repo = lkgr_lib.SvnWrapper(None, None)
+  lkgr_builders = {'m1': {'builders': ['b1']}}
+
+  @staticmethod
+  def build(revision, results=0, finished=True):
+    return {
+        'currentStep': None if finished else {'name': 'compile'},
+        'times': [1, 2 if finished else None],
+        'results': results if finished else None,
+        'steps': [],
+        'properties': [['got_revision', revision, 'Annotation']],
+    }
+
+  def testCollatesFromScratch(self):
+    build_data = {'m1': {'b1': {'2': self.build('20', results=2),
+                                '1': self.build('10')},
+                         'b2': {'1': self.build('10')}},
+                  'm2': {}}
+    history, revisions = lkgr_lib.CollateRevisionHistory(
+        build_data, self.lkgr_builders, self.repo)
+    self.assertEqual(history, {'m1': {'b1': [
+        ('10', lkgr_lib.STATUS.SUCCESS, '1'),
+        ('20', lkgr_lib.STATUS.FAILURE, '2')]}})
+    self.assertEqual(revisions, ['10', '20'])
+
+  def testIncremental(self):
+    collated = {}
+    build_data = {'m1': {'b1': {
+        '1': self.build('10'),
+        '2': {'currentStep': None, 'times': [1, 2], 'results': 4,
+              'text': ['exception', 'slave', 'lost']},
+        '3': self.build('30', finished=False)}}}
+    lkgr_lib.CollateRevisionHistory(
+        build_data, self.lkgr_builders, self.repo, collated)
+    # Running builds aren't remembered, ignored finished ones are.
+    self.assertEqual(collated, {'m1': {'b1': {
+        '1': ('10', lkgr_lib.STATUS.SUCCESS), '2': None}}})
+
+    # Round-trip through json, as between runs.
+    collated = json.loads(json.dumps(collated))
+    build_data = {'m1': {'b1': {
+        # Build 1 dropped out of the master's cache.
+        '2': None,
+        '3': self.build('30'),
+        '4': self.build('40', finished=False),
+        # Unknown build, shouldn't happen.
+        '5': None}}}
+    history, revisions = lkgr_lib.CollateRevisionHistory(
+        build_data, self.lkgr_builders, self.repo, collated)
+    self.assertEqual(history, {'m1': {'b1': [
+        ('30', lkgr_lib.STATUS.SUCCESS, '3'),
+        ('40', lkgr_lib.STATUS.RUNNING, '4')]}})
+    self.assertEqual(revisions, ['30', '40'])
+    self.assertEqual(collated, {'m1': {'b1': {
+        '2': None, '3': ('30', lkgr_lib.STATUS.SUCCESS)}}})
+
+
 class CheckLKGRLagTest(unittest.TestCase):
   allowed_lag = 2  # Default allowed lag is 2 hours
   allowed_gap = 150  # Default allowed gap is 150 revisions
@@ -144,6 +252,136 @@ class CheckLKGRLagTest(unittest.TestCase):
     self.assertTrue(res)
 
 
+class GitIndexParsingTest(unittest.TestCase):
+  def testParseCommitRecord(self):
+    record = ('%s 1400000000\nSubject\n\nBody\n'
+              'Cr-Commit-Position: refs/heads/master@{#1234}\n' % ('a' * 40))
+    self.assertEqual(lkgr_lib.ParseCommitRecord(record),
+                     ('a' * 40, (1234, 'refs/heads/master'), 1400000000))
+
+  def testParseCommitRecordNoPosition(self):
+    self.assertEqual(
+        lkgr_lib.ParseCommitRecord('\n%s 1\nSubject\n' % ('b' * 40)),
+        ('b' * 40, None, 1))
+    self.assertEqual(
+        lkgr_lib.ParseCommitRecord(
+            '%s 1\nCr-Commit-Position: garbage\n' % ('b' * 40)),
+        ('b' * 40, None, 1))
+
+  def testSplitRecords(self):
+    self.assertEqual(
+        list(lkgr_lib.SplitRecords(['ab\0c', 'd\0', '\0e', 'f'])),
+        ['ab', 'cd', 'ef'])
+    self.assertEqual(list(lkgr_lib.SplitRecords(['ab\0'])), ['ab'])
+    self.assertEqual(list(lkgr_lib.SplitRecords([])), [])
+
+
+class GitWrapperTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.origin = os.path.join(self.tempdir, 'origin')
+    self.git('init', '-q', self.origin)
+    self.commits = [self.commit(i) for i in xrange(1, 4)]
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir, ignore_errors=True)
+
+  def git(self, *args):
+    env = dict(os.environ, GIT_AUTHOR_NAME='a', GIT_AUTHOR_EMAIL='a@b',
+               GIT_COMMITTER_NAME='a', GIT_COMMITTER_EMAIL='a@b',
+               GIT_COMMITTER_DATE='%d +0000' % (1400000000 + len(args)))
+    return subprocess.check_output(('git',) + args, cwd=self.tempdir,
+                                   env=env).strip()
+
+  def commit(self, num):
+    self.git('-C', self.origin, 'commit', '-q', '--allow-empty',
+             '-m', 'Commit %d\n\nCr-Commit-Position: '
+                   'refs/heads/master@{#%d}' % (num, num))
+    return self.git('-C', self.origin, 'rev-parse', 'HEAD')
+
+  def wrapper(self):
+    return lkgr_lib.GitWrapper(self.origin,
+                               os.path.join(self.tempdir, 'checkout'))
+
+  @property
+  def index_path(self):
+    return os.path.join(self.tempdir, 'checkout.positions.json')
+
+  @staticmethod
+  def spy_log(repo):
+    """Returns the list the arguments of every `git log` of repo go to."""
+    calls = []
+    log = repo._log
+    def spy(*args):
+      calls.append(args)
+      return log(*args)
+    repo._log = spy
+    return calls
+
+  def testIndex(self):
+    repo = self.wrapper()
+    c1, c2, c3 = self.commits
+    self.assertEqual(repo.keyfunc(c2), (2, 'refs/heads/master'))
+    self.assertEqual(repo.sort([c3, c1, c2]), [c1, c2, c3])
+    self.assertEqual(repo.get_gap([c1, c3], c1), 2)
+    self.assertGreater(repo.get_lag(c1), datetime.timedelta(days=1))
+    self.assertFalse(os.path.exists(self.index_path))
+    repo.flush()
+    self.assertTrue(os.path.isfile(self.index_path))
+
+    # The next run only indexes new commits, and needs no per-commit lookups.
+    c4 = self.commit(4)
+    repo = self.wrapper()
+    self.assertEqual(set([c3]), set(repo._index_tips))
+    logs = self.spy_log(repo)
+    repo._git.number = None
+    repo._git.show = None
+    self.assertEqual(repo.keyfunc(c4), (4, 'refs/heads/master'))
+    self.assertEqual(repo.keyfunc(c1), (1, 'refs/heads/master'))
+    self.assertGreater(repo.get_lag(c4), datetime.timedelta(days=1))
+    # Only once per run.
+    repo._update_index()
+    self.assertEqual(1, len(logs))
+    self.assertEqual(set([c3]),
+                     set(logs[0][list(logs[0]).index('--not') + 1:]))
+    repo.flush()
+
+    # Nothing new to index, nor to write back.
+    repo = self.wrapper()
+    logs = self.spy_log(repo)
+    self.assertEqual(repo.keyfunc(c4), (4, 'refs/heads/master'))
+    repo._update_index()
+    self.assertEqual([], logs)
+    os.remove(self.index_path)
+    repo.flush()
+    self.assertFalse(os.path.exists(self.index_path))
+
+  def testStaleIndex(self):
+    # The tip of the previous run was rewritten away.
+    with open(self.index_path, 'w') as f:
+      json.dump({'tips': ['0' * 40], 'commits': {}}, f)
+    repo = self.wrapper()
+    logs = self.spy_log(repo)
+    self.assertEqual(repo.keyfunc(self.commits[0]), (1, 'refs/heads/master'))
+    self.assertEqual(2, len(logs))
+    self.assertNotIn('--not', logs[1])
+
+  def testCorruptIndex(self):
+    with open(self.index_path, 'w') as f:
+      f.write('{')
+    repo = self.wrapper()
+    self.assertEqual([], repo._index_tips)
+    self.assertEqual(repo.keyfunc(self.commits[0]), (1, 'refs/heads/master'))
+
+  def testUnwritableIndex(self):
+    repo = lkgr_lib.GitWrapper(
+        self.origin, os.path.join(self.tempdir, 'checkout'),
+        index_path=os.path.join(self.tempdir, 'missing', 'index.json'))
+    self.assertEqual(repo.keyfunc(self.commits[0]), (1, 'refs/heads/master'))
+    repo.flush()
+    self.assertFalse(os.path.exists(os.path.join(self.tempdir, 'missing')))
+
+
 class SvnWrapperTest(unittest.TestCase):
   url = 'svn://my.svn.server/repo/trunk'
 
@@ -5,12 +5,15 @@
 
 """Send buildbot master monitoring data to the timeseries monitoring API."""
 
+import argparse
 import socket
 import sys
 import urlparse
 
 from infra.libs.service_utils import outer_loop
 from infra.services.mastermon import monitor
+from infra.services.mastermon import pollers
+from infra.services.mastermon import scheduler
 from infra_libs import ts_mon
 
 # Running this here because it sometimes returns the unqualified name when run
@@ -18,10 +21,23 @@ from infra_libs import ts_mon
 FQDN = socket.getfqdn()
 
 
+def master_seconds(value):
+  """Parses a MASTER=SECONDS command line argument."""
+  name, sep, seconds = value.partition('=')
+  try:
+    if not (name and sep):
+      raise ValueError
+    return name, float(seconds)
+  except ValueError:
+    raise argparse.ArgumentTypeError(
+        'expected MASTER=SECONDS, got %r' % value)
+
+
 class Application(outer_loop.Application):
   def __init__(self):
     super(Application, self).__init__()
     self.monitors = []
+    self.scheduler = None
 
   def add_argparse_options(self, parser):
     super(Application, self).add_argparse_options(parser)
@@ -45,8 +61,28 @@ class Application(outer_loop.Application):
         '--build-dir to get the list of all buildbot masters on this host to '
         'monitor')
     parser.add_argument('--interval',
-        default=60, type=int,
+        default=monitor.DEFAULT_INTERVAL, type=int,
         help='time (in seconds) between sampling the buildbot master')
+    parser.add_argument('--timeout',
+        default=pollers.DEFAULT_TIMEOUT, type=float,
+        help='time (in seconds) to wait for the buildbot master to respond, '
+        'and to spend reading its followed results file per poll')
+    parser.add_argument('--master-interval',
+        action='append', default=[], type=master_seconds,
+        metavar='MASTER=SECONDS',
+        help='override --interval for one master of --build-dir, by master '
+        'directory name. Can be given several times')
+    parser.add_argument('--master-timeout',
+        action='append', default=[], type=master_seconds,
+        metavar='MASTER=SECONDS',
+        help='override --timeout for one master of --build-dir, by master '
+        'directory name. Can be given several times')
+
+    parser.add_argument('--follow-results',
+        action='store_true',
+        help='keep the ts_mon.log results file of each master open and read '
+        'it from where the last poll (or the last mastermon) stopped, instead '
+        'of rotating it on every poll')
 
     parser.add_argument(
         '--cloudtail-path',
@@ -77,23 +113,36 @@ class Application(outer_loop.Application):
     super(Application, self).process_argparse_options(options)
 
   def main(self, opts):
+    # Shared by all the pollers, to keep connections to the masters alive.
+    session = scheduler.new_session()
     if opts.url:
       # Monitor a single master specified on the commandline.
-      self.monitors = [monitor.MasterMonitor(opts.url)]
+      self.monitors = [monitor.MasterMonitor(
+          opts.url, interval=opts.interval, timeout=opts.timeout,
+          session=session)]
     else:
       # Query the mastermap and monitor all the masters on a host.
       self.monitors = monitor.create_from_mastermap(
-          opts.build_dir, opts.hostname, opts.cloudtail_path)
-
-    super(Application, self).main(opts)
+          opts.build_dir, opts.hostname, opts.cloudtail_path,
+          follow_results=opts.follow_results,
+          session=session,
+          interval=opts.interval,
+          timeout=opts.timeout,
+          master_intervals=dict(opts.master_interval),
+          master_timeouts=dict(opts.master_timeout))
+
+    self.scheduler = scheduler.Scheduler(self.monitors)
+    try:
+      super(Application, self).main(opts)
+    finally:
+      self.scheduler.close()
 
   def sleep_timeout(self):
-    return self.opts.interval
+    return self.scheduler.next_timeout()
 
   def task(self):
     try:
-      for mon in self.monitors:
-        mon.poll()
+      self.scheduler.poll_due()
     finally:
       ts_mon.flush()
     return True
@@ -9,6 +9,7 @@ import os
 import signal
 import subprocess
 import sys
+import time
 
 from infra.libs.buildbot import master
 from infra.services.mastermon import pollers
@@ -17,6 +18,9 @@ from infra_libs import ts_mon
 
 RESULTS_FILE = '/var/log/chrome-infra/status_logger-%s/ts_mon.log'
 
+# Time (in seconds) between two polls of a master.
+DEFAULT_INTERVAL = 60
+
 
 def set_deathsig(sig):  # pragma: no cover
   """Wrapper around the prctl(PR_SET_PDEATHSIG) system call.
@@ -43,13 +47,25 @@ def set_deathsig(sig):  # pragma: no cover
 class MasterMonitor(object):
   up = ts_mon.BooleanMetric('buildbot/master/up',
       description='False if the master failed to respond to any of its checks')
+  staleness = ts_mon.FloatMetric('buildbot/master/poller_staleness',
+      description='Time (in seconds) since the last successful poll, per '
+                  'poller')
 
   POLLER_CLASSES = [
     pollers.VarzPoller,
   ]
 
   def __init__(self, url, name=None, results_file=None, log_file=None,
-               cloudtail_path=None):
+               cloudtail_path=None, follow_results=False,
+               interval=DEFAULT_INTERVAL, timeout=pollers.DEFAULT_TIMEOUT,
+               session=None, time_fn=time.time):
+    """
+    Args:
+      interval(float): time (in seconds) between two polls of this master, see
+          scheduler.Scheduler.
+      timeout(float): time (in seconds) to wait for the master to respond.
+      session(requests.Session): session shared by the pollers of all masters.
+    """
     if name is None:
       logging.info('Creating monitor for %s', url)
       self._metric_fields = {}
@@ -58,17 +74,28 @@ class MasterMonitor(object):
       logging.info('Creating monitor for %s on %s', name, url)
       self._metric_fields = {'master': name}
       self._name = name
+    self.interval = interval
+    self.timeout = timeout
+    self._time_fn = time_fn
 
     self._pollers = [
-        cls(url, self._metric_fields) for cls in self.POLLER_CLASSES]
-
-    if results_file is not None:
+        cls(url, self._metric_fields, session=session, timeout=timeout)
+        for cls in self.POLLER_CLASSES]
+
+    if results_file is not None and follow_results:
+      # Resumes where the previous instance stopped, if any.
+      self._pollers.append(pollers.TailFilePoller(
+        results_file, self._metric_fields, timeout=timeout))
+    elif results_file is not None:
       # Ignore events that were posted while we weren't listening.
       # That will avoid posting a lot of build events at the wrong time.
       if os.path.isfile(results_file):
         pollers.safe_remove(results_file)
       self._pollers.append(pollers.FilePoller(
-        results_file, self._metric_fields))
+        results_file, self._metric_fields, timeout=timeout))
+
+    # Staleness is counted from the creation of the monitor.
+    self._last_success = [self._time_fn()] * len(self._pollers)
 
     self._cloudtail = None
     if log_file is not None and cloudtail_path is not None and name is not None:
@@ -92,24 +119,39 @@ class MasterMonitor(object):
         logging.exception('Failed to start cloudtail with args %s',
                           cloudtail_args)
 
+  @property
+  def name(self):
+    return self._name
+
   def poll(self):
     logging.info('Polling %s', self._name)
 
-    for poller in self._pollers:
+    for i, poller in enumerate(self._pollers):
       if not poller.poll():
         self.up.set(False, fields=self._metric_fields)
         break
+      self._last_success[i] = self._time_fn()
     else:
       self.up.set(True, fields=self._metric_fields)
 
+    self.report_staleness()
 
-def create_from_mastermap(build_dir, hostname,
-                          cloudtail_path):  # pragma: no cover
+  def report_staleness(self):
+    """Sets the staleness of each poller, also while a poll is in progress."""
+    now = self._time_fn()
+    for poller, last_success in zip(self._pollers, self._last_success):
+      self.staleness.set(now - last_success, fields=poller.fields(
+          {'poller': poller.__class__.__name__}))
+
+
+def create_from_mastermap(build_dir, hostname, cloudtail_path,
+                          **kwargs):  # pragma: no cover
   logging.info('Creating monitors from mastermap for host %s', hostname)
   return _create_from_mastermap(
       build_dir,
       master.get_mastermap_for_host(build_dir, hostname),
-      cloudtail_path)
+      cloudtail_path,
+      **kwargs)
 
 
 def _path_to_twistd_log(build_dir, dirname):
@@ -124,12 +166,27 @@ def _path_to_twistd_log(build_dir, dirname):
   return None
 
 
-def _create_from_mastermap(build_dir, mastermap, cloudtail_path):
+def _create_from_mastermap(build_dir, mastermap, cloudtail_path,
+                           follow_results=False, session=None,
+                           interval=DEFAULT_INTERVAL,
+                           timeout=pollers.DEFAULT_TIMEOUT,
+                           master_intervals=None, master_timeouts=None):
+  """Creates a MasterMonitor for each master of mastermap.
+
+  master_intervals and master_timeouts override interval and timeout for some
+  masters, by master directory name.
+  """
+  master_intervals = master_intervals or {}
+  master_timeouts = master_timeouts or {}
   return [
       MasterMonitor('http://localhost:%d' % entry['port'],
                     name=entry['dirname'],
                     results_file=RESULTS_FILE % entry['dirname'],
                     log_file=_path_to_twistd_log(build_dir, entry['dirname']),
-                    cloudtail_path=cloudtail_path)
+                    cloudtail_path=cloudtail_path,
+                    follow_results=follow_results,
+                    interval=master_intervals.get(entry['dirname'], interval),
+                    timeout=master_timeouts.get(entry['dirname'], timeout),
+                    session=session)
       for entry
       in mastermap]
@@ -4,8 +4,10 @@
 
 import collections
 import copy
+import io
 import json
 import logging
+import numbers
 import os
 import time
 
@@ -31,6 +33,9 @@ STATUS_TO_STRING = {
   str(RETRY): 'retry',
 }
 
+# Time (in seconds) to wait for a master to respond.
+DEFAULT_TIMEOUT = 10
+
 
 class Poller(object):
   endpoint = None
@@ -40,13 +45,17 @@ class Poller(object):
       description='Time (in milliseconds) taken for the buildbot master to '
                   'respond to the request from mastermon')
 
-  def __init__(self, base_url, metric_fields, time_fn=time.time):
+  def __init__(self, base_url, metric_fields, time_fn=time.time,
+               session=None, timeout=DEFAULT_TIMEOUT):
     if self.endpoint == 'FILE':
       self._url = base_url
     else:
       self._url = '%s/json%s' % (base_url.rstrip('/'), self.endpoint)
     self._metric_fields = metric_fields
     self._time_fn = time_fn
+    # Without a session, each poll opens a new connection.
+    self._session = session
+    self._timeout = timeout
 
   def poll(self):
     LOGGER.info('Requesting %s', self._url)
@@ -54,7 +63,8 @@ class Poller(object):
     start_time = self._time_fn()
     poller_name = self.__class__.__name__
     try:
-      response = instrumented_requests.get(poller_name, self._url, timeout=10)
+      response = instrumented_requests.get(
+          poller_name, self._url, timeout=self._timeout, session=self._session)
     except requests.exceptions.RequestException:
       LOGGER.exception('Request for %s failed', self._url)
       return False
@@ -150,6 +160,10 @@ def rotated_filename(filename):
   return '%s.1' % filename
 
 
+def offset_filename(filename):
+  return '%s.offset' % filename
+
+
 class FilePoller(Poller):
   """Poll a file instead of an endpoint.
 
@@ -200,8 +214,7 @@ class FilePoller(Poller):
       safe_remove(rotated_name)
       os.rename(self._url, rotated_name)
       with open(rotated_name, 'r') as f:
-        for line in f:  # pragma: no branch
-          self.handle_response(json.loads(line))
+        self.handle_responses(json.loads(line) for line in f)
     except (ValueError, OSError, IOError) as e:
       LOGGER.error('Could not collect or send results from %s: %s',
                    self._url, e)
@@ -210,13 +223,223 @@ class FilePoller(Poller):
     return True
 
   def handle_response(self, data):
-    fields = self.fields({k: data.get(k, 'unknown') for k in self.field_keys})
-    self.result_count.increment(fields)
-    if 'duration_s' in data:
-      self.cycle_times.add(data['duration_s'], fields)
-    if 'pending_s' in data:
-      self.pending_times.add(data['pending_s'], fields)
-    if 'total_s' in data:
-      self.total_times.add(data['total_s'], fields)
-    if 'pre_test_time_s' in data:
-      self.pre_test_times.add(data['pre_test_time_s'], fields)
+    self.handle_responses([data])
+
+  def handle_responses(self, datas):
+    """Records the results of several builds.
+
+    Durations are grouped by metric and fields, and each group is added to
+    its distribution in one go. Malformed results are logged and skipped.
+    """
+    counts = collections.Counter()
+    samples = collections.defaultdict(list)
+    distributions = (
+        ('duration_s', self.cycle_times),
+        ('pending_s', self.pending_times),
+        ('total_s', self.total_times),
+        ('pre_test_time_s', self.pre_test_times),
+    )
+    try:
+      for data in datas:
+        try:
+          fields = tuple(sorted(self.fields(
+              {k: data.get(k, 'unknown') for k in self.field_keys}
+          ).iteritems()))
+          values = [(metric, data[key]) for key, metric in distributions
+                    if key in data]
+        except AttributeError:
+          LOGGER.warning('Ignoring result which is not an object: %r', data)
+          continue
+        if not all(isinstance(v, numbers.Number) for _, v in values):
+          LOGGER.warning('Ignoring result with a non-numeric duration: %r',
+                         data)
+          continue
+        counts[fields] += 1
+        for metric, value in values:
+          samples[metric, fields].append(value)
+    finally:
+      # Record what was parsed before any error.
+      for fields, count in counts.iteritems():
+        self.result_count.increment_by(count, dict(fields))
+      for (metric, fields), values in samples.iteritems():
+        metric.add_many(values, dict(fields))
+
+
+class TailFilePoller(FilePoller):
+  """Follow a file instead of rotating it on every poll.
+
+  The file is kept open, and each poll reads what was appended to it since
+  the previous one. The position reached is persisted to state_file, so a
+  restarted mastermon resumes where it stopped. Without a persisted position,
+  a file found by the first poll is read from its end, so that results posted
+  while mastermon wasn't running are ignored, like FilePoller does.
+
+  Lines are parsed and recorded in batches of at most batch_lines lines (see
+  FilePoller.handle_responses). A poll stops reading after timeout seconds,
+  and the next one carries on from there, so that a large backlog doesn't
+  hold up the poll of the master.
+
+  Once it has been read entirely and is larger than max_bytes, the file is
+  rotated (renamed), but not closed: the writer may still append to it until
+  it creates the new file, so the rotated file is only closed once the new
+  one exists and the rotated one has been read to its end. A truncated file
+  is read again from its beginning.
+  """
+  DEFAULT_BATCH_LINES = 1000
+  DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+  READ_SIZE = 64 * 1024
+
+  def __init__(self, base_url, metric_fields, state_file=None,
+               batch_lines=DEFAULT_BATCH_LINES, max_bytes=DEFAULT_MAX_BYTES,
+               **kwargs):
+    super(TailFilePoller, self).__init__(base_url, metric_fields, **kwargs)
+    self._state_file = state_file or offset_filename(base_url)
+    self._batch_lines = batch_lines
+    self._max_bytes = max_bytes
+    self._file = None
+    self._inode = None
+    # Offset of the first byte of self._file which wasn't recorded yet.
+    self._offset = 0
+    self._partial = ''
+    self._first_poll = True
+
+  def poll(self):
+    LOGGER.info('Following results from %s', self._url)
+
+    try:
+      self._follow()
+    except (OSError, IOError) as e:
+      LOGGER.error('Could not collect or send results from %s: %s',
+                   self._url, e)
+      self.close()
+
+    # Never return False - we don't know if master is down.
+    return True
+
+  def close(self):
+    if self._file is not None:
+      self._file.close()
+    self._file = None
+    self._inode = None
+    self._offset = 0
+    self._partial = ''
+
+  def _follow(self):
+    if self._file is None:
+      found = self._resume(from_end=self._first_poll)
+      self._first_poll = False
+      if not found:
+        LOGGER.info('No file found, assuming no data: %s', self._url)
+        return
+
+    while True:
+      reached_end = self._read_to_end()
+      self._save_state()
+      if not reached_end:
+        return
+      try:
+        stat = os.stat(self._url)
+      except OSError:
+        # Rotated, and the writer didn't create the new file yet.
+        return
+      if stat.st_ino != self._inode:
+        # The writer moved on to a new file, and the previous one has been
+        # read to its end.
+        self._open(self._url, 0)
+        continue
+      if stat.st_size < self._offset + len(self._partial):
+        LOGGER.warning('%s was truncated, reading it from the start',
+                       self._url)
+        self._open(self._url, 0)
+        continue
+      if self._offset >= self._max_bytes and not self._partial:
+        rotated_name = rotated_filename(self._url)
+        safe_remove(rotated_name)
+        os.rename(self._url, rotated_name)
+      return
+
+  def _resume(self, from_end):
+    """Opens the file at the persisted position, or at its end if from_end."""
+    state = self._load_state()
+    # The file may have been rotated before the last restart.
+    for path in (rotated_filename(self._url), self._url):
+      try:
+        stat = os.stat(path)
+      except OSError:
+        continue
+      if (state.get('inode') == stat.st_ino and
+          state.get('offset', 0) <= stat.st_size):
+        self._open(path, state['offset'])
+        return True
+    if not os.path.isfile(self._url):
+      return False
+    self._open(self._url, os.stat(self._url).st_size if from_end else 0)
+    return True
+
+  def _open(self, path, offset):
+    if self._file is not None:
+      self._file.close()
+    # Unbuffered, so that reading past the end of the file doesn't stick.
+    self._file = io.open(path, 'rb', buffering=0)
+    self._file.seek(offset)
+    self._inode = os.fstat(self._file.fileno()).st_ino
+    self._offset = offset
+    self._partial = ''
+
+  def _read_to_end(self):
+    """Reads and records the lines appended to the file, until its end or
+    until the timeout.
+
+    Returns:
+      (bool): whether the end of the file was reached.
+    """
+    deadline = self._time_fn() + self._timeout
+    lines = []
+    reached_end = True
+    while True:
+      chunk = self._file.read(self.READ_SIZE)
+      if not chunk:
+        break
+      chunk_lines = (self._partial + chunk).split('\n')
+      self._partial = chunk_lines.pop()
+      lines.extend(chunk_lines)
+      if len(lines) >= self._batch_lines:
+        self._record(lines)
+        lines = []
+        if self._time_fn() >= deadline:
+          LOGGER.info('Timed out reading %s, will resume from offset %d',
+                      self._url, self._offset)
+          reached_end = False
+          break
+    self._record(lines)
+    return reached_end
+
+  def _record(self, lines):
+    """Records the results in lines and moves the offset past them."""
+    datas = []
+    for line in lines:
+      if not line.strip():
+        continue
+      try:
+        datas.append(json.loads(line))
+      except ValueError:
+        LOGGER.warning('Ignoring malformed line in %s: %r', self._url, line)
+    try:
+      self.handle_responses(datas)
+    finally:
+      # Even if recording failed midway: what was parsed has been recorded,
+      # and reading these lines again would record it twice.
+      self._offset += sum(len(line) + 1 for line in lines)
+
+  def _load_state(self):
+    try:
+      with open(self._state_file) as f:
+        return json.load(f)
+    except (IOError, ValueError):
+      return {}
+
+  def _save_state(self):
+    tmp_name = '%s.tmp' % self._state_file
+    with open(tmp_name, 'w') as f:
+      json.dump({'inode': self._inode, 'offset': self._offset}, f)
+    os.rename(tmp_name, self._state_file)
@@ -0,0 +1,139 @@
+# Copyright (c) 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Polls the masters monitored by mastermon concurrently.
+
+Each MasterMonitor is polled every monitor.interval seconds, by a pool of
+threads, so that a slow master only delays itself: a cycle waits for each
+master due at most its timeout, and a master still being polled after that is
+left running, and isn't polled again until it finishes, but its staleness is
+still reported on every cycle. The pollers of all
+masters send their requests through one shared session (see new_session), so
+connections to the masters are kept alive between polls.
+"""
+
+import logging
+import multiprocessing
+import time
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from infra.services.mastermon import monitor
+from infra_libs import ts_mon
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of hosts to keep a connection pool for (masters on a host listen on
+# different ports of localhost, and each host:port has its own pool), and
+# the number of idle connections kept per host. Each master is polled by one
+# thread at a time.
+POOL_CONNECTIONS = 64
+POOL_MAXSIZE = 2
+
+
+def new_session():
+  """Returns a requests.Session with keep-alive connection pools.
+
+  Requests are not retried: a master which doesn't respond within its timeout
+  is reported down, and polled again on its next cycle.
+  """
+  session = requests.Session()
+  adapter = requests.adapters.HTTPAdapter(
+      pool_connections=POOL_CONNECTIONS,
+      pool_maxsize=POOL_MAXSIZE,
+      max_retries=0)
+  session.mount('http://', adapter)
+  session.mount('https://', adapter)
+  return session
+
+
+class Scheduler(object):
+  """Polls MasterMonitors concurrently, each on its own interval."""
+
+  durations = ts_mon.CumulativeDistributionMetric(
+      'buildbot/master/poll_durations',
+      description='Time (in milliseconds) taken to run all the pollers of a '
+                  'master')
+
+  def __init__(self, monitors, workers=None, time_fn=time.time):
+    """
+    Args:
+      monitors(list): MasterMonitors to poll.
+      workers(int): number of threads polling masters, defaults to one per
+          master.
+      time_fn: function returning the current time, for tests.
+    """
+    self._monitors = monitors
+    self._time_fn = time_fn
+    # All masters are due on the first cycle. None while a master is being
+    # polled.
+    now = self._time_fn()
+    self._next_poll = [now] * len(monitors)
+    self._pool = ThreadPool(workers or max(1, len(monitors)))
+
+  def next_timeout(self):
+    """Returns the time (in seconds) until a master is due."""
+    if not self._monitors:
+      return monitor.DEFAULT_INTERVAL
+    scheduled = [t for t in self._next_poll if t is not None]
+    if not scheduled:
+      # They are all still being polled: check on them (and report their
+      # staleness) as often as the most frequently polled one would be.
+      return min(min(mon.interval, mon.timeout) for mon in self._monitors)
+    return max(0, min(scheduled) - self._time_fn())
+
+  def poll_due(self):
+    """Polls the masters which are due, waits for each of them at most its
+    timeout, then reports the staleness of all masters, including those still
+    being polled.
+
+    Return:
+      (int): the number of masters polled
+    """
+    now = self._time_fn()
+    due = [i for i, next_poll in enumerate(self._next_poll)
+           if next_poll is not None and next_poll <= now]
+    results = []
+    for i in due:
+      self._next_poll[i] = None
+      results.append((i, self._pool.apply_async(self._poll, ((i, now),))))
+
+    # Real time, whatever time_fn is: that's what get() waits for.
+    start = time.time()
+    for i, result in results:
+      mon = self._monitors[i]
+      try:
+        result.get(max(0, start + mon.timeout - time.time()))
+      except multiprocessing.TimeoutError:
+        LOGGER.warning('%s is still being polled after %ss, not waiting for '
+                       'it', mon.name, mon.timeout)
+    # A hung master doesn't report its own staleness until its poll returns.
+    for mon in self._monitors:
+      mon.report_staleness()
+    return len(due)
+
+  def close(self):
+    self._pool.close()
+    self._pool.join()
+
+  def _poll(self, index_and_now):
+    """Polls one master. Runs in the pool.
+
+    The master isn't due again (its _next_poll is None) until this returns, so
+    it is never polled twice at the same time.
+    """
+    i, now = index_and_now
+    mon = self._monitors[i]
+    start = self._time_fn()
+    try:
+      mon.poll()
+    except Exception:  # pylint: disable=broad-except
+      LOGGER.exception('Failed to poll %s', mon.name)
+    finally:
+      end = self._time_fn()
+      self.durations.add((end - start) * 1000, fields={'master': mon.name})
+      # Count the next interval from the start of the cycle, so that polls
+      # don't drift by the time they take.
+      self._next_poll[i] = max(now + mon.interval, end)
@@ -50,6 +50,47 @@ class MasterMonitorTest(unittest.TestCase):
     m.poll()
     self.assertFalse(m.up.get({'master': 'foobar'}))
 
+  def test_poll_staleness(self):
+    mock_poller_class = mock.create_autospec(pollers.Poller, spec_set=True)
+    mock_poller = mock_poller_class.return_value
+    mock_poller.fields.return_value = {'master': 'foobar', 'poller': 'Mock'}
+    mock_time = mock.Mock(return_value=100)
+
+    class MasterMonitor(monitor.MasterMonitor):
+      POLLER_CLASSES = [mock_poller_class]
+
+    m = MasterMonitor('http://example.com', name='foobar', time_fn=mock_time)
+    fields = {'master': 'foobar', 'poller': 'Mock'}
+
+    mock_poller.poll.return_value = False
+    mock_time.return_value = 130
+    m.poll()
+    self.assertEqual(30, m.staleness.get(fields))
+
+    mock_poller.poll.return_value = True
+    mock_time.return_value = 160
+    m.poll()
+    self.assertEqual(0, m.staleness.get(fields))
+
+    # Without polling, e.g. while a poll is hung.
+    mock_time.return_value = 200
+    m.report_staleness()
+    self.assertEqual(40, m.staleness.get(fields))
+
+  def test_passes_session_and_timeout(self):
+    mock_poller_class = mock.create_autospec(pollers.Poller, spec_set=True)
+    session = object()
+
+    class MasterMonitor(monitor.MasterMonitor):
+      POLLER_CLASSES = [mock_poller_class]
+
+    m = MasterMonitor('http://example.com', interval=30, timeout=5,
+                      session=session)
+    mock_poller_class.assert_called_once_with(
+        'http://example.com', {}, session=session, timeout=5)
+    self.assertEqual(30, m.interval)
+    self.assertEqual(5, m.timeout)
+
   def test_ts_mon_file_deletion(self):
     class MasterMonitor(monitor.MasterMonitor):
       POLLER_CLASSES = []
@@ -64,6 +105,23 @@ class MasterMonitorTest(unittest.TestCase):
                     results_file=ts_mon_filename)
       self.assertFalse(os.path.isfile(ts_mon_filename))
 
+  def test_ts_mon_file_follow(self):
+    class MasterMonitor(monitor.MasterMonitor):
+      POLLER_CLASSES = []
+
+    with temporary_directory(prefix='monitor-test-') as tempdir:
+      ts_mon_filename = os.path.join(tempdir, 'ts_mon.json')
+      with open(ts_mon_filename, 'w') as f:
+        f.write(' ')
+      m = MasterMonitor('http://example.com',
+                        name='foobar',
+                        results_file=ts_mon_filename,
+                        follow_results=True,
+                        timeout=5)
+      self.assertIsInstance(m._pollers[-1], pollers.TailFilePoller)
+      self.assertEqual(5, m._pollers[-1]._timeout)
+      self.assertTrue(os.path.isfile(ts_mon_filename))
+
   def test_ts_mon_file_polling_file_missing(self):
     # Test that asking to poll a missing file works.
     # Mostly a smoke test.
@@ -123,6 +181,21 @@ class MastermapTest(unittest.TestCase):
       self.assertEqual(mon._pollers[1]._url,
                        monitor.RESULTS_FILE % spec['dirname'])
 
+  def test_create_from_mastermap_settings(self):
+    specs = [
+      {'port': 1234, 'dirname': 'master.foo.bar'},
+      {'port': 5678, 'dirname': 'master.baz'},
+    ]
+    monitors = monitor._create_from_mastermap(
+        '/doesnotexist', specs, None, interval=20, timeout=3,
+        master_intervals={'master.baz': 120},
+        master_timeouts={'master.foo.bar': 30})
+
+    self.assertEqual(['master.foo.bar', 'master.baz'],
+                     [mon.name for mon in monitors])
+    self.assertEqual([20, 120], [mon.interval for mon in monitors])
+    self.assertEqual([30, 3], [mon.timeout for mon in monitors])
+
   @mock.patch('subprocess.Popen')
   def test_tails_log(self, mock_popen):
     specs = [
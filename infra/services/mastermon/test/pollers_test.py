@@ -2,6 +2,7 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import itertools
 import json
 import os
 import tempfile
@@ -59,6 +60,20 @@ class PollerTest(unittest.TestCase):
     self.assertEquals(1, mock_get.call_count)
     self.assertEquals('http://foobar/json/foo', mock_get.call_args[0][0])
 
+  def test_uses_session(self, mock_get):
+    session = mock.create_autospec(requests.Session, spec_set=True)
+    response = session.get.return_value
+    response.json.return_value = {'foo': 'bar'}
+    response.status_code = 200
+
+    p = FakePoller('http://foobar', session=session, timeout=3)
+    self.assertTrue(p.poll())
+
+    self.assertFalse(mock_get.called)
+    self.assertEquals(1, session.get.call_count)
+    self.assertEquals('http://foobar/json/foo', session.get.call_args[0][0])
+    self.assertEquals(3, session.get.call_args[1]['timeout'])
+
   def test_returns_false_for_non_200(self, mock_get):
     response = mock_get.return_value
     response.status_code = 404
@@ -211,8 +226,8 @@ class FilePollerTest(unittest.TestCase):
       self.assertTrue(p.poll())
       self.assertFalse(os.path.isfile(pollers.rotated_filename(filename)))
 
-  @mock.patch('infra_libs.ts_mon.CounterMetric.increment')
-  @mock.patch('infra_libs.ts_mon.CumulativeDistributionMetric.add')
+  @mock.patch('infra_libs.ts_mon.CounterMetric.increment_by')
+  @mock.patch('infra_libs.ts_mon.CumulativeDistributionMetric.add_many')
   def test_file_has_data(self, fake_add, fake_increment):
     result1 = {'builder': 'b1', 'slave': 's1',
                'result': 'r1', 'project_id': 'chromium',
@@ -236,15 +251,33 @@ class FilePollerTest(unittest.TestCase):
       filename = self.create_data_file(tempdir, [data1, data2])
       p = pollers.FilePoller(filename, {})
       self.assertTrue(p.poll())
-      fake_increment.assert_any_call(result1)
-      fake_increment.assert_any_call(result2)
-      fake_add.assert_any_call(data2['duration_s'], result2)
-      fake_add.assert_any_call(data2['pending_s'], result2)
-      fake_add.assert_any_call(data2['total_s'], result2)
+      fake_increment.assert_any_call(1, result1)
+      fake_increment.assert_any_call(1, result2)
+      fake_add.assert_any_call([data2['duration_s']], result2)
+      fake_add.assert_any_call([data2['pending_s']], result2)
+      fake_add.assert_any_call([data2['total_s']], result2)
       self.assertFalse(os.path.isfile(filename))
       # Make sure the rotated file is still there - for debugging.
       self.assertTrue(os.path.isfile(pollers.rotated_filename(filename)))
 
+  def test_file_batches_samples(self):
+    ts_mon.reset_for_unittest()
+    result = {'builder': 'b1', 'slave': 's1', 'result': 'r1',
+              'project_id': 'chromium', 'subproject_tag': 'unknown'}
+    data = [dict(result, duration_s=i) for i in xrange(1, 4)]
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = self.create_data_file(tempdir, data)
+      with open(filename, 'a') as f:
+        f.write('}')
+      p = pollers.FilePoller(filename, {})
+      self.assertTrue(p.poll())
+
+    self.assertEqual(3, p.result_count.get(result))
+    durations = p.cycle_times.get(result)
+    self.assertEqual(3, durations.count)
+    self.assertEqual(6, durations.sum)
+    self.assertIsNone(p.pending_times.get(result))
+
   def test_file_has_bad_data(self):
     """Mostly a smoke test: don't crash on bad data."""
     with temporary_directory(prefix='poller-test-') as tempdir:
@@ -260,3 +293,204 @@ class FilePollerTest(unittest.TestCase):
   def test_safe_remove_error(self):
     """Smoke test: the function should not raise an exception."""
     pollers.safe_remove('nonexistent-file')
+
+
+class TailFilePollerTest(unittest.TestCase):
+  result = {'builder': 'b1', 'slave': 's1', 'result': 'r1',
+            'project_id': 'chromium', 'subproject_tag': 'unknown'}
+
+  def setUp(self):
+    ts_mon.reset_for_unittest()
+
+  @classmethod
+  def append(cls, filename, *durations):
+    with open(filename, 'a') as f:
+      for duration in durations:
+        f.write('%s\n' % json.dumps(dict(cls.result, duration_s=duration)))
+
+  def assertRecorded(self, p, durations):
+    self.assertEqual(len(durations), p.result_count.get(self.result) or 0)
+    distribution = p.cycle_times.get(self.result)
+    self.assertEqual(sum(durations),
+                     distribution.sum if distribution else 0)
+
+  def test_no_file(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      p = pollers.TailFilePoller(filename, {})
+      self.assertTrue(p.poll())
+      self.assertRecorded(p, [])
+
+      # Created after the first poll: read from the start.
+      self.append(filename, 1, 2)
+      self.assertTrue(p.poll())
+      self.assertRecorded(p, [1, 2])
+
+  def test_follows_file(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      # Written before mastermon started: ignored.
+      self.append(filename, 100)
+      p = pollers.TailFilePoller(filename, {}, batch_lines=2)
+      self.assertTrue(p.poll())
+      self.assertRecorded(p, [])
+
+      self.append(filename, 1, 2, 3)
+      with open(filename, 'a') as f:
+        f.write('}\n\n{"builder": "b1", "durat')
+      self.assertTrue(p.poll())
+      self.assertRecorded(p, [1, 2, 3])
+
+      with open(filename, 'a') as f:
+        f.write('ion_s": 4}\n')
+      self.assertTrue(p.poll())
+      self.assertRecorded(p, [1, 2, 3])
+      self.assertEqual(1, p.result_count.get(
+          {'builder': 'b1', 'slave': 'unknown', 'result': 'unknown',
+           'project_id': 'unknown', 'subproject_tag': 'unknown'}))
+      # The file is never rotated.
+      self.assertTrue(os.path.isfile(filename))
+      self.assertFalse(os.path.isfile(pollers.rotated_filename(filename)))
+
+  def test_resumes_from_offset(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      self.append(filename, 100)
+      p = pollers.TailFilePoller(filename, {})
+      p.poll()
+      self.append(filename, 1)
+      p.poll()
+      p.close()
+      self.assertRecorded(p, [1])
+
+      # Written while mastermon was restarting.
+      self.append(filename, 2)
+      p = pollers.TailFilePoller(filename, {})
+      p.poll()
+      self.assertRecorded(p, [1, 2])
+
+  def test_ignores_stale_offset(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      with open(pollers.offset_filename(filename), 'w') as f:
+        f.write('{"inode": -1, "offset": 3}')
+      self.append(filename, 100)
+      p = pollers.TailFilePoller(filename, {})
+      p.poll()
+      self.append(filename, 1)
+      p.poll()
+      self.assertRecorded(p, [1])
+
+  def test_corrupt_state_file(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      with open(pollers.offset_filename(filename), 'w') as f:
+        f.write('{')
+      p = pollers.TailFilePoller(filename, {})
+      p.poll()
+      self.append(filename, 1)
+      p.poll()
+      self.assertRecorded(p, [1])
+
+  def test_truncated_file(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      p = pollers.TailFilePoller(filename, {})
+      p.poll()
+      self.append(filename, 1, 2, 3)
+      p.poll()
+      with open(filename, 'w') as f:
+        pass
+      self.append(filename, 4)
+      p.poll()
+      self.assertRecorded(p, [1, 2, 3, 4])
+
+  def test_rotates_large_file(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      rotated_name = pollers.rotated_filename(filename)
+      p = pollers.TailFilePoller(filename, {}, max_bytes=10)
+      p.poll()
+      self.append(filename, 1)
+      p.poll()
+      self.assertFalse(os.path.isfile(filename))
+      self.assertTrue(os.path.isfile(rotated_name))
+
+      # The writer still has the rotated file open.
+      self.append(rotated_name, 2)
+      p.poll()
+      self.assertRecorded(p, [1, 2])
+
+      # Restarting before the writer created a new file.
+      self.append(rotated_name, 3)
+      p.close()
+      p = pollers.TailFilePoller(filename, {}, max_bytes=10)
+      p.poll()
+      self.assertRecorded(p, [1, 2, 3])
+
+      # Then it creates a new file, after a last write to the rotated one.
+      self.append(rotated_name, 4)
+      self.append(filename, 5)
+      p.poll()
+      self.assertRecorded(p, [1, 2, 3, 4, 5])
+      self.assertFalse(os.path.isfile(filename))
+
+  def test_read_error(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      p = pollers.TailFilePoller(filename, {})
+      p.poll()
+      self.append(filename, 1)
+      with mock.patch('io.open', side_effect=IOError('denied')):
+        self.assertTrue(p.poll())
+      self.assertRecorded(p, [])
+      p.poll()
+      self.assertRecorded(p, [1])
+
+  def test_malformed_results(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      p = pollers.TailFilePoller(filename, {})
+      p.poll()
+      self.append(filename, 1, 'abc')
+      with open(filename, 'a') as f:
+        f.write('5\n')
+      self.append(filename, 2)
+      p.poll()
+      self.assertRecorded(p, [1, 2])
+      self.assertEqual(os.path.getsize(filename), p._offset)
+
+  def test_recording_error(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      p = pollers.TailFilePoller(filename, {})
+      p.poll()
+      self.append(filename, 1, 2)
+      with mock.patch.object(p.cycle_times, 'add_many',
+                             side_effect=RuntimeError('boom')):
+        with self.assertRaises(RuntimeError):
+          p.poll()
+      self.append(filename, 3)
+      p.poll()
+      # The lines of the failed batch were counted, but aren't read again.
+      self.assertEqual(3, p.result_count.get(self.result))
+      self.assertEqual(os.path.getsize(filename), p._offset)
+
+  def test_timeout(self):
+    with temporary_directory(prefix='poller-test-') as tempdir:
+      filename = os.path.join(tempdir, 'ts_mon.log')
+      # Every call takes a second.
+      clock = itertools.count()
+      p = pollers.TailFilePoller(filename, {}, batch_lines=1, timeout=1,
+                                 time_fn=lambda: next(clock))
+      p.READ_SIZE = 16
+      p.poll()
+      self.append(filename, 1, 2)
+      p.poll()
+      self.assertRecorded(p, [1])
+      p.close()
+
+      # Resumes from where the previous poll stopped.
+      p = pollers.TailFilePoller(filename, {}, timeout=1)
+      p.poll()
+      self.assertRecorded(p, [1, 2])
@@ -0,0 +1,181 @@
+# Copyright (c) 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import threading
+import unittest
+
+import mock
+import requests
+
+from infra.services.mastermon import monitor
+from infra.services.mastermon import scheduler
+from infra_libs import ts_mon
+
+
+class FakeMonitor(object):
+  def __init__(self, name, interval, clock, duration=0, error=None):
+    self.name = name
+    self.interval = interval
+    self.timeout = 5
+    self.polls = []
+    self.staleness_reports = []
+    self._clock = clock
+    self._duration = duration
+    self._error = error
+
+  def poll(self):
+    self.polls.append(self._clock.now)
+    self._clock.advance(self._duration)
+    if self._error:
+      raise self._error
+
+  def report_staleness(self):
+    self.staleness_reports.append(self._clock.now)
+
+
+class FakeClock(object):
+  def __init__(self):
+    self.now = 1000.0
+    self._lock = threading.Lock()
+
+  def time(self):
+    return self.now
+
+  def advance(self, seconds):
+    with self._lock:
+      self.now += seconds
+
+
+class SchedulerTest(unittest.TestCase):
+  def setUp(self):
+    ts_mon.reset_for_unittest()
+    self.clock = FakeClock()
+
+  def scheduler(self, monitors, **kwargs):
+    s = scheduler.Scheduler(monitors, time_fn=self.clock.time, **kwargs)
+    self.addCleanup(s.close)
+    return s
+
+  def test_polls_each_master_on_its_interval(self):
+    fast = FakeMonitor('fast', 10, self.clock)
+    slow = FakeMonitor('slow', 30, self.clock)
+    s = self.scheduler([fast, slow])
+
+    self.assertEqual(0, s.next_timeout())
+    self.assertEqual(2, s.poll_due())
+    self.assertEqual(10, s.next_timeout())
+
+    for _ in xrange(3):
+      self.clock.advance(s.next_timeout())
+      s.poll_due()
+
+    self.assertEqual([1000, 1010, 1020, 1030], fast.polls)
+    self.assertEqual([1000, 1030], slow.polls)
+
+  def test_nothing_due(self):
+    mon = FakeMonitor('foo', 10, self.clock)
+    s = self.scheduler([mon])
+    s.poll_due()
+    self.clock.advance(5)
+    self.assertEqual(0, s.poll_due())
+    self.assertEqual(5, s.next_timeout())
+    self.assertEqual(1, len(mon.polls))
+
+  def test_no_masters(self):
+    s = self.scheduler([])
+    self.assertEqual(0, s.poll_due())
+    self.assertEqual(monitor.DEFAULT_INTERVAL, s.next_timeout())
+
+  def test_slow_master(self):
+    mon = FakeMonitor('slow', 10, self.clock, duration=15)
+    s = self.scheduler([mon])
+    s.poll_due()
+    # Polled again as soon as possible, not right away.
+    self.assertEqual(0, s.next_timeout())
+    self.assertEqual(15000, s.durations.get({'master': 'slow'}).sum)
+
+  def test_polls_concurrently(self):
+    started = []
+    barrier = threading.Event()
+
+    class BlockingMonitor(FakeMonitor):
+      def poll(self):
+        started.append(self.name)
+        if len(started) == 3:
+          barrier.set()
+        # Would time out if the masters were polled one after the other.
+        self.polls.append(barrier.wait(5))
+
+    monitors = [BlockingMonitor('m%d' % i, 10, self.clock) for i in xrange(3)]
+    s = self.scheduler(monitors)
+    self.assertEqual(3, s.poll_due())
+    for mon in monitors:
+      self.assertEqual([True], mon.polls)
+
+  def test_hung_master(self):
+    release = threading.Event()
+
+    class HungMonitor(FakeMonitor):
+      def poll(self):
+        self.polls.append(release.wait(5))
+
+    hung = HungMonitor('hung', 10, self.clock)
+    hung.timeout = 0.01
+    good = FakeMonitor('good', 10, self.clock)
+    s = self.scheduler([hung, good])
+    self.addCleanup(release.set)
+
+    self.assertEqual(2, s.poll_due())
+    self.assertEqual([1000], good.polls)
+    self.assertEqual([], hung.polls)
+    # Not polled again while it's still being polled.
+    self.clock.advance(s.next_timeout())
+    self.assertEqual(1, s.poll_due())
+    self.assertEqual([1000, 1010], good.polls)
+    self.assertEqual(10, s.next_timeout())
+    # Its staleness is still reported on every cycle.
+    self.assertEqual([1000, 1010], hung.staleness_reports)
+
+    release.set()
+    s.close()
+    self.assertEqual([True], hung.polls)
+    self.assertEqual(0, s.next_timeout())
+
+  def test_all_masters_hung(self):
+    release = threading.Event()
+
+    class HungMonitor(FakeMonitor):
+      def poll(self):
+        release.wait(5)
+
+    hung = HungMonitor('hung', 10, self.clock)
+    hung.timeout = 0.01
+    other = HungMonitor('other', 20, self.clock)
+    other.timeout = 0.01
+    s = self.scheduler([hung, other])
+    self.addCleanup(release.set)
+    self.assertEqual(2, s.poll_due())
+    # Checked on as often as the most frequently polled master.
+    self.assertEqual(0.01, s.next_timeout())
+    self.clock.advance(s.next_timeout())
+    self.assertEqual(0, s.poll_due())
+    self.assertEqual([1000, 1000.01], hung.staleness_reports)
+    self.assertEqual([1000, 1000.01], other.staleness_reports)
+
+  def test_failing_master(self):
+    bad = FakeMonitor('bad', 10, self.clock, error=ValueError('boom'))
+    good = FakeMonitor('good', 10, self.clock)
+    s = self.scheduler([bad, good])
+    self.assertEqual(2, s.poll_due())
+    self.assertEqual(1, len(good.polls))
+    self.assertEqual(10, s.next_timeout())
+
+
+class NewSessionTest(unittest.TestCase):
+  def test_keeps_connections_alive(self):
+    session = scheduler.new_session()
+    adapter = session.get_adapter('http://localhost:8080/json/varz')
+    self.assertIsInstance(adapter, requests.adapters.HTTPAdapter)
+    self.assertEqual(0, adapter.max_retries.total)
+    self.assertIs(adapter, session.get_adapter('https://example.com'))
@@ -12,6 +12,7 @@ import psutil
 
 from infra.libs.service_utils import outer_loop
 from infra.services.sysmon import cipd_metrics
+from infra.services.sysmon import proc_metrics
 from infra.services.sysmon import puppet_metrics
 from infra.services.sysmon import root_setup
 from infra.services.sysmon import system_metrics
@@ -19,6 +20,11 @@ from infra_libs import ts_mon
 
 
 class SysMon(outer_loop.Application):
+  def __init__(self):
+    super(SysMon, self).__init__()
+    # system_metrics, or a proc_metrics.ProcCollector.
+    self.collector = system_metrics
+
   def add_argparse_options(self, parser):
     super(SysMon, self).add_argparse_options(parser)
 
@@ -32,6 +38,11 @@ class SysMon(outer_loop.Application):
         help='if this is set sysmon will run once to initialise configs in '
              '/etc and then exit immediately.  Used on GCE bots to bootstrap '
              'sysmon')
+    parser.add_argument(
+        '--collector',
+        choices=('psutil', 'proc'), default='psutil',
+        help='how to collect system metrics: through psutil, or by reading '
+             '/proc directly, which is cheaper but only works on Linux')
 
     parser.set_defaults(
         ts_mon_flush='manual',
@@ -39,12 +50,12 @@ class SysMon(outer_loop.Application):
 
   def task(self):
     try:
-      system_metrics.get_uptime()
-      system_metrics.get_cpu_info()
-      system_metrics.get_disk_info()
-      system_metrics.get_mem_info()
-      system_metrics.get_net_info()
-      system_metrics.get_proc_info()
+      self.collector.get_uptime()
+      self.collector.get_cpu_info()
+      self.collector.get_disk_info()
+      self.collector.get_mem_info()
+      self.collector.get_net_info()
+      self.collector.get_proc_info()
       puppet_metrics.get_puppet_summary()
       cipd_metrics.get_cipd_summary()
     finally:
@@ -58,15 +69,23 @@ class SysMon(outer_loop.Application):
     if opts.root_setup:
       return root_setup.root_setup()
 
-    # This returns a 0 value the first time it's called.  Call it now and
-    # discard the return value.
-    psutil.cpu_times_percent()
+    if opts.collector == 'proc':
+      # Reads the CPU times the first CPU usage is computed from.
+      self.collector = proc_metrics.ProcCollector()
+    else:
+      # This returns a 0 value the first time it's called.  Call it now and
+      # discard the return value.
+      psutil.cpu_times_percent()
 
     # Wait a random amount of time before starting the loop in case sysmon is
     # started at exactly the same time on all machines.
     time.sleep(random.uniform(0, opts.interval))
 
-    return super(SysMon, self).main(opts)
+    try:
+      return super(SysMon, self).main(opts)
+    finally:
+      if opts.collector == 'proc':
+        self.collector.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,172 @@
+# Copyright (c) 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Collects the system_metrics metrics from /proc, on Linux.
+
+ProcCollector has the same get_*_info methods as system_metrics, and reports
+the same metrics, but reads them from /proc/stat, /proc/meminfo,
+/proc/diskstats and /proc/net/dev instead of going through psutil. The files
+are opened once and read again from their start on every cycle, CPU usage
+percentages are computed from the difference with the previous cycle, and the
+list of partitions is only read again when the mount table changes.
+"""
+
+import errno
+import io
+import os
+import re
+import select
+
+from infra.services.sysmon import system_metrics
+
+
+# Bytes per sector in /proc/diskstats, whatever the sector size of the disk.
+SECTOR_SIZE = 512
+
+# Columns of the first line of /proc/stat: user, nice, system, idle, iowait,
+# irq, softirq and steal. guest and guest_nice are already counted in user
+# and nice.
+CPU_COLUMNS = 8
+CPU_MODES = (('user', 0), ('system', 2), ('idle', 3))
+
+_OCTAL_ESCAPE_RE = re.compile(r'\\([0-7]{3})')
+
+
+def _unescape(path):
+  """Decodes the octal escapes (e.g. '\\040' for ' ') of /proc/self/mounts."""
+  return _OCTAL_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 8)), path)
+
+
+class ProcCollector(object):
+  """Collects system metrics from /proc, keeping its files open."""
+
+  def __init__(self, proc_root='/proc'):
+    self._proc_root = proc_root
+    self._files = {}
+    # CPU times of the previous cycle, the ones since boot at first.
+    self._cpu_times = self._read_cpu_times()
+    self._mountpoints = None
+    # The mount table is pollable: it reports POLLPRI when it changes.
+    self._mounts_poll = select.poll()
+    self._mounts_poll.register(self._file('self/mounts'),
+                               select.POLLPRI | select.POLLERR)
+
+  def close(self):
+    for f in self._files.itervalues():
+      f.close()
+    self._files = {}
+
+  def get_uptime(self):
+    system_metrics.get_uptime()
+
+  def get_cpu_info(self):
+    times = self._read_cpu_times()
+    deltas = [t - p for t, p in zip(times, self._cpu_times)]
+    self._cpu_times = times
+    total = float(sum(deltas))
+    for mode, column in CPU_MODES:
+      system_metrics.cpu_time.set(
+          round(100 * deltas[column] / total, 1) if total else 0.0,
+          {'mode': mode})
+
+  def get_disk_info(self):
+    for mountpoint in self._get_mountpoints():
+      try:
+        stats = os.statvfs(mountpoint)
+      except OSError as ex:
+        if ex.errno in (errno.ENOENT, errno.EACCES):
+          # Unmounted since the mount table was read, or not accessible.
+          continue
+        raise  # pragma: no cover
+      fields = {'path': mountpoint}
+      system_metrics.disk_free.set(stats.f_bavail * stats.f_frsize,
+                                   fields=fields)
+      system_metrics.disk_total.set(stats.f_blocks * stats.f_frsize,
+                                    fields=fields)
+      system_metrics.inodes_free.set(stats.f_favail, fields=fields)
+      system_metrics.inodes_total.set(stats.f_files, fields=fields)
+
+    for line in self._read('diskstats').splitlines():
+      columns = line.split()
+      if len(columns) == 7:
+        # Partitions of Linux 2.6 to 2.6.24: reads, read sectors, writes,
+        # written sectors.
+        read_sectors, written_sectors = columns[4], columns[6]
+      elif len(columns) >= 14:
+        read_sectors, written_sectors = columns[5], columns[9]
+      else:
+        continue
+      fields = {'disk': columns[2]}
+      system_metrics.disk_read.set(int(read_sectors) * SECTOR_SIZE,
+                                   fields=fields)
+      system_metrics.disk_write.set(int(written_sectors) * SECTOR_SIZE,
+                                    fields=fields)
+
+  def get_mem_info(self):
+    values = {}
+    for line in self._read('meminfo').splitlines():
+      name, _, value = line.partition(':')
+      if name in ('MemTotal', 'MemAvailable', 'MemFree', 'Buffers', 'Cached'):
+        values[name] = int(value.split()[0]) * 1024
+    if 'MemAvailable' in values:
+      available = values['MemAvailable']
+    else:
+      # Before Linux 3.14, like psutil.virtual_memory().
+      available = values['MemFree'] + values['Buffers'] + values['Cached']
+    system_metrics.mem_free.set(available)
+    system_metrics.mem_total.set(values['MemTotal'])
+
+  def get_net_info(self):
+    # The first two lines are headers.
+    for line in self._read('net/dev').splitlines()[2:]:
+      nic, _, counters = line.partition(':')
+      columns = counters.split()
+      # In the order of system_metrics.NET_METRICS: sent and received bytes,
+      # errors and drops.
+      system_metrics.set_net_counters(nic.strip(), (
+          int(columns[8]), int(columns[0]),
+          int(columns[10]), int(columns[2]),
+          int(columns[11]), int(columns[3])))
+
+  def get_proc_info(self):
+    system_metrics.proc_count.set(
+        sum(1 for name in os.listdir(self._proc_root) if name.isdigit()))
+
+  def _file(self, name):
+    f = self._files.get(name)
+    if f is None:
+      # Unbuffered: every read goes to the kernel, which regenerates the file.
+      f = io.open(os.path.join(self._proc_root, name), 'rb', buffering=0)
+      self._files[name] = f
+    return f
+
+  def _read(self, name):
+    f = self._file(name)
+    f.seek(0)
+    return f.read()
+
+  def _read_cpu_times(self):
+    data = self._read('stat')
+    return [int(t) for t in
+            data[:data.index('\n')].split()[1:CPU_COLUMNS + 1]]
+
+  def _get_mountpoints(self):
+    """Returns the mountpoints of the physical partitions.
+
+    Those are the ones psutil.disk_partitions() returns: the mountpoints whose
+    filesystem type isn't 'nodev' in /proc/filesystems.
+    """
+    if self._mountpoints is None or self._mounts_poll.poll(0):
+      # Reading the mount table again also clears the POLLPRI event.
+      mounts = self._read('self/mounts')
+      fstypes = set()
+      for line in self._read('filesystems').splitlines():
+        if not line.startswith('nodev'):
+          fstypes.add(line.strip())
+      self._mountpoints = []
+      for line in mounts.splitlines():
+        device, mountpoint, fstype = line.split(None, 3)[:3]
+        if device != 'none' and fstype in fstypes:
+          self._mountpoints.append(_unescape(mountpoint))
+    return self._mountpoints
@@ -127,27 +127,40 @@ def get_mem_info():
   mem_total.set(mem.total)
 
 
-def get_net_info():
-  metric_counter_names = [
-      (net_up, 'bytes_sent'),
-      (net_down, 'bytes_recv'),
-      (net_err_up, 'errout'),
-      (net_err_down, 'errin'),
-      (net_drop_up, 'dropout'),
-      (net_drop_down, 'dropin'),
-  ]
+# The net_* metrics, and the names of their psutil.net_io_counters() values.
+NET_METRICS = (
+    (net_up, 'bytes_sent'),
+    (net_down, 'bytes_recv'),
+    (net_err_up, 'errout'),
+    (net_err_down, 'errin'),
+    (net_drop_up, 'dropout'),
+    (net_drop_down, 'dropin'),
+)
+
+
+def set_net_counters(nic, values):
+  """Sets the net_* metrics of a network interface.
+
+  Args:
+    nic(str): name of the interface.
+    values(iterable): values of the metrics, in the order of NET_METRICS.
+  """
+  fields = {'interface': nic}
+  for (metric, _), value in zip(NET_METRICS, values):
+    try:
+      metric.set(value, fields=fields)
+    except ts_mon.MonitoringDecreasingValueError as ex:  # pragma: no cover
+      # This normally shouldn't happen, but might if the network driver module
+      # is reloaded, so log an error and continue instead of raising an
+      # exception.
+      logging.error(str(ex))
 
+
+def get_net_info():
   nics = psutil.net_io_counters(pernic=True)
   for nic, counters in nics.iteritems():
-    fields = {'interface': nic}
-    for metric, counter_name in metric_counter_names:
-      try:
-        metric.set(getattr(counters, counter_name), fields=fields)
-      except ts_mon.MonitoringDecreasingValueError as ex:  # pragma: no cover
-        # This normally shouldn't happen, but might if the network driver module
-        # is reloaded, so log an error and continue instead of raising an
-        # exception.
-        logging.error(str(ex))
+    set_net_counters(nic, [getattr(counters, counter_name)
+                           for _, counter_name in NET_METRICS])
 
 
 def get_proc_info():
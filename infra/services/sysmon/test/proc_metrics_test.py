@@ -0,0 +1,225 @@
+# Copyright (c) 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import select
+import sys
+import unittest
+
+import mock
+
+from infra.services.sysmon import proc_metrics
+from infra.services.sysmon import system_metrics
+from infra_libs import temporary_directory
+from infra_libs import ts_mon
+
+
+STAT = """\
+cpu  %d 0 %d %d 0 0 0 0 0 0
+cpu0 1 0 1 1 0 0 0 0 0 0
+intr 1
+"""
+
+MEMINFO = """\
+MemTotal:        8000000 kB
+MemFree:         1000000 kB
+MemAvailable:    3000000 kB
+Buffers:          100000 kB
+Cached:          1500000 kB
+SwapCached:            0 kB
+"""
+
+OLD_MEMINFO = """\
+MemTotal:        8000000 kB
+MemFree:         1000000 kB
+Buffers:          100000 kB
+Cached:          1500000 kB
+"""
+
+DISKSTATS = """\
+   8       0 sda 100 0 2000 0 50 0 3000 0 0 0 0
+   8       1 sda1 10 200 20 300
+   8      16 sdb 1 2 4 5 6 7 8 9 10 11 12 13 14 15 16 17 18
+   7       0 loop0 0 0
+"""
+
+NET_DEV = """\
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    \
+packets errs drop fifo colls carrier compressed
+    lo:    1000      10    1    2    0     0          0         0     2000 \
+     20    3    4    0     0       0          0
+  eth0:12345678901 100    0    0    0     0          0         0 987654321 \
+     50    0    0    0     0       0          0
+"""
+
+FILESYSTEMS = """\
+nodev\tsysfs
+nodev\tproc
+\text4
+\tvfat
+"""
+
+
+class ProcCollectorTest(unittest.TestCase):
+  def setUp(self):
+    ts_mon.reset_for_unittest()
+
+  def write(self, name, content):
+    with open(os.path.join(self.proc_root, name), 'w') as f:
+      f.write(content)
+
+  def collector(self, tempdir):
+    self.proc_root = tempdir
+    os.makedirs(os.path.join(tempdir, 'self'))
+    os.makedirs(os.path.join(tempdir, 'net'))
+    self.write('stat', STAT % (100, 100, 800))
+    self.write('meminfo', MEMINFO)
+    self.write('diskstats', DISKSTATS)
+    self.write('net/dev', NET_DEV)
+    self.write('filesystems', FILESYSTEMS)
+    self.write('self/mounts', 'rootfs / rootfs rw 0 0\n'
+                              'proc /proc proc rw 0 0\n'
+                              '/dev/sda1 %s ext4 rw 0 0\n' % tempdir)
+    for pid in ('1', '42', '1337'):
+      os.makedirs(os.path.join(tempdir, pid))
+    c = proc_metrics.ProcCollector(proc_root=tempdir)
+    self.addCleanup(c.close)
+    return c
+
+  def test_cpu_info(self):
+    with temporary_directory() as tempdir:
+      c = self.collector(tempdir)
+      self.write('stat', STAT % (130, 110, 860))
+      c.get_cpu_info()
+      self.assertEqual(30, system_metrics.cpu_time.get({'mode': 'user'}))
+      self.assertEqual(10, system_metrics.cpu_time.get({'mode': 'system'}))
+      self.assertEqual(60, system_metrics.cpu_time.get({'mode': 'idle'}))
+
+      # Nothing happened since.
+      c.get_cpu_info()
+      self.assertEqual(0, system_metrics.cpu_time.get({'mode': 'idle'}))
+
+  def test_mem_info(self):
+    with temporary_directory() as tempdir:
+      c = self.collector(tempdir)
+      c.get_mem_info()
+      self.assertEqual(3000000 * 1024, system_metrics.mem_free.get())
+      self.assertEqual(8000000 * 1024, system_metrics.mem_total.get())
+
+      self.write('meminfo', OLD_MEMINFO)
+      c.get_mem_info()
+      self.assertEqual(2600000 * 1024, system_metrics.mem_free.get())
+
+  def test_disk_info(self):
+    with temporary_directory() as tempdir:
+      c = self.collector(tempdir)
+      c.get_disk_info()
+
+      stats = os.statvfs(tempdir)
+      fields = {'path': tempdir}
+      self.assertEqual(stats.f_blocks * stats.f_frsize,
+                       system_metrics.disk_total.get(fields))
+      self.assertIsNotNone(system_metrics.disk_free.get(fields))
+      self.assertEqual(stats.f_files, system_metrics.inodes_total.get(fields))
+      self.assertIsNone(system_metrics.disk_total.get({'path': '/proc'}))
+
+      self.assertEqual(2000 * 512,
+                       system_metrics.disk_read.get({'disk': 'sda'}))
+      self.assertEqual(3000 * 512,
+                       system_metrics.disk_write.get({'disk': 'sda'}))
+      self.assertEqual(200 * 512,
+                       system_metrics.disk_read.get({'disk': 'sda1'}))
+      self.assertEqual(300 * 512,
+                       system_metrics.disk_write.get({'disk': 'sda1'}))
+      self.assertEqual(4 * 512, system_metrics.disk_read.get({'disk': 'sdb'}))
+      self.assertEqual(8 * 512, system_metrics.disk_write.get({'disk': 'sdb'}))
+      self.assertIsNone(system_metrics.disk_read.get({'disk': 'loop0'}))
+
+  def test_partitions_cached(self):
+    with temporary_directory() as tempdir:
+      mounts_poll = mock.Mock()
+      mounts_poll.poll.return_value = []
+      with mock.patch('select.poll', return_value=mounts_poll):
+        c = self.collector(tempdir)
+      self.assertEqual([tempdir], c._get_mountpoints())
+
+      mountpoint = os.path.join(tempdir, 'has space')
+      os.mkdir(mountpoint)
+      self.write('self/mounts', '/dev/sda1 %s ext4 rw 0 0\n' %
+                 mountpoint.replace(' ', '\\040'))
+      # The mount table didn't change, as far as poll() knows.
+      self.assertEqual([tempdir], c._get_mountpoints())
+
+      mounts_poll.poll.return_value = [(3, select.POLLPRI | select.POLLERR)]
+      self.assertEqual([mountpoint], c._get_mountpoints())
+
+  def test_missing_mountpoint(self):
+    with temporary_directory() as tempdir:
+      c = self.collector(tempdir)
+      c._mountpoints = ['/does/not/exist']
+      c.get_disk_info()
+      self.assertIsNone(system_metrics.disk_total.get(
+          {'path': '/does/not/exist'}))
+
+  def test_net_info(self):
+    with temporary_directory() as tempdir:
+      c = self.collector(tempdir)
+      c.get_net_info()
+
+      fields = {'interface': 'lo'}
+      self.assertEqual(2000, system_metrics.net_up.get(fields))
+      self.assertEqual(1000, system_metrics.net_down.get(fields))
+      self.assertEqual(3, system_metrics.net_err_up.get(fields))
+      self.assertEqual(1, system_metrics.net_err_down.get(fields))
+      self.assertEqual(4, system_metrics.net_drop_up.get(fields))
+      self.assertEqual(2, system_metrics.net_drop_down.get(fields))
+
+      fields = {'interface': 'eth0'}
+      self.assertEqual(987654321, system_metrics.net_up.get(fields))
+      self.assertEqual(12345678901, system_metrics.net_down.get(fields))
+
+  def test_proc_info(self):
+    with temporary_directory() as tempdir:
+      c = self.collector(tempdir)
+      c.get_proc_info()
+      self.assertEqual(3, system_metrics.proc_count.get())
+
+  def test_reuses_files(self):
+    with temporary_directory() as tempdir:
+      c = self.collector(tempdir)
+      c.get_mem_info()
+      with mock.patch('io.open') as mock_open:
+        c.get_mem_info()
+        c.get_cpu_info()
+      self.assertFalse(mock_open.called)
+
+  def test_uptime(self):
+    with temporary_directory() as tempdir:
+      c = self.collector(tempdir)
+      c.get_uptime()
+      self.assertGreater(system_metrics.uptime.get(), 0)
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'Linux only')
+class ProcCollectorLinuxTest(unittest.TestCase):  # pragma: no cover
+  def setUp(self):
+    ts_mon.reset_for_unittest()
+
+  def test_collects(self):
+    c = proc_metrics.ProcCollector()
+    try:
+      c.get_cpu_info()
+      c.get_disk_info()
+      c.get_mem_info()
+      c.get_net_info()
+      c.get_proc_info()
+    finally:
+      c.close()
+
+    self.assertIsNotNone(system_metrics.disk_total.get({'path': '/'}))
+    self.assertLessEqual(system_metrics.mem_free.get(),
+                         system_metrics.mem_total.get())
+    self.assertIsNotNone(system_metrics.net_up.get({'interface': 'lo'}))
+    self.assertGreater(system_metrics.proc_count.get(), 10)
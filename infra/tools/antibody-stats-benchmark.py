@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Measures how long antibody takes to compute the stats and leaderboards of
+its UI from a synthetic history, with the per-stat queries of compute_stats
+and from the summary tables.
+
+The database is a sqlite stand-in for the Cloud SQL one; the MySQL date
+functions used by the per-stat queries are translated to sqlite ones.
+
+Example:
+  ./infra/tools/antibody-stats-benchmark.py --commits 1000000
+"""
+
+import argparse
+import datetime
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+from infra.tools.antibody import compute_stats
+
+NOW = datetime.datetime(2015, 8, 1, 12, 0, 0)
+
+SCHEMA = """
+CREATE TABLE git_commit (hash VARCHAR(40), bug_url VARCHAR(200),
+  timestamp TIMESTAMP, review_url VARCHAR(200), project_prj_id INT,
+  subject VARCHAR(800), PRIMARY KEY (hash));
+CREATE TABLE commit_people (people_email_address VARCHAR(200),
+  git_commit_hash VARCHAR(40), request_timestamp TIMESTAMP, type VARCHAR(10),
+  PRIMARY KEY (people_email_address, git_commit_hash, type));
+CREATE TABLE review (review_url VARCHAR(200), url_exists TINYINT,
+  request_timestamp TIMESTAMP, patchset_commited TIMESTAMP,
+  patchset_still_exists TINYINT, reverted TINYINT, project_prj_id INT,
+  PRIMARY KEY (review_url));
+CREATE TABLE review_people (people_email_address VARCHAR(200),
+  review_url VARCHAR(200), timestamp TIMESTAMP, request_timestamp TIMESTAMP,
+  type VARCHAR(10),
+  PRIMARY KEY (people_email_address, review_url, type, timestamp));
+CREATE TABLE commit_summary (hash VARCHAR(40), month CHAR(7),
+  timestamp TIMESTAMP, author VARCHAR(200), review_url VARCHAR(200),
+  subject VARCHAR(800), tbr TINYINT, tbr_no_lgtm TINYINT,
+  no_review_url TINYINT, blank_tbr TINYINT, suspicious TINYINT,
+  PRIMARY KEY (hash));
+CREATE INDEX commit_summary_month ON commit_summary (month);
+CREATE INDEX commit_summary_timestamp ON commit_summary (timestamp);
+CREATE INDEX commit_summary_suspicious ON commit_summary (suspicious);
+CREATE TABLE monthly_summary (month CHAR(7), author VARCHAR(200),
+  commits INT, tbr INT, tbr_no_lgtm INT, no_review_url INT, blank_tbr INT,
+  suspicious INT, PRIMARY KEY (month, author));
+"""
+
+
+class MySQLToSqliteCursor(object):
+  """Runs the MySQL queries of compute_stats on a sqlite cursor."""
+  REPLACEMENTS = (
+      (re.compile(r"DATE_FORMAT\(([\w.]+), '%Y-%m'\)"), r'substr(\1, 1, 7)'),
+      (re.compile(r'NOW\(\)'), "'%s'" % NOW.strftime('%Y-%m-%d %H:%M:%S')),
+      (re.compile(r'DATEDIFF\(([^,()]+), ([^,()]+)\)'),
+       r'(julianday(date(\1)) - julianday(date(\2)))'),
+  )
+
+  def __init__(self, cursor):
+    self._cursor = cursor
+
+  def execute(self, sql, *args):
+    for pattern, replacement in self.REPLACEMENTS:
+      sql = pattern.sub(replacement, sql)
+    return self._cursor.execute(sql, *args)
+
+  def __getattr__(self, name):
+    return getattr(self._cursor, name)
+
+
+def load_options():
+  parser = argparse.ArgumentParser(description=sys.modules['__main__'].__doc__)
+  parser.add_argument('--commits', type=int, default=1000000,
+                      help='Number of commits.')
+  parser.add_argument('--authors', type=int, default=2000,
+                      help='Number of authors.')
+  parser.add_argument('--months', type=int, default=60,
+                      help='Number of months the commits are spread over.')
+  parser.add_argument('--tbr-rate', type=float, default=0.1,
+                      help='Fraction of TBRed commits.')
+  parser.add_argument('--seed', type=int, default=0)
+  return parser.parse_args()
+
+
+def populate(db, options):
+  """Fills the base tables with a synthetic history."""
+  start = NOW - datetime.timedelta(days=30 * options.months)
+  step = (NOW - start).total_seconds() / options.commits
+  commits, people, reviews, lgtms = [], [], [], []
+  for i in xrange(options.commits):
+    git_hash = '%040x' % random.getrandbits(160)
+    timestamp = (start + datetime.timedelta(seconds=i * step)).strftime(
+        '%Y-%m-%d %H:%M:%S')
+    author = 'author%d' % random.randrange(options.authors)
+    review_url = ('https://codereview.chromium.org/%d' % i
+                  if random.random() > 0.03 else '')
+    commits.append((git_hash, '', timestamp, review_url, 0,
+                    'Commit-number-%d' % i))
+    people.append((author, git_hash, None, 'author'))
+    # tbr_to_total_people_ratio counts everyone involved in a commit without
+    # a review url as its author, so only TBR reviewed commits.
+    if review_url and random.random() < options.tbr_rate:
+      if random.random() < 0.05:
+        people.append(('NOBODY', git_hash, None, 'tbr'))
+      else:
+        people.append(('author%d' % random.randrange(options.authors),
+                       git_hash, None, 'tbr'))
+      reviews.append((review_url, 1, None, timestamp, 1, 0, 0))
+      if random.random() < 0.5:
+        lgtms.append((author, review_url, timestamp, None, 'lgtm'))
+  db.executemany('INSERT INTO git_commit VALUES (?, ?, ?, ?, ?, ?)', commits)
+  db.executemany('INSERT OR IGNORE INTO commit_people VALUES (?, ?, ?, ?)',
+                 people)
+  db.executemany('INSERT INTO review VALUES (?, ?, ?, ?, ?, ?, ?)', reviews)
+  db.executemany('INSERT INTO review_people VALUES (?, ?, ?, ?, ?)', lgtms)
+  db.commit()
+
+
+def per_stat_queries(db, output_dirpath):
+  cc = MySQLToSqliteCursor(db.cursor())
+  compute_stats.all_time_leaderboard(
+      cc, os.path.join(output_dirpath, 'all_time_leaderboard.json'))
+  compute_stats.past_month_leaderboard(
+      cc, os.path.join(output_dirpath, 'past_month_leaderboard.json'))
+  compute_stats.all_monthly_stats(
+      cc, os.path.join(output_dirpath, 'all_monthly_stats.json'))
+
+
+def summary(db, output_dirpath):
+  compute_stats.write_stats_files(db.cursor(), output_dirpath, now=NOW,
+                                  placeholder='?')
+
+
+def measure(fn, *args):
+  start = time.time()
+  fn(*args)
+  return time.time() - start
+
+
+def main():
+  options = load_options()
+  random.seed(options.seed)
+  tempdir = tempfile.mkdtemp(prefix='antibody-stats-benchmark')
+  try:
+    db = sqlite3.connect(os.path.join(tempdir, 'antibody.db'),
+                         detect_types=sqlite3.PARSE_DECLTYPES)
+    db.executescript(SCHEMA)
+    print '%-24s %8.3fs (%d commits)' % (
+        'populate', measure(populate, db, options), options.commits)
+    print '%-24s %8.3fs' % (
+        'rebuild_summary',
+        measure(compute_stats.rebuild_summary, db, '?'))
+    print '%-24s %8.3fs' % (
+        'per-stat queries', measure(per_stat_queries, db, tempdir))
+    print '%-24s %8.3fs' % ('summary', measure(summary, db, tempdir))
+    db.close()
+  finally:
+    shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -99,6 +99,48 @@ CREATE TABLE IF NOT EXISTS `_DB_NAME`.`review_people` (
 ENGINE = InnoDB;
 
 
+-- -----------------------------------------------------
+-- Table `_DB_NAME`.`commit_summary`
+-- -----------------------------------------------------
+DROP TABLE IF EXISTS `_DB_NAME`.`commit_summary` ;
+
+CREATE TABLE IF NOT EXISTS `_DB_NAME`.`commit_summary` (
+  `hash` VARCHAR(40) NOT NULL COMMENT '',
+  `month` CHAR(7) NOT NULL COMMENT '',
+  `timestamp` TIMESTAMP NULL COMMENT '',
+  `author` VARCHAR(200) NOT NULL COMMENT '',
+  `review_url` VARCHAR(200) NULL COMMENT '',
+  `subject` VARCHAR(800) NULL COMMENT '',
+  `tbr` TINYINT NOT NULL COMMENT '',
+  `tbr_no_lgtm` TINYINT NOT NULL COMMENT '',
+  `no_review_url` TINYINT NOT NULL COMMENT '',
+  `blank_tbr` TINYINT NOT NULL COMMENT '',
+  `suspicious` TINYINT NOT NULL COMMENT '',
+  PRIMARY KEY (`hash`)  COMMENT '',
+  INDEX `commit_summary_month` (`month`)  COMMENT '',
+  INDEX `commit_summary_timestamp` (`timestamp`)  COMMENT '',
+  INDEX `commit_summary_suspicious` (`suspicious`)  COMMENT '')
+ENGINE = InnoDB;
+
+
+-- -----------------------------------------------------
+-- Table `_DB_NAME`.`monthly_summary`
+-- -----------------------------------------------------
+DROP TABLE IF EXISTS `_DB_NAME`.`monthly_summary` ;
+
+CREATE TABLE IF NOT EXISTS `_DB_NAME`.`monthly_summary` (
+  `month` CHAR(7) NOT NULL COMMENT '',
+  `author` VARCHAR(200) NOT NULL COMMENT '',
+  `commits` INT NOT NULL COMMENT '',
+  `tbr` INT NOT NULL COMMENT '',
+  `tbr_no_lgtm` INT NOT NULL COMMENT '',
+  `no_review_url` INT NOT NULL COMMENT '',
+  `blank_tbr` INT NOT NULL COMMENT '',
+  `suspicious` INT NOT NULL COMMENT '',
+  PRIMARY KEY (`month`, `author`)  COMMENT '')
+ENGINE = InnoDB;
+
+
 SET SQL_MODE=@OLD_SQL_MODE;
 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS;
 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS;
\ No newline at end of file
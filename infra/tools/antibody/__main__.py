@@ -19,7 +19,9 @@ import sys
 from infra.tools.antibody import antibody
 import infra.tools.antibody.cloudsql_connect as csql
 from infra.tools.antibody import code_review_parse
+from infra.tools.antibody import compute_stats
 from infra.tools.antibody import git_commit_parser
+from infra.tools.antibody import ingest
 import infra_libs.logs
 
 DATA_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -49,7 +51,16 @@ def main(argv):
     password = f.read().strip()
   connection, cc = csql.connect(password, args.database)
   checkout = args.git_checkout_path
-  if args.parse_git_rietveld or args.run_antibody:
+  if (args.parse_git_rietveld or args.run_antibody) and args.incremental:
+    antibody.setup_antibody_db(cc, os.path.join(
+        DATA_DIR, 'ANTIBODY_DB_schema_setup.sql'), args.database,
+        keep_existing=True)
+    csql.commit(connection)
+    compute_stats.ensure_summary(connection)
+    ingest.ingest(connection, checkout, args.since,
+                  cache_path=os.path.join(DATA_DIR, 'review_cache.db'),
+                  batch_size=args.batch_size, workers=args.fetch_workers)
+  elif args.parse_git_rietveld or args.run_antibody:
     antibody.setup_antibody_db(cc, os.path.join(
         DATA_DIR, 'ANTIBODY_DB_schema_setup.sql'), args.database)
     git_commit_parser.upload_to_sql('git_commit.csv', 'commit_people.csv', cc,
@@ -58,6 +69,13 @@ def main(argv):
     code_review_parse.upload_to_sql(cc, checkout, 'review.csv',
                                     'review_people.csv')
     csql.commit(connection)
+    compute_stats.rebuild_summary(connection)
+  elif args.write_html:
+    antibody.setup_antibody_db(cc, os.path.join(
+        DATA_DIR, 'ANTIBODY_DB_schema_setup.sql'), args.database,
+        keep_existing=True)
+    csql.commit(connection)
+    compute_stats.ensure_summary(connection)
   if args.write_html or args.run_antibody:
     if not os.path.exists(args.output_dir_path):
       os.makedirs(args.output_dir_path)
@@ -48,6 +48,17 @@ def add_argparse_options(parser):
   parser.add_argument('--parse-git-rietveld', '-r', action='store_true',
                       help="runs the pipeline from git checkout"
                            "to parsing of rietveld")
+  parser.add_argument('--incremental', '-i', action='store_true',
+                      help="with --parse-git-rietveld or --run-antibody, "
+                           "only ingest the commits (and their reviews) "
+                           "added since the last run, instead of "
+                           "recreating the database")
+  parser.add_argument('--batch-size', type=int, default=500,
+                      help="number of commits written per transaction with "
+                           "--incremental")
+  parser.add_argument('--fetch-workers', type=int, default=8,
+                      help="number of threads fetching reviews with "
+                           "--incremental")
   parser.add_argument('--output-dir-path', '-d', default=ANTIBODY_UI_DIRPATH,
                       help="path to directory in which the ui will be"
                            "generated")
@@ -60,8 +71,10 @@ def add_argparse_options(parser):
                       help="list of all repos to link to from ui")
 
 
-def setup_antibody_db(cc, filename, database_name):  # pragma: no cover
-  csql.execute_sql_script_from_file(cc, filename, database_name)
+def setup_antibody_db(cc, filename, database_name,
+                      keep_existing=False):  # pragma: no cover
+  csql.execute_sql_script_from_file(cc, filename, database_name,
+                                    keep_existing)
 
 
 def generate_antibody_ui(cc, gitiles_prefix, project_name, since, ui_dirpath, 
@@ -264,12 +277,7 @@ def get_commits_by_user(cc, gitiles_prefix, output_dirpath):
 
 
 def generate_stats_files(cc, output_dirpath):  # pragma: no cover
-  compute_stats.all_time_leaderboard(cc,
-      os.path.join(output_dirpath, 'all_time_leaderboard.json'))
-  compute_stats.past_month_leaderboard(cc,
-      os.path.join(output_dirpath, 'past_month_leaderboard.json'))
-  compute_stats.all_monthly_stats(cc,
-      os.path.join(output_dirpath, 'all_monthly_stats.json'))
+  compute_stats.write_stats_files(cc, output_dirpath)
 
 
 def get_gitiles_prefix(git_checkout_path):
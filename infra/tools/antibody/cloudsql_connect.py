@@ -25,14 +25,17 @@ def connect(password, database_name):  # pragma: no cover
   return connection, cc
 
 
-def execute_sql_script_from_file(cursor, filename,
-                                 database_name):  # pragma: no cover
+def execute_sql_script_from_file(cursor, filename, database_name,
+                                 keep_existing=False):  # pragma: no cover
+  """Runs a schema script, skipping its DROP TABLEs if keep_existing"""
   with open(filename, 'r') as f:
     sql_file = f.read()
 
   sql_commands = sql_file.split(';')[:-1]
 
   for command in sql_commands:
+    if keep_existing and 'DROP TABLE' in command:
+      continue
     cursor.execute(command.replace('_DB_NAME', database_name))
 
 
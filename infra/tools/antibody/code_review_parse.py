@@ -41,6 +41,18 @@ def extract_code_review_json_data(review_url, cc, git_checkout_path):
     LOGGER.error('unknown code review instance: %s' % review_url)
 
 
+def extract_code_review_json_data_for_commit(review_url, commit_message):
+  """Like extract_code_review_json_data, but takes the body of the reviewed
+  commit's message instead of looking the commit up in the database and the
+  git checkout, so that it can be called from any thread."""
+  if any(hostname in review_url for hostname in KNOWN_RIETVELD_INSTANCES):
+    return _extract_json_data_from_rietveld(review_url)
+  elif any(hostname in review_url for hostname in KNOWN_GERRIT_INSTANCES):
+    return _extract_json_data_from_gerrit_commit(review_url, commit_message)
+  else:
+    LOGGER.error('unknown code review instance: %s' % review_url)
+
+
 def _extract_json_data_from_rietveld(rietveld_url):
   """Extracts json data from an issue of a rietveld instance
 
@@ -129,7 +141,6 @@ def _extract_json_data_from_gerrit(gerrit_url, cc, git_checkout_path):
   """
   LOGGER.debug('Fetching gerrit review %s', gerrit_url)
 
-  url_components = urlparse(gerrit_url)
   cc.execute("""SELECT hash
       FROM git_commit
       WHERE review_url = '%s'""" % gerrit_url)
@@ -137,6 +148,12 @@ def _extract_json_data_from_gerrit(gerrit_url, cc, git_checkout_path):
   commit_message = subprocess.check_output(['git', 'show', git_hash,
                                             '--format=%b'],
                                             cwd=git_checkout_path)
+  return _extract_json_data_from_gerrit_commit(gerrit_url, commit_message)
+
+
+def _extract_json_data_from_gerrit_commit(gerrit_url, commit_message):
+  """Like _extract_json_data_from_gerrit, for a known commit message body."""
+  url_components = urlparse(gerrit_url)
   change_id = None
   match_count = 0
   for line in commit_message.splitlines():
@@ -324,6 +341,28 @@ def primary_key_uniquifier(seq, idfun=lambda x: x):
   return result
 
 
+def get_data_for_review(url, json_data):
+  """Extracts the review and review_people rows of a review.
+
+  Args:
+    url(str): canonical review url
+    json_data(dict): the review json, see extract_code_review_json_data
+
+  Return:
+    (review row or None, list of review_people rows)
+  """
+  if any(hostname in url for hostname in KNOWN_RIETVELD_INSTANCES) \
+    and json_data:
+    return (_get_rietveld_data_for_review(url, json_data),
+            _get_rietveld_data_for_review_people(url, json_data))
+  elif any(hostname in url for hostname in KNOWN_GERRIT_INSTANCES) \
+    and json_data:
+    return (_get_gerrit_data_for_review(url, json_data),
+            _get_gerrit_data_for_review_people(url, json_data))
+  LOGGER.error('unknown code review instance: %s' % url)
+  return None, []
+
+
 def get_code_review_data(cc, git_checkout_path):  # pragma: no cover
   review_data, review_people_data = [], []
   git_commits_with_tbr_and_review_url = get_urls_from_git_commit(cc)
@@ -337,22 +376,10 @@ def get_code_review_data(cc, git_checkout_path):  # pragma: no cover
         json_data = extract_code_review_json_data(url, cc, git_checkout_path)
       except JSONDecodeError:  # pragma: no cover
         return
-      if any(hostname in url for hostname in KNOWN_RIETVELD_INSTANCES) \
-        and json_data:
-        db_data = _get_rietveld_data_for_review(url, json_data)
-        review_data.append(db_data)
-        db_data_all = _get_rietveld_data_for_review_people(url, json_data)
-        for data_row in db_data_all:
-          review_people_data.append(data_row)
-      elif any(hostname in url for hostname in KNOWN_GERRIT_INSTANCES) \
-        and json_data:
-        db_data = _get_gerrit_data_for_review(url, json_data)
+      db_data, db_data_all = get_data_for_review(url, json_data)
+      if db_data:
         review_data.append(db_data)
-        db_data_all = _get_gerrit_data_for_review_people(url, json_data)
-        for data_row in db_data_all:
-          review_people_data.append(data_row)
-      else:
-        LOGGER.error('unknown code review instance: %s' % url)
+        review_people_data.extend(db_data_all)
 
       if num % 100 == 0:
         cc.execute("""SELECT COUNT(*) FROM git_commit""")
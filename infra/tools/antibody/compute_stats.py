@@ -2,8 +2,12 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import datetime
 import itertools
 import json
+import os
+
+from infra.tools.antibody import code_review_parse
 
 
 def ratio_calculator(numerator, denominator):
@@ -457,6 +461,20 @@ def tbr_to_total_people_ratio(cc,
   all_commits_by_author = cc.fetchall()
   all_commits_dict = {email: float(count) for (email, count) \
       in all_commits_by_author}
+  return rank_people(suspicious_commits_by_author, all_commits_dict)
+
+
+def rank_people(suspicious_commits_by_author, all_commits_dict):
+  """Ranks the top 100 authors by ratio of suspicious to total commits
+
+  Args:
+    suspicious_commits_by_author(list): (author email, count of suspicious
+                                        commits) pairs
+    all_commits_dict(dict): count of all commits, by author email
+
+  Return:
+    people_tbr_data(list): see tbr_to_total_people_ratio
+  """
   people_tbr_data = [[email, round(float(count) / all_commits_dict[email], 3),
                       int(count), all_commits_dict[email]] for email, count in
                       suspicious_commits_by_author]
@@ -622,4 +640,289 @@ def past_month_leaderboard(cc, filename):  # pragma: no cover
   sql_time_specification = 'DATEDIFF(NOW(), git_commit.timestamp) <= 30'
   output = tbr_to_total_people_ratio(cc, sql_time_specification)
   with open(filename, 'w') as f:
-    json.dump(output, f)
\ No newline at end of file
+    json.dump(output, f)
+
+# Materialized summary of the git_commit, commit_people, review and
+# review_people tables, from which all the stats above can be served.
+#
+# commit_summary has one row per commit, with the categories it falls in;
+# monthly_summary has the per month, per author sums of commit_summary. Both
+# are kept up to date by ingest.ingest(), or recomputed from scratch by
+# rebuild_summary().
+COMMIT_SUMMARY_COLUMNS = ('hash', 'month', 'timestamp', 'author',
+                          'review_url', 'subject', 'tbr', 'tbr_no_lgtm',
+                          'no_review_url', 'blank_tbr', 'suspicious')
+MONTHLY_SUMMARY_COLUMNS = ('month', 'author', 'commits', 'tbr',
+                           'tbr_no_lgtm', 'no_review_url', 'blank_tbr',
+                           'suspicious')
+TIMEFRAMES = (('7_days', 7), ('30_days', 30), ('all_time', None))
+LEADERBOARD_DAYS = 30
+SUMMARY_WRITE_CHUNK = 10000
+
+
+def summarize_commits(commits, commit_people, reviewed_urls, lgtm_urls):
+  """Computes the commit_summary rows of commits
+
+  A commit is suspicious if it was TBRed without an lgtm on its review, has
+  no review url, or has a blank TBR (TBR= ).
+
+  Args:
+    commits(iterable): (hash, timestamp, review_url, subject) tuples
+    commit_people(iterable): (people_email_address, git_commit_hash, type)
+                             tuples, for (at least) all the commits
+    reviewed_urls(set): canonical urls of the reviews in the review table
+    lgtm_urls(set): canonical urls of the reviews with at least one lgtm
+
+  Return:
+    rows(list): one tuple per commit, see COMMIT_SUMMARY_COLUMNS
+  """
+  authors, tbr, blank_tbr = {}, set(), set()
+  for email, git_hash, typ in commit_people:
+    if typ == 'author':
+      authors[git_hash] = email
+    elif typ == 'tbr':
+      tbr.add(git_hash)
+    if email == 'NOBODY':
+      blank_tbr.add(git_hash)
+  rows = []
+  for git_hash, timestamp, review_url, subject in commits:
+    timestamp = str(timestamp)
+    is_tbr = git_hash in tbr
+    url = (code_review_parse.to_canonical_review_url(review_url)
+           if review_url else None)
+    tbr_no_lgtm = (is_tbr and url in reviewed_urls and url not in lgtm_urls)
+    no_review_url = not review_url
+    is_blank_tbr = git_hash in blank_tbr
+    rows.append((git_hash, timestamp[:7], timestamp,
+                 authors.get(git_hash, ''), review_url or '', subject,
+                 int(is_tbr), int(tbr_no_lgtm), int(no_review_url),
+                 int(is_blank_tbr),
+                 int(tbr_no_lgtm or no_review_url or is_blank_tbr)))
+  return rows
+
+
+def update_monthly_summary(cc, months, placeholder='%s'):
+  """Recomputes the monthly_summary rows of months from commit_summary
+
+  Args:
+    cc(cursor)
+    months(list): 'YYYY-MM' strings
+    placeholder(str): the paramstyle of the database module: '%s' for
+                      MySQLdb, '?' for sqlite3
+  """
+  months = list(months)
+  if not months:
+    return
+  in_months = 'month IN (%s)' % ', '.join([placeholder] * len(months))
+  cc.execute('DELETE FROM monthly_summary WHERE %s' % in_months, months)
+  cc.execute("""INSERT INTO monthly_summary (%s)
+      SELECT month, author, COUNT(*), SUM(tbr), SUM(tbr_no_lgtm),
+        SUM(no_review_url), SUM(blank_tbr), SUM(suspicious)
+      FROM commit_summary
+      WHERE %s
+      GROUP BY month, author""" % (', '.join(MONTHLY_SUMMARY_COLUMNS),
+                                   in_months), months)
+
+
+def write_commit_summary(cc, rows, placeholder='%s'):
+  """Upserts commit_summary rows, then updates monthly_summary accordingly"""
+  statement = 'REPLACE INTO commit_summary (%s) VALUES (%s)' % (
+      ', '.join(COMMIT_SUMMARY_COLUMNS),
+      ', '.join([placeholder] * len(COMMIT_SUMMARY_COLUMNS)))
+  for i in xrange(0, len(rows), SUMMARY_WRITE_CHUNK):
+    cc.executemany(statement, rows[i:i + SUMMARY_WRITE_CHUNK])
+  update_monthly_summary(cc, sorted(set(row[1] for row in rows)),
+                         placeholder)
+
+
+def rebuild_summary(connection, placeholder='%s'):
+  """Recomputes commit_summary and monthly_summary from the other tables
+
+  Args:
+    connection: a DB-API connection to the antibody database
+    placeholder(str): see update_monthly_summary
+  """
+  cc = connection.cursor()
+  try:
+    cc.execute('SELECT hash, timestamp, review_url, subject FROM git_commit')
+    commits = cc.fetchall()
+    cc.execute("""SELECT people_email_address, git_commit_hash, type
+        FROM commit_people""")
+    commit_people = cc.fetchall()
+    cc.execute('SELECT review_url FROM review')
+    reviewed_urls = set(url for (url,) in cc.fetchall())
+    cc.execute("""SELECT DISTINCT review_url FROM review_people
+        WHERE type = 'lgtm'""")
+    lgtm_urls = set(url for (url,) in cc.fetchall())
+    rows = summarize_commits(commits, commit_people, reviewed_urls, lgtm_urls)
+    cc.execute('DELETE FROM commit_summary')
+    cc.execute('DELETE FROM monthly_summary')
+    write_commit_summary(cc, rows, placeholder)
+    connection.commit()
+  except Exception:
+    connection.rollback()
+    raise
+  finally:
+    cc.close()
+
+
+def ensure_summary(connection, placeholder='%s'):
+  """Rebuilds the summary tables if they are empty but git_commit is not,
+  e.g. for a database populated before they existed. Returns whether it did.
+  """
+  cc = connection.cursor()
+  try:
+    cc.execute('SELECT COUNT(*) FROM monthly_summary')
+    summarized = int(cc.fetchone()[0])
+    cc.execute('SELECT COUNT(*) FROM git_commit')
+    commits = int(cc.fetchone()[0])
+  finally:
+    cc.close()
+  if summarized or not commits:
+    return False
+  rebuild_summary(connection, placeholder)
+  return True
+
+
+def read_summary(cc, now, placeholder='%s'):
+  """Reads what compute_summary_stats needs from the summary tables
+
+  That is all of monthly_summary, plus the commit_summary rows of the
+  suspicious commits and of all the commits of the past LEADERBOARD_DAYS.
+
+  Args:
+    cc(cursor)
+    now(datetime): the current time
+    placeholder(str): see update_monthly_summary
+
+  Return:
+    (monthly_rows, commit_rows)
+  """
+  cc.execute('SELECT %s FROM monthly_summary'
+             % ', '.join(MONTHLY_SUMMARY_COLUMNS))
+  monthly_rows = cc.fetchall()
+  columns = ', '.join(COMMIT_SUMMARY_COLUMNS)
+  cc.execute("""SELECT %s FROM commit_summary WHERE timestamp >= %s
+      UNION
+      SELECT %s FROM commit_summary WHERE suspicious = 1""" % (
+          columns, placeholder, columns),
+      (_cutoff(now, max(days for _, days in TIMEFRAMES if days)),))
+  commit_rows = cc.fetchall()
+  return monthly_rows, commit_rows
+
+
+def _cutoff(now, days):
+  """Returns the earliest timestamp less than days days before now, as in
+  DATEDIFF(NOW(), timestamp) <= days."""
+  return (now.date() - datetime.timedelta(days=days)).strftime(
+      '%Y-%m-%d 00:00:00')
+
+
+def _month_range(start, end):
+  """Returns all the 'YYYY-MM' months from start to end."""
+  year, month = int(start[:4]), int(start[5:7])
+  months = []
+  while '%04d-%02d' % (year, month) <= end:
+    months.append('%04d-%02d' % (year, month))
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+  return months
+
+
+def _formatted_commit(row):
+  """[review_url, timestamp, subject, hash] of a commit_summary row"""
+  return [row[4], str(row[2]), row[5].replace('-', ' '), row[0]]
+
+
+def compute_summary_stats(monthly_rows, commit_rows, now):
+  """Computes all the stats of all_monthly_stats, all_time_leaderboard and
+  past_month_leaderboard from the rows returned by read_summary
+
+  Return:
+    (monthly_stats, all_time_leaderboard, past_month_leaderboard): the
+    contents of the three json files, see write_stats_files
+  """
+  sums_by_month = {}
+  all_time, suspicious_by_author, commits_by_author = [0] * 6, {}, {}
+  for row in monthly_rows:
+    month, author, counts = row[0], row[1], [int(x) for x in row[2:]]
+    month_sums = sums_by_month.setdefault(month, [0] * 6)
+    for i, count in enumerate(counts):
+      month_sums[i] += count
+      all_time[i] += count
+    commits_by_author[author] = commits_by_author.get(author, 0) + counts[0]
+    suspicious_by_author[author] = (
+        suspicious_by_author.get(author, 0) + counts[5])
+
+  data_for_graph, suspicious_to_total_ratio = [], []
+  if sums_by_month:
+    for month in _month_range(min(sums_by_month), max(sums_by_month)):
+      commits, tbr, tbr_no_lgtm_count, no_review, blank, _ = (
+          sums_by_month.get(month, [0] * 6))
+      data_for_graph.append([month, commits, tbr, tbr_no_lgtm_count,
+                             no_review, blank])
+      if tbr_no_lgtm_count + no_review + blank:
+        suspicious_to_total_ratio.append([month, totaled_ratio_calculator(
+            tbr_no_lgtm_count + no_review + blank, commits)])
+
+  output = {'all_stats_by_month': data_for_graph,
+            'suspicious_to_total_ratio_by_month': suspicious_to_total_ratio}
+  commit_rows = sorted(commit_rows, key=lambda row: str(row[2]),
+                       reverse=True)
+  for label, days in TIMEFRAMES:
+    if days is None:
+      rows = [row for row in commit_rows if row[10]]
+      totals = all_time
+    else:
+      cutoff = _cutoff(now, days)
+      rows = [row for row in commit_rows if str(row[2]) >= cutoff]
+      totals = [len(rows)] + [sum(row[i] for row in rows)
+                              for i in (6, 7, 8, 9, 10)]
+    stats = {
+        'timeframe': label,
+        'total_commits': totals[0],
+        'suspicious_to_total_ratio': totaled_ratio_calculator(
+            totals[2] + totals[3] + totals[4], totals[0]),
+    }
+    for name, column in (('tbr_no_lgtm', 7), ('no_review_url', 8),
+                         ('blank_tbr', 9)):
+      stats[name] = totals[column - 5]
+      stats[name + '_commits'] = [
+          _formatted_commit(row) for row in rows if row[column]]
+    output[label] = stats
+
+  all_time_leaderboard = rank_people(
+      sorted(suspicious_by_author.iteritems()),
+      {email: float(count) for email, count in commits_by_author.iteritems()})
+
+  cutoff = _cutoff(now, LEADERBOARD_DAYS)
+  recent_suspicious, recent_commits = {}, {}
+  for row in commit_rows:
+    if str(row[2]) >= cutoff:
+      recent_commits[row[3]] = recent_commits.get(row[3], 0) + 1
+      recent_suspicious[row[3]] = recent_suspicious.get(row[3], 0) + row[10]
+  past_month_leaderboard = rank_people(
+      sorted(recent_suspicious.iteritems()),
+      {email: float(count) for email, count in recent_commits.iteritems()})
+  return output, all_time_leaderboard, past_month_leaderboard
+
+
+def write_stats_files(cc, output_dirpath, now=None,
+                      placeholder='%s'):  # pragma: no cover
+  """Writes all_monthly_stats.json, all_time_leaderboard.json and
+  past_month_leaderboard.json from the summary tables, with a single pass
+  over each
+
+  Args:
+    cc(cursor)
+    output_dirpath(str): the directory to write the files to
+    now(datetime): the current time, defaults to utcnow()
+    placeholder(str): see update_monthly_summary
+  """
+  now = now or datetime.datetime.utcnow()
+  outputs = compute_summary_stats(*read_summary(cc, now, placeholder),
+                                  now=now)
+  for filename, output in zip(('all_monthly_stats.json',
+                               'all_time_leaderboard.json',
+                               'past_month_leaderboard.json'), outputs):
+    with open(os.path.join(output_dirpath, filename), 'w') as f:
+      json.dump(output, f)
@@ -33,6 +33,69 @@ def read_commit_info(git_checkout_path, commits_after_date,
   return log
 
 
+def split_git_log_records(chunks):
+  """Splits the output of read_commit_info into records as it is read.
+
+  Args:
+    chunks(iterable): successive pieces of git log output
+
+  Yields:
+    record(str): the fields of one commit, separated by %x1f
+  """
+  pending = ''
+  for chunk in chunks:
+    records = (pending + chunk).split('\x1e')
+    pending = records.pop()
+    for record in records:
+      if record.strip('\n'):
+        yield record.strip()
+  if pending.strip():
+    yield pending.strip()
+
+
+def iter_commit_info(git_checkout_path, commits_after_date=None,
+                     since_commit=None,
+                     git_log_format=('%H', '%b', '%ae', '%ci', '%f'),
+                     git_commit_fields=('id', 'body', 'author',
+                                        'timestamp', 'subject'),
+                     chunk_size=1 << 16):
+  """Streams the commits of master, parsed like parse_commit_info
+
+  Commits are yielded oldest first and in topological order, so that all the
+  parents of a commit have been yielded before it.
+
+  Args:
+    git_checkout_path(str): path to a local git checkout
+    commits_after_date(str): only read commits after this date
+    since_commit(str): only read commits which are not ancestors of this one;
+                       takes precedence over commits_after_date
+    git_log_format(tuple): formatting directives passed to git log --format
+    git_commit_fields(tuple): labels for the fields in git_log_format
+
+  Yields:
+    commit(dict): the parsed components of a single commit message
+  """
+  cmd = ['git', 'log', '--topo-order', '--reverse',
+         '--format=%s' % ('%x1f'.join(git_log_format) + '%x1e')]
+  if since_commit:
+    cmd.append('%s..master' % since_commit)
+  else:
+    cmd.extend(['master', '--after=%s' % commits_after_date])
+  proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, cwd=git_checkout_path)
+  completed = False
+  try:
+    chunks = iter(lambda: proc.stdout.read(chunk_size), '')
+    for record in split_git_log_records(chunks):
+      yield dict(zip(git_commit_fields, record.split('\x1f')))
+    completed = True
+  finally:
+    proc.stdout.close()
+    retcode = proc.wait()
+  # git gets a SIGPIPE if the caller stopped early.
+  if completed and retcode:
+    raise subprocess.CalledProcessError(retcode, cmd)
+
+
 def parse_commit_info(git_log,
                       git_commit_fields=('id', 'body', 'author',
                                          'timestamp', 'subject')):
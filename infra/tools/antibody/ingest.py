@@ -0,0 +1,410 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Streaming ingestion of git commits and their code reviews.
+
+git_commit_parser.upload_to_sql and code_review_parse.upload_to_sql parse the
+whole git log, find review urls and fetch review json one commit at a time
+and stage every row through CSV files. ingest() instead reads the git log
+incrementally, starting after the last commit already in the database, and
+processes it in batches: the review urls and review json of a batch are
+fetched by a bounded pool of threads (the json through a local ReviewCache),
+then its git_commit, commit_people, review and review_people rows are upserted
+with executemany(), along with its compute_stats summary rows, in one
+transaction per batch. An interrupted run resumes from the last batch it
+committed. Reviews whose fetch failed are recorded in the ReviewCache, and
+retried at the start of the next run.
+"""
+
+import collections
+import functools
+import json
+import logging
+from multiprocessing.pool import ThreadPool
+import sqlite3
+import subprocess
+import zlib
+
+import infra.tools.antibody.code_review_parse as crp
+from infra.tools.antibody import compute_stats
+from infra.tools.antibody import git_commit_parser
+
+
+# https://chromium.googlesource.com/infra/infra/+/master/infra_libs/logs/README.md
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_WORKERS = 8
+
+# Tables written by ingest(), in the order they are written, and the columns
+# of their rows (see ANTIBODY_DB_schema_setup.sql).
+TABLE_COLUMNS = collections.OrderedDict([
+    ('git_commit', ('hash', 'bug_url', 'timestamp', 'review_url',
+                    'project_prj_id', 'subject')),
+    ('commit_people', ('people_email_address', 'git_commit_hash',
+                       'request_timestamp', 'type')),
+    ('review', ('review_url', 'url_exists', 'request_timestamp',
+                'patchset_commited', 'patchset_still_exists', 'reverted',
+                'project_prj_id')),
+    ('review_people', ('people_email_address', 'review_url', 'timestamp',
+                       'request_timestamp', 'type')),
+])
+
+
+class ReviewCache(object):
+  """An on-disk cache of code review json, by canonical review url, and of the
+  reviews whose fetch failed, by commit.
+
+  Only ever used from the thread running ingest(), so a single sqlite
+  connection is enough.
+  """
+
+  def __init__(self, path=None):
+    """
+    Args:
+      path(str): path to the sqlite database, or None for an in-memory cache.
+    """
+    self._db = sqlite3.connect(path or ':memory:')
+    self._db.execute('CREATE TABLE IF NOT EXISTS reviews ('
+                     '  url TEXT PRIMARY KEY,'
+                     '  value BLOB NOT NULL)')
+    self._db.execute('CREATE TABLE IF NOT EXISTS failed_reviews ('
+                     '  git_commit_hash TEXT PRIMARY KEY,'
+                     '  url TEXT NOT NULL,'
+                     '  commit_message TEXT NOT NULL)')
+
+  def get(self, url):
+    row = self._db.execute('SELECT value FROM reviews WHERE url = ?',
+                           (url,)).fetchone()
+    if row is None:
+      return None
+    return json.loads(zlib.decompress(str(row[0])))
+
+  def set_many(self, items):
+    """Stores (url, json_data) pairs."""
+    self._db.executemany(
+        'INSERT OR REPLACE INTO reviews (url, value) VALUES (?, ?)',
+        [(url, sqlite3.Binary(zlib.compress(json.dumps(json_data))))
+         for url, json_data in items])
+    self._db.commit()
+
+  def add_failed(self, items):
+    """Stores (git_commit_hash, url, commit_message) tuples of the commits
+    whose review couldn't be fetched."""
+    self._db.executemany(
+        'INSERT OR REPLACE INTO failed_reviews '
+        '(git_commit_hash, url, commit_message) VALUES (?, ?, ?)', items)
+    self._db.commit()
+
+  def get_failed(self):
+    """Returns the (git_commit_hash, url, commit_message) tuples stored with
+    add_failed."""
+    return self._db.execute('SELECT git_commit_hash, url, commit_message '
+                            'FROM failed_reviews ORDER BY url').fetchall()
+
+  def remove_failed(self, urls):
+    self._db.executemany('DELETE FROM failed_reviews WHERE url = ?',
+                         [(url,) for url in urls])
+    self._db.commit()
+
+  def close(self):
+    self._db.close()
+
+
+def upsert_statement(table, placeholder='%s'):
+  """Returns the statement inserting or replacing a row of table.
+
+  Args:
+    table(str): one of TABLE_COLUMNS
+    placeholder(str): the paramstyle of the database module: '%s' for
+                      MySQLdb, '?' for sqlite3
+  """
+  columns = TABLE_COLUMNS[table]
+  return 'REPLACE INTO %s (%s) VALUES (%s)' % (
+      table, ', '.join(columns), ', '.join([placeholder] * len(columns)))
+
+
+def write_batch(connection, rows_by_table, placeholder='%s'):
+  """Upserts the rows of each table in a single transaction.
+
+  Args:
+    connection: a DB-API connection
+    rows_by_table(dict): lists of rows, by table name. 'commit_summary' rows
+                         are written with compute_stats.write_commit_summary.
+    placeholder(str): see upsert_statement
+  """
+  cursor = connection.cursor()
+  try:
+    for table in TABLE_COLUMNS:
+      rows = rows_by_table.get(table)
+      if rows:
+        cursor.executemany(upsert_statement(table, placeholder), rows)
+    if rows_by_table.get('commit_summary'):
+      compute_stats.write_commit_summary(
+          cursor, rows_by_table['commit_summary'], placeholder)
+    connection.commit()
+  except Exception:
+    connection.rollback()
+    raise
+  finally:
+    cursor.close()
+
+
+def get_last_ingested_commit(cc):
+  """Returns the hash of the most recent commit in git_commit, or None."""
+  cc.execute('SELECT hash FROM git_commit ORDER BY timestamp DESC LIMIT 1')
+  row = cc.fetchone()
+  return row[0] if row else None
+
+
+def is_ancestor_of_master(git_checkout_path, commit):
+  with open('/dev/null', 'w') as devnull:
+    return subprocess.call(
+        ['git', 'merge-base', '--is-ancestor', commit, 'master'],
+        cwd=git_checkout_path, stdout=devnull, stderr=devnull) == 0
+
+
+def _get_commit_rows(commit, git_checkout_path):
+  """Returns the git_commit row and commit_people rows of a commit.
+
+  Runs in the pool: finding the review url may fetch and compare diffs.
+  """
+  git_hash, bug_url, timestamp, review_url, project, subject = (
+      git_commit_parser.get_features_for_git_commit(
+          commit, git_checkout_path, None))
+  # A missing review url is stored as '', like git_commit_parser.write_to_csv
+  # does, which is what the queries of compute_stats and code_review_parse
+  # expect.
+  return ((git_hash, bug_url, timestamp, review_url or '', project, subject),
+          git_commit_parser.parse_commit_people([commit]))
+
+
+def _fetch_review(url_and_commit_message):
+  """Returns (url, review json or None, whether the fetch succeeded). Runs in
+  the pool."""
+  url, commit_message = url_and_commit_message
+  try:
+    return url, crp.extract_code_review_json_data_for_commit(
+        url, commit_message), True
+  except Exception:  # pylint: disable=broad-except
+    LOGGER.exception('failed to fetch review %s', url)
+    return url, None, False
+
+
+def _get_reviews(commit_message_by_url, pool, cache):
+  """Returns the json of reviews, from the cache or fetched with the pool.
+
+  Args:
+    commit_message_by_url(dict): message of a commit reviewed at each url
+    pool(ThreadPool): pool to fetch reviews with
+    cache(ReviewCache): cache of review json
+
+  Return:
+    (reviews(dict): review json by url, failed(set): urls whose fetch failed)
+  """
+  reviews = {}
+  missing = []
+  for url, commit_message in commit_message_by_url.iteritems():
+    json_data = cache.get(url)
+    if json_data is None:
+      missing.append((url, commit_message))
+    else:
+      reviews[url] = json_data
+  fetched, failed = [], set()
+  for url, json_data, ok in pool.map(_fetch_review, missing):
+    if not ok:
+      failed.add(url)
+    elif json_data:
+      fetched.append((url, json_data))
+  cache.set_many(fetched)
+  reviews.update(fetched)
+  return reviews, failed
+
+
+def _get_review_rows(urls, reviews):
+  """Returns the review rows and review_people rows of the reviews of urls."""
+  review_rows, review_people_rows = [], []
+  for url in urls:
+    if url in reviews:
+      review_row, people_rows = crp.get_data_for_review(url, reviews[url])
+      if review_row:
+        review_rows.append(review_row)
+        review_people_rows.extend(people_rows)
+  return review_rows, review_people_rows
+
+
+def _summarize(git_commit_rows, commit_people_rows, review_rows,
+               review_people_rows):
+  return compute_stats.summarize_commits(
+      [(row[0], row[2], row[3], row[5]) for row in git_commit_rows],
+      [(row[0], row[1], row[3]) for row in commit_people_rows],
+      set(row[0] for row in review_rows),
+      set(row[1] for row in review_people_rows if row[4] == 'lgtm'))
+
+
+def process_batch(commits, git_checkout_path, pool, cache):
+  """Computes the rows of a batch of commits, and of their reviews.
+
+  As in code_review_parse.get_code_review_data, only the reviews of commits
+  with a TBR are fetched. The commits whose review couldn't be fetched are
+  recorded in the cache, see retry_failed_reviews.
+
+  Args:
+    commits(list): commits parsed as dictionaries
+    git_checkout_path(str): path to a local git checkout
+    pool(ThreadPool): pool to find review urls and fetch reviews with
+    cache(ReviewCache): cache of review json
+
+  Return:
+    rows_by_table(dict): rows to write, by table name
+  """
+  commit_rows = pool.map(
+      functools.partial(_get_commit_rows, git_checkout_path=git_checkout_path),
+      commits)
+
+  git_commit_rows, commit_people_rows = [], []
+  commit_message_by_url = collections.OrderedDict()
+  commits_by_url = collections.defaultdict(list)
+  for commit, (git_commit_row, people_rows) in zip(commits, commit_rows):
+    git_commit_rows.append(git_commit_row)
+    commit_people_rows.extend(people_rows)
+    review_url = git_commit_row[3]
+    if review_url and any(row[3] == 'tbr' for row in people_rows):
+      url = crp.to_canonical_review_url(review_url)
+      # cannot get access into chromereview.googleplex.com
+      if 'chromereviews.googleplex' not in url:
+        commit_message_by_url.setdefault(url, commit['body'])
+        commits_by_url[url].append(git_commit_row[0])
+
+  reviews, failed = _get_reviews(commit_message_by_url, pool, cache)
+  cache.add_failed([(git_hash, url, commit_message_by_url[url])
+                    for url in failed for git_hash in commits_by_url[url]])
+  review_rows, review_people_rows = _get_review_rows(commit_message_by_url,
+                                                     reviews)
+
+  # Every review of the batch's commits is in the batch, so their summary
+  # can be computed from the batch alone (until a failed review is retried).
+  return {
+      'git_commit': git_commit_rows,
+      'commit_people': commit_people_rows,
+      'review': review_rows,
+      'review_people': crp.primary_key_uniquifier(
+          review_people_rows, lambda x: (x[0], x[1], x[2], x[4])),
+      'commit_summary': _summarize(git_commit_rows, commit_people_rows,
+                                   review_rows, review_people_rows),
+  }
+
+
+def retry_failed_reviews(connection, pool, cache, placeholder='%s'):
+  """Fetches the reviews whose fetch failed in a previous run, and writes them
+  along with the recomputed summary of their commits.
+
+  Args:
+    connection: a DB-API connection to the antibody database
+    pool(ThreadPool): pool to fetch reviews with
+    cache(ReviewCache): cache of review json and of the failed reviews
+    placeholder(str): see upsert_statement
+
+  Return:
+    (int): the number of reviews which are no longer failing
+  """
+  commit_message_by_url = collections.OrderedDict()
+  commits_by_url = collections.defaultdict(list)
+  for git_hash, url, commit_message in cache.get_failed():
+    commit_message_by_url.setdefault(url, commit_message)
+    commits_by_url[url].append(git_hash)
+  if not commit_message_by_url:
+    return 0
+  LOGGER.info('Retrying %d failed reviews', len(commit_message_by_url))
+  reviews, failed = _get_reviews(commit_message_by_url, pool, cache)
+  urls = [url for url in commit_message_by_url if url not in failed]
+  if not urls:
+    return 0
+
+  hashes = [git_hash for url in urls for git_hash in commits_by_url[url]]
+  in_hashes = '(%s)' % ', '.join([placeholder] * len(hashes))
+  cursor = connection.cursor()
+  try:
+    cursor.execute('SELECT hash, bug_url, timestamp, review_url, '
+                   'project_prj_id, subject FROM git_commit '
+                   'WHERE hash IN ' + in_hashes, hashes)
+    git_commit_rows = cursor.fetchall()
+    cursor.execute('SELECT people_email_address, git_commit_hash, '
+                   'request_timestamp, type FROM commit_people '
+                   'WHERE git_commit_hash IN ' + in_hashes, hashes)
+    commit_people_rows = cursor.fetchall()
+  finally:
+    cursor.close()
+  review_rows, review_people_rows = _get_review_rows(urls, reviews)
+  write_batch(connection, {
+      'review': review_rows,
+      'review_people': crp.primary_key_uniquifier(
+          review_people_rows, lambda x: (x[0], x[1], x[2], x[4])),
+      'commit_summary': _summarize(git_commit_rows, commit_people_rows,
+                                   review_rows, review_people_rows),
+  }, placeholder)
+  # Only once they are written, so that they are retried if writing failed.
+  cache.remove_failed(urls)
+  return len(urls)
+
+
+def _batches(iterable, size):
+  batch = []
+  for item in iterable:
+    batch.append(item)
+    if len(batch) == size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+
+def ingest(connection, git_checkout_path, commits_after_date,
+           cache_path=None, batch_size=DEFAULT_BATCH_SIZE,
+           workers=DEFAULT_WORKERS, placeholder='%s'):
+  """Writes the commits of master not yet in the database, and their reviews.
+
+  Args:
+    connection: a DB-API connection to the antibody database
+    git_checkout_path(str): path to a local git checkout
+    commits_after_date(str): where to start if the database has no commits
+    cache_path(str): path to the ReviewCache, None to not keep one on disk
+                     (and then not retry the reviews whose fetch failed)
+    batch_size(int): number of commits written per transaction
+    workers(int): number of threads fetching reviews
+    placeholder(str): see upsert_statement
+
+  Return:
+    (int): the number of commits ingested
+  """
+  cursor = connection.cursor()
+  try:
+    last_commit = get_last_ingested_commit(cursor)
+  finally:
+    cursor.close()
+  if last_commit and not is_ancestor_of_master(git_checkout_path,
+                                               last_commit):
+    LOGGER.warn('%s is not in master, reading the log after %s',
+                last_commit, commits_after_date)
+    last_commit = None
+  LOGGER.info('Ingesting commits after %s', last_commit or commits_after_date)
+
+  commits = git_commit_parser.iter_commit_info(
+      git_checkout_path, commits_after_date, since_commit=last_commit)
+  cache = ReviewCache(cache_path)
+  pool = ThreadPool(workers)
+  count = 0
+  try:
+    retry_failed_reviews(connection, pool, cache, placeholder)
+    for batch in _batches(commits, batch_size):
+      write_batch(connection,
+                  process_batch(batch, git_checkout_path, pool, cache),
+                  placeholder)
+      count += len(batch)
+      LOGGER.info('Ingested %d commits, up to %s', count, batch[-1]['id'])
+  finally:
+    pool.close()
+    pool.join()
+    cache.close()
+  return count
@@ -7,6 +7,7 @@ from mock import Mock
 import unittest
 
 from infra.tools.antibody import compute_stats
+from infra.tools.antibody.test import sqlite_db
 
 
 class TestComputeStats(unittest.TestCase):
@@ -88,4 +89,123 @@ class TestComputeStats(unittest.TestCase):
           '2015-05-20 00:26:31', 'Revert of Temporarily disable a webgl '
           'conformance test on D3D9 only. patchset 1 id 1 of https '
           'codereview.chromium.org 1135333004',
-          '0b0b636093a7dbb56cc8712e2263b1c9a1ad8079']])
\ No newline at end of file
+          '0b0b636093a7dbb56cc8712e2263b1c9a1ad8079']])
+
+
+class TestSummary(unittest.TestCase):
+  now = datetime.datetime(2015, 7, 20, 12, 0, 0)
+  r1 = 'https://codereview.chromium.org/1'
+  r2 = 'https://chromiumcodereview.appspot.com/2'
+
+  def setUp(self):
+    self.db = sqlite_db.connect()
+    self.db.executemany('INSERT INTO git_commit VALUES (?, ?, ?, ?, ?, ?)', [
+        ('h1', '', '2015-05-10 10:00:00', self.r1, 0, 'tbr-no-lgtm'),
+        ('h2', '', '2015-05-11 10:00:00', '', 0, 'no-review'),
+        ('h3', '', '2015-07-01 10:00:00', self.r2, 0, 'tbr-lgtm'),
+        ('h4', '', '2015-07-15 10:00:00', self.r1, 0, 'blank-tbr'),
+        ('h5', '', '2015-07-19 10:00:00', self.r2, 0, 'reviewed'),
+    ])
+    self.db.executemany(
+        'INSERT INTO commit_people VALUES (?, ?, NULL, ?)', [
+            ('alice', 'h1', 'author'), ('bob', 'h1', 'tbr'),
+            ('alice', 'h2', 'author'),
+            ('bob', 'h3', 'author'), ('alice', 'h3', 'tbr'),
+            ('bob', 'h4', 'author'), ('NOBODY', 'h4', 'tbr'),
+            ('bob', 'h5', 'author'),
+        ])
+    self.db.executemany('INSERT INTO review (review_url) VALUES (?)',
+                        [(self.r1,), ('https://codereview.chromium.org/2',)])
+    self.db.execute("INSERT INTO review_people VALUES "
+                    "('bob', 'https://codereview.chromium.org/2', "
+                    "'2015-07-01 09:00:00', NULL, 'lgtm')")
+    compute_stats.rebuild_summary(self.db, placeholder='?')
+
+  def test_summarize_commits(self):
+    self.assertEqual(
+        self.db.execute('SELECT hash, author, tbr, tbr_no_lgtm, '
+                        'no_review_url, blank_tbr, suspicious '
+                        'FROM commit_summary ORDER BY hash').fetchall(),
+        [('h1', 'alice', 1, 1, 0, 0, 1),
+         ('h2', 'alice', 0, 0, 1, 0, 1),
+         ('h3', 'bob', 1, 0, 0, 0, 0),
+         ('h4', 'bob', 1, 1, 0, 1, 1),
+         ('h5', 'bob', 0, 0, 0, 0, 0)])
+    self.assertEqual(
+        self.db.execute('SELECT * FROM monthly_summary '
+                        'ORDER BY month, author').fetchall(),
+        [('2015-05', 'alice', 2, 1, 1, 1, 0, 2),
+         ('2015-07', 'bob', 3, 2, 1, 0, 1, 1)])
+
+  def test_ensure_summary(self):
+    self.assertFalse(compute_stats.ensure_summary(self.db, placeholder='?'))
+    self.db.execute('DELETE FROM monthly_summary')
+    self.assertTrue(compute_stats.ensure_summary(self.db, placeholder='?'))
+    self.assertEqual(
+        self.db.execute('SELECT COUNT(*) FROM monthly_summary').fetchone(),
+        (2,))
+
+  def test_compute_summary_stats(self):
+    monthly_rows, commit_rows = compute_stats.read_summary(
+        self.db.cursor(), self.now, placeholder='?')
+    # Every commit is either suspicious or from the past 30 days.
+    self.assertEqual(sorted(row[0] for row in commit_rows),
+                     ['h1', 'h2', 'h3', 'h4', 'h5'])
+    stats, all_time, past_month = compute_stats.compute_summary_stats(
+        monthly_rows, commit_rows, self.now)
+
+    self.assertEqual(stats['all_stats_by_month'], [
+        ['2015-05', 2, 1, 1, 1, 0],
+        ['2015-06', 0, 0, 0, 0, 0],
+        ['2015-07', 3, 2, 1, 0, 1],
+    ])
+    self.assertEqual(stats['suspicious_to_total_ratio_by_month'],
+                     [['2015-05', 1.0], ['2015-07', 0.667]])
+
+    self.assertEqual(stats['7_days'], {
+        'timeframe': '7_days',
+        'total_commits': 2,
+        'suspicious_to_total_ratio': 1.0,
+        'tbr_no_lgtm': 1,
+        'tbr_no_lgtm_commits': [
+            [self.r1, '2015-07-15 10:00:00', 'blank tbr', 'h4']],
+        'no_review_url': 0,
+        'no_review_url_commits': [],
+        'blank_tbr': 1,
+        'blank_tbr_commits': [
+            [self.r1, '2015-07-15 10:00:00', 'blank tbr', 'h4']],
+    })
+    self.assertEqual(stats['30_days']['total_commits'], 3)
+    self.assertEqual(stats['all_time']['total_commits'], 5)
+    self.assertEqual(stats['all_time']['suspicious_to_total_ratio'], 0.8)
+    self.assertEqual(
+        [row[3] for row in stats['all_time']['tbr_no_lgtm_commits']],
+        ['h4', 'h1'])
+    self.assertEqual(
+        [row[3] for row in stats['all_time']['no_review_url_commits']],
+        ['h2'])
+
+    self.assertEqual(all_time, [
+        {'email': 'alice', 'ratio': 1.0, 'suspicious': 2, 'total': 2.0,
+         'rank': 1},
+        {'email': 'bob', 'ratio': 0.333, 'suspicious': 1, 'total': 3.0,
+         'rank': 2},
+    ])
+    self.assertEqual(past_month, [
+        {'email': 'bob', 'ratio': 0.333, 'suspicious': 1, 'total': 3.0,
+         'rank': 1},
+    ])
+
+  def test_compute_summary_stats_empty(self):
+    stats, all_time, past_month = compute_stats.compute_summary_stats(
+        [], [], self.now)
+    self.assertEqual(stats['all_stats_by_month'], [])
+    self.assertEqual(stats['all_time']['total_commits'], 0)
+    self.assertEqual(all_time, [])
+    self.assertEqual(past_month, [])
+
+  def test_month_range(self):
+    self.assertEqual(compute_stats._month_range('2014-11', '2015-02'),
+                     ['2014-11', '2014-12', '2015-01', '2015-02'])
+    self.assertEqual(compute_stats._month_range('2015-02', '2015-02'),
+                     ['2015-02'])
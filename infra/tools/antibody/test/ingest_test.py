@@ -0,0 +1,249 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import mock
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import unittest
+
+from infra.tools.antibody import compute_stats
+from infra.tools.antibody import git_commit_parser
+from infra.tools.antibody import ingest
+from infra.tools.antibody.test import sqlite_db
+
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+REVIEW_URL = 'https://codereview.chromium.org/1004453003'
+
+
+def read_review(review_url, _commit_message):
+  issue = review_url.rsplit('/', 1)[-1]
+  with open(os.path.join(DATA_DIR, 'data', '%s.txt' % issue)) as f:
+    return json.load(f)
+
+
+class SplitGitLogRecordsTest(unittest.TestCase):
+  def test_split_across_chunks(self):
+    chunks = ['a\x1fb\x1e\nc', '\x1fd', '\x1e\n', 'e\x1ff\x1e\n']
+    self.assertEqual(
+        list(git_commit_parser.split_git_log_records(chunks)),
+        ['a\x1fb', 'c\x1fd', 'e\x1ff'])
+
+  def test_unterminated(self):
+    self.assertEqual(
+        list(git_commit_parser.split_git_log_records(['a\x1fb\x1e\nc\x1fd'])),
+        ['a\x1fb', 'c\x1fd'])
+    self.assertEqual(list(git_commit_parser.split_git_log_records([])), [])
+
+
+class UpsertTest(unittest.TestCase):
+  def setUp(self):
+    self.db = sqlite_db.connect()
+
+  def test_upsert_statement(self):
+    self.assertEqual(
+        ingest.upsert_statement('commit_people'),
+        'REPLACE INTO commit_people (people_email_address, git_commit_hash, '
+        'request_timestamp, type) VALUES (%s, %s, %s, %s)')
+
+  def test_write_batch(self):
+    ingest.write_batch(self.db, {
+        'git_commit': [('h1', None, '2015-01-01 00:00:00', None, 0, 'a'),
+                       ('h2', None, '2015-01-02 00:00:00', None, 0, 'b')],
+    }, placeholder='?')
+    ingest.write_batch(self.db, {
+        'git_commit': [('h2', '123', '2015-01-02 00:00:00', None, 0, 'b')],
+        'commit_people': [('me', 'h2', None, 'author')],
+    }, placeholder='?')
+    self.assertEqual(
+        self.db.execute('SELECT hash, bug_url FROM git_commit '
+                        'ORDER BY hash').fetchall(),
+        [('h1', None), ('h2', '123')])
+    self.assertEqual(ingest.get_last_ingested_commit(self.db.cursor()), 'h2')
+
+  def test_write_batch_rolls_back(self):
+    with self.assertRaises(sqlite3.Error):
+      ingest.write_batch(self.db, {
+          'git_commit': [('h1', None, '2015-01-01 00:00:00', None, 0, 'a')],
+          'commit_people': [('me', 'h1')],
+      }, placeholder='?')
+    self.assertEqual(
+        self.db.execute('SELECT COUNT(*) FROM git_commit').fetchone(), (0,))
+    self.assertIsNone(ingest.get_last_ingested_commit(self.db.cursor()))
+
+
+class ReviewCacheTest(unittest.TestCase):
+  def test_get_set(self):
+    tempdir = tempfile.mkdtemp()
+    try:
+      path = os.path.join(tempdir, 'cache.db')
+      cache = ingest.ReviewCache(path)
+      self.assertIsNone(cache.get('url'))
+      cache.set_many([('url', {'messages': []})])
+      cache.close()
+      cache = ingest.ReviewCache(path)
+      self.assertEqual(cache.get('url'), {'messages': []})
+      cache.close()
+    finally:
+      shutil.rmtree(tempdir)
+
+  def test_failed(self):
+    cache = ingest.ReviewCache()
+    self.assertEqual(cache.get_failed(), [])
+    cache.add_failed([('h1', 'url1', 'message1'), ('h2', 'url1', 'message2'),
+                      ('h3', 'url2', 'message3')])
+    cache.remove_failed(['url1'])
+    self.assertEqual(cache.get_failed(), [('h3', 'url2', 'message3')])
+    cache.close()
+
+
+class IngestTest(unittest.TestCase):
+  def setUp(self):
+    self.checkout = tempfile.mkdtemp()
+    self.git('init', '-q')
+    self.git('symbolic-ref', 'HEAD', 'refs/heads/master')
+    self.db = sqlite_db.connect()
+
+  def tearDown(self):
+    shutil.rmtree(self.checkout)
+
+  def git(self, *args, **kwargs):
+    env = dict(os.environ, **kwargs.pop('env', {}))
+    return subprocess.check_output(('git',) + args, cwd=self.checkout,
+                                   env=env, **kwargs)
+
+  def commit(self, subject, body, date):
+    self.git('commit', '-q', '--allow-empty', '-m', subject, '-m', body,
+             env={'GIT_AUTHOR_NAME': 'Author',
+                  'GIT_AUTHOR_EMAIL': 'author@chromium.org',
+                  'GIT_COMMITTER_NAME': 'Author',
+                  'GIT_COMMITTER_EMAIL': 'author@chromium.org',
+                  'GIT_AUTHOR_DATE': date,
+                  'GIT_COMMITTER_DATE': date})
+    return self.git('rev-parse', 'HEAD').strip()
+
+  def ingest(self, **kwargs):
+    return ingest.ingest(self.db, self.checkout, '2000-01-01',
+                         placeholder='?', **kwargs)
+
+  def test_ingest(self):
+    first = self.commit('First', 'BUG=123', '2015-06-01T10:00:00+0000')
+    second = self.commit('Second', 'TBR=reviewer@chromium.org\n\n'
+                         'Review URL: %s' % REVIEW_URL,
+                         '2015-06-02T10:00:00+0000')
+    third = self.commit('Third', 'TBR=other@chromium.org\n\n'
+                        'Review URL: %s' % REVIEW_URL,
+                        '2015-06-03T10:00:00+0000')
+
+    with mock.patch('infra.tools.antibody.code_review_parse.'
+                    'extract_code_review_json_data_for_commit',
+                    side_effect=read_review) as fetch:
+      self.assertEqual(self.ingest(batch_size=2, workers=2), 3)
+      # Both commits are in the same batch and share their review.
+      self.assertEqual(fetch.call_count, 1)
+
+      self.assertEqual(
+          self.db.execute('SELECT hash, bug_url, review_url, subject '
+                          'FROM git_commit ORDER BY timestamp').fetchall(),
+          [(first, '123', '', 'First'),
+           (second, None, REVIEW_URL, 'Second'),
+           (third, None, REVIEW_URL, 'Third')])
+      self.assertEqual(
+          sorted(self.db.execute('SELECT people_email_address, '
+                                 'git_commit_hash, type '
+                                 'FROM commit_people').fetchall()),
+          sorted([('author', first, 'author'),
+                  ('author', second, 'author'),
+                  ('reviewer', second, 'tbr'),
+                  ('author', third, 'author'),
+                  ('other', third, 'tbr')]))
+      self.assertEqual(
+          self.db.execute('SELECT review_url FROM review').fetchall(),
+          [(REVIEW_URL,)])
+      self.assertTrue(self.db.execute(
+          'SELECT COUNT(*) FROM review_people').fetchone()[0] > 0)
+
+      # Nothing new.
+      self.assertEqual(self.ingest(), 0)
+
+      fourth = self.commit('Fourth', 'TBR=reviewer@chromium.org\n\n'
+                           'Review URL: %s' % REVIEW_URL,
+                           '2015-06-04T10:00:00+0000')
+      self.assertEqual(self.ingest(), 1)
+      self.assertEqual(ingest.get_last_ingested_commit(self.db.cursor()),
+                       fourth)
+      # Without a persistent cache the review is fetched again.
+      self.assertEqual(fetch.call_count, 2)
+
+    # The summary maintained batch by batch is the same as a rebuilt one.
+    summary_queries = ('SELECT * FROM commit_summary ORDER BY hash',
+                       'SELECT * FROM monthly_summary ORDER BY month, author')
+    summary = [self.db.execute(q).fetchall() for q in summary_queries]
+    self.assertEqual(len(summary[0]), 4)
+    self.assertEqual(summary[1], [('2015-06', 'author', 4, 3, 3, 1, 0, 4)])
+    compute_stats.rebuild_summary(self.db, placeholder='?')
+    self.assertEqual([self.db.execute(q).fetchall() for q in summary_queries],
+                     summary)
+
+  def test_ingest_review_cache(self):
+    self.commit('First', 'TBR=reviewer@chromium.org\n\n'
+                'Review URL: %s' % REVIEW_URL, '2015-06-01T10:00:00+0000')
+    cache_path = os.path.join(self.checkout, '.git', 'review_cache.db')
+    with mock.patch('infra.tools.antibody.code_review_parse.'
+                    'extract_code_review_json_data_for_commit',
+                    side_effect=read_review) as fetch:
+      self.ingest(cache_path=cache_path)
+      self.commit('Second', 'TBR=reviewer@chromium.org\n\n'
+                  'Review URL: %s' % REVIEW_URL, '2015-06-02T10:00:00+0000')
+      self.ingest(cache_path=cache_path)
+    self.assertEqual(fetch.call_count, 1)
+    self.assertEqual(
+        self.db.execute('SELECT COUNT(*) FROM git_commit').fetchone(), (2,))
+
+  def test_ingest_failed_fetch(self):
+    self.commit('First', 'TBR=reviewer@chromium.org\n\n'
+                'Review URL: %s' % REVIEW_URL, '2015-06-01T10:00:00+0000')
+    cache_path = os.path.join(self.checkout, '.git', 'review_cache.db')
+    summary_query = 'SELECT * FROM commit_summary'
+    with mock.patch('infra.tools.antibody.code_review_parse.'
+                    'extract_code_review_json_data_for_commit',
+                    side_effect=ValueError):
+      self.assertEqual(self.ingest(cache_path=cache_path), 1)
+      # Still failing.
+      self.assertEqual(self.ingest(cache_path=cache_path), 0)
+    self.assertEqual(
+        self.db.execute('SELECT COUNT(*) FROM review').fetchone(), (0,))
+    tbr_no_lgtm_query = 'SELECT tbr_no_lgtm FROM commit_summary'
+    self.assertEqual(self.db.execute(tbr_no_lgtm_query).fetchall(), [(0,)])
+
+    # Retried by the next run, although there are no new commits.
+    with mock.patch('infra.tools.antibody.code_review_parse.'
+                    'extract_code_review_json_data_for_commit',
+                    side_effect=read_review) as fetch:
+      self.assertEqual(self.ingest(cache_path=cache_path), 0)
+      self.assertEqual(self.ingest(cache_path=cache_path), 0)
+    self.assertEqual(fetch.call_count, 1)
+    self.assertEqual(
+        self.db.execute('SELECT review_url FROM review').fetchall(),
+        [(REVIEW_URL,)])
+    # The review has no lgtm.
+    self.assertEqual(self.db.execute(tbr_no_lgtm_query).fetchall(), [(1,)])
+    summary = self.db.execute(summary_query).fetchall()
+    compute_stats.rebuild_summary(self.db, placeholder='?')
+    self.assertEqual(self.db.execute(summary_query).fetchall(), summary)
+
+  def test_ingest_unknown_last_commit(self):
+    first = self.commit('First', 'BUG=1', '2015-06-01T10:00:00+0000')
+    self.db.execute("INSERT INTO git_commit VALUES "
+                    "('%s', NULL, '2015-07-01 00:00:00', NULL, 0, 'gone')"
+                    % ('0' * 40))
+    self.assertEqual(self.ingest(), 1)
+    self.assertEqual(
+        self.db.execute('SELECT hash FROM git_commit WHERE subject = ?',
+                        ('First',)).fetchone(), (first,))
@@ -0,0 +1,36 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""sqlite stand-in for the tables of ANTIBODY_DB_schema_setup.sql."""
+
+import sqlite3
+
+
+SCHEMA = """
+CREATE TABLE git_commit (hash, bug_url, timestamp, review_url,
+  project_prj_id, subject, PRIMARY KEY (hash));
+CREATE TABLE commit_people (people_email_address, git_commit_hash,
+  request_timestamp, type,
+  PRIMARY KEY (people_email_address, git_commit_hash, type));
+CREATE TABLE review (review_url, url_exists, request_timestamp,
+  patchset_commited, patchset_still_exists, reverted, project_prj_id,
+  PRIMARY KEY (review_url));
+CREATE TABLE review_people (people_email_address, review_url, timestamp,
+  request_timestamp, type,
+  PRIMARY KEY (people_email_address, review_url, type, timestamp));
+CREATE TABLE commit_summary (hash, month, timestamp, author, review_url,
+  subject, tbr, tbr_no_lgtm, no_review_url, blank_tbr, suspicious,
+  PRIMARY KEY (hash));
+CREATE INDEX commit_summary_month ON commit_summary (month);
+CREATE INDEX commit_summary_timestamp ON commit_summary (timestamp);
+CREATE INDEX commit_summary_suspicious ON commit_summary (suspicious);
+CREATE TABLE monthly_summary (month, author, commits, tbr, tbr_no_lgtm,
+  no_review_url, blank_tbr, suspicious, PRIMARY KEY (month, author));
+"""
+
+
+def connect(path=':memory:'):
+  db = sqlite3.connect(path)
+  db.executescript(SCHEMA)
+  return db
@@ -12,19 +12,21 @@ import datetime
 import dateutil.parser
 import dateutil.tz
 from xml.etree import ElementTree
+import hashlib
 import infra_libs.logs
 import json
 import logging
 from multiprocessing.pool import ThreadPool
 import numbers
 import numpy
+import os
 import re
 import simplejson
 import subprocess
 import sys
+import tempfile
 import time
 import urllib
-import urllib2
 import urlparse
 
 import requests
@@ -44,6 +46,8 @@ PROJECTS = {
         'repo': 'https://skia.googlesource.com/skia',
     },
 }
+# Percentiles reported for list stats.
+PERCENTILES = (10, 25, 50, 75, 90, 95, 99)
 # Map of intervals to minutes.
 INTERVALS = {
     'week': 60 * 24 * 7,
@@ -144,6 +148,10 @@ REASONS['failed-unknown'] = {
 # This line was copied from master/buildbot/status/builder.py.
 SUCCESS, WARNINGS, FAILURE, SKIPPED, EXCEPTION, RETRY, TRY_PENDING = range(7)
 
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cq_stats_cache')
+# CQ logs of a day are assumed to be complete this long after the day is over.
+CQ_LOGS_SETTLE_TIME = datetime.timedelta(hours=1)
+
 
 def parse_args():
   parser = argparse.ArgumentParser(description=sys.modules['__main__'].__doc__)
@@ -198,6 +206,18 @@ def parse_args():
                       choices=INTERVALS.keys(),
                       default='week',
                       help='Time range to print stats for.')
+  parser.add_argument(
+      '--cache-dir', default=DEFAULT_CACHE_DIR,
+      help='Keep the CQ logs of past days, the stats of each patch and the '
+           'git logs in this directory, so that later runs only fetch new '
+           'data. Default=%(default)s.')
+  parser.add_argument(
+      '--no-cache', dest='cache_dir', action='store_const', const=None,
+      help='Do not read or write the cache.')
+  parser.add_argument(
+      '--resume', action='store_true',
+      help='Resume an interrupted run: also reuse the cached data which may '
+           'have changed since (e.g. the CQ logs of the current day).')
   infra_libs.logs.add_argparse_options(parser, default_level=logging.ERROR)
 
   args = parser.parse_args()
@@ -260,6 +280,63 @@ session.mount('http://', http_adapter)
 session.mount('https://', http_adapter)
 
 
+class ResultCache(object):
+  """An on-disk cache of fetched and derived data, shared by successive runs.
+
+  Each entry is a JSON file named after a hash of its key, which must be
+  JSON-serializable. Immutable entries (e.g. the CQ logs of a day which is
+  over) are always reused; mutable ones (e.g. the CQ logs of the current day)
+  are only reused when resuming an interrupted run. The cache is disabled if
+  ``path`` is None.
+
+  Safe to use from multiple threads.
+  """
+  # Bump to invalidate existing entries when their format changes.
+  VERSION = 1
+
+  def __init__(self, path=None, resume=False):
+    self.path = path
+    self.resume = resume
+    if path and not os.path.isdir(path):
+      os.makedirs(path)
+
+  @property
+  def enabled(self):
+    return bool(self.path)
+
+  def _filename(self, key):
+    digest = hashlib.sha1(json.dumps([self.VERSION, key])).hexdigest()
+    return os.path.join(self.path, digest + '.json')
+
+  def get(self, key):
+    """Returns the value cached for key, or None."""
+    if not self.enabled:
+      return None
+    try:
+      with open(self._filename(key)) as f:
+        entry = json.load(f)
+    except (IOError, ValueError):
+      return None
+    if not entry['immutable'] and not self.resume:
+      return None
+    return entry['value']
+
+  def set(self, key, value, immutable=True):
+    if not self.enabled:
+      return
+    try:
+      with tempfile.NamedTemporaryFile(
+          dir=self.path, suffix='.tmp', delete=False) as f:
+        json.dump({'immutable': immutable, 'value': value}, f)
+      os.rename(f.name, self._filename(key))
+    except (IOError, OSError) as e:
+      logging.warning('Failed to cache %r: %s', key, e)
+
+
+# Set up by main().
+result_cache = ResultCache()
+
+
 def fetch_json(url):
   return session.get(url).json()
 
@@ -275,16 +352,25 @@ def fetch_git_page(repo_url, cursor=None, page_size=2000):
   if cursor:
     params.update({'s': cursor})
   url = '%s/%s?%s' % (repo_url, '/+log/master', urllib.urlencode(params))
+  # Only the first page changes as new commits land.
+  cache_key = ['git_page', repo_url, cursor, page_size]
+  page = result_cache.get(cache_key)
+  if page is not None:
+    return page
   logging.debug('fetch_git_page: url = %s', url)
   try:
+    response = session.get(url)
+    response.raise_for_status()
     # Strip off the anti-XSS string from the response.
-    response = urllib2.urlopen(url)
-    lines = [l.rstrip() for l in response if l.rstrip() != ")]}'"]
+    lines = [l.rstrip() for l in response.text.splitlines()
+             if l.rstrip() != ")]}'"]
     raw_data = ''.join(lines)
     page = json.loads(raw_data)
   except (IOError, ValueError) as e:
     page = {}
     logging.error('Failed to fetch a page: %s', e)
+  else:
+    result_cache.set(cache_key, page, immutable=bool(cursor))
   return page
 
 
@@ -401,6 +487,44 @@ def fetch_cq_logs(start_date=None, end_date=None, filters=[]):
   return results
 
 
+def day_ranges(begin_date, end_date):
+  """Splits [begin_date, end_date) at UTC midnights.
+
+  Yields (begin, end) date pairs, in chronological order.
+  """
+  begin = begin_date
+  while begin < end_date:
+    midnight = begin.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = min(end_date, midnight + datetime.timedelta(days=1))
+    yield begin, end
+    begin = end
+
+
+def fetch_daily_cq_logs(start_date, end_date, filters):
+  """Like fetch_cq_logs(), but fetches the logs one day at a time and caches
+  them, so that the logs of a day which is over are only fetched once (e.g.
+  for both a weekly report and its per-day stats, and by the next runs).
+  """
+  if not result_cache.enabled:
+    return fetch_cq_logs(start_date, end_date, filters=filters)
+  settled = datetime.datetime.utcnow() - CQ_LOGS_SETTLE_TIME
+  results = []
+  # fetch_cq_logs() returns the most recent logs first.
+  for begin, end in reversed(list(day_ranges(start_date, end_date))):
+    begin_time = utc_date_to_timestamp(begin)
+    end_time = utc_date_to_timestamp(end)
+    cache_key = ['cq_logs', filters, begin_time, end_time]
+    day_results = result_cache.get(cache_key)
+    if day_results is None:
+      day_results = fetch_cq_logs(begin, end, filters=filters)
+      if end < end_date:
+        # Logs at midnight are part of the next day.
+        day_results = [r for r in day_results if r['timestamp'] < end_time]
+      result_cache.set(cache_key, day_results, immutable=end <= settled)
+    results.extend(day_results)
+  return results
+
+
 def default_stats():
   """Generate all the required stats fields with default values."""
   stats = {
@@ -453,39 +577,148 @@ def organize_stats(stats, init=None):
         result[data['name']] = data['count']
       else:
         assert data['type'] == 'list'
-        result[data['name']] = {
-            '10': data['percentile_10'],
-            '25': data['percentile_25'],
-            '50': data['percentile_50'],
-            '75': data['percentile_75'],
-            '90': data['percentile_90'],
-            '95': data['percentile_95'],
-            '99': data['percentile_99'],
+        list_stats = dict(
+            (str(p), data['percentile_%d' % p]) for p in PERCENTILES)
+        list_stats.update({
             'min': data['min'],
             'max': data['max'],
             'mean': data['mean'],
             'size': data['sample_size'],
-        }
+        })
+        result[data['name']] = list_stats
   return result
 
 
 def derive_list_stats(series):
-  if not series:
-    series = [0]
-  return {
-      '10': numpy.percentile(series, 10),
-      '25': numpy.percentile(series, 25),
-      '50': numpy.percentile(series, 50),
-      '75': numpy.percentile(series, 75),
-      '90': numpy.percentile(series, 90),
-      '95': numpy.percentile(series, 95),
-      '99': numpy.percentile(series, 99),
-      'min': min(series),
-      'max': max(series),
+  """Computes the distribution of a list or numpy array of numbers.
+
+  All percentiles are computed from a single sort of the series.
+  """
+  series = numpy.asarray(series)
+  if not series.size:
+    series = numpy.zeros(1, dtype=int)
+  stats = dict(zip((str(p) for p in PERCENTILES),
+                   numpy.percentile(series, PERCENTILES)))
+  stats.update({
+      'min': series.min().item(),
+      'max': series.max().item(),
       'mean': numpy.mean(series),
-      'size': len(series),
-      'raw': series,
-  }
+      'size': series.size,
+      'raw': series.tolist(),
+  })
+  return stats
+
+
+class PatchStatsTable(object):
+  """A columnar view of a ``{patch_id: patch stats}`` dict (see
+  derive_patch_stats()).
+
+  The numeric stats of all patches are copied into a numpy matrix in a single
+  pass over the dict, so that sums, filters, distributions and per-reason
+  breakdowns are then computed in vectorized passes. Rows are in the
+  iteration order of the dict; missing stats are 0.
+  """
+  COUNT_COLUMNS = (
+      'attempts', 'committed', 'rejections', 'false-rejections',
+      'infra-false-rejections', 'tryjob-retries', 'global-retry-quota',
+  ) + tuple(REASONS)
+  FLOAT_COLUMNS = ('patchset-duration',)
+  _REASON_NAMES = tuple(REASONS)
+  # Marks missing stats (counts are never negative).
+  _MISSING = -1
+
+  def __init__(self, patch_stats):
+    self.patch_stats = patch_stats
+    self.patch_ids = patch_stats.keys()
+    names = self.COUNT_COLUMNS + self.FLOAT_COLUMNS
+    missing = [self._MISSING] * len(names)
+    # None becomes NaN.
+    matrix = numpy.array(
+        [map(row.get, names, missing)
+         for row in (patch_stats[p] for p in self.patch_ids)],
+        dtype=numpy.float64).reshape(len(self.patch_ids), len(names))
+    self._present = matrix != self._MISSING
+    matrix[~self._present] = 0
+    matrix = numpy.nan_to_num(matrix)
+    num_counts = len(self.COUNT_COLUMNS)
+    self._counts = matrix[:, :num_counts].astype(numpy.int64)
+    self._count_index = dict((n, i) for i, n in enumerate(self.COUNT_COLUMNS))
+    self._columns = dict(
+        (name, self._counts[:, i]) for i, name in enumerate(self.COUNT_COLUMNS))
+    for i, name in enumerate(self.FLOAT_COLUMNS):
+      self._columns[name] = matrix[:, num_counts + i]
+    self._reason_cols = [self._count_index[r] for r in REASONS]
+    self._reason_values = None
+    self._reason_complete = None
+    self._reason_counts_cache = {}
+
+  def __len__(self):
+    return len(self.patch_ids)
+
+  def column(self, name):
+    """Returns the numpy array of stat ``name``, one value per patch."""
+    if name not in self._columns:
+      self._columns[name] = numpy.array(
+          [self.patch_stats[p].get(name) or 0 for p in self.patch_ids])
+    return self._columns[name]
+
+  def committed(self):
+    """Returns the boolean mask of the committed patches."""
+    return self.column('committed') > 0
+
+  def select(self, mask):
+    """Returns the ids of the patches selected by a boolean mask."""
+    return [self.patch_ids[i] for i in numpy.flatnonzero(mask)]
+
+  def _by_count(self, name):
+    counts = self.column(name)
+    rows = numpy.flatnonzero(counts)
+    # A stable sort, like sorted(..., reverse=True).
+    return rows[numpy.argsort(-counts[rows], kind='mergesort')]
+
+  def by_count(self, name):
+    """Returns the ids of the patches with a nonzero ``name`` stat, by
+    decreasing ``name`` (ties keep the order of the rows)."""
+    return [self.patch_ids[i] for i in self._by_count(name)]
+
+  def _reason_counts(self, row):
+    """Returns a dict of the REASONS counts present in a row. Cached."""
+    counts = self._reason_counts_cache.get(row)
+    if counts is None:
+      if self._reason_values is None:
+        self._reason_values = self._counts[:, self._reason_cols].tolist()
+        self._reason_complete = (
+            self._present[:, self._reason_cols].all(axis=1).tolist())
+      values = self._reason_values[row]
+      if self._reason_complete[row]:
+        counts = dict(zip(self._REASON_NAMES, values))
+      else:
+        present = self._present[row, self._reason_cols].tolist()
+        counts = dict((r, v) for r, v, p in zip(
+            self._REASON_NAMES, values, present) if p)
+      self._reason_counts_cache[row] = counts
+    return counts
+
+  def stats_by_count(self, name, reasons):
+    """Like stats_by_count_entry() for each of by_count(name), with the
+    counts of ``reasons`` read from the table."""
+    reasons = set(reasons)
+    if not reasons <= set(self._REASON_NAMES):
+      return [stats_by_count_entry(self.patch_stats[p], name, p, reasons)
+              for p in self.by_count(name)]
+    excluded = [r for r in self._REASON_NAMES if r not in reasons]
+    entries = []
+    for row in self._by_count(name).tolist():
+      patch = self.patch_ids[row]
+      patch_stats = self.patch_stats[patch]
+      entry = dict(self._reason_counts(row))
+      for r in excluded:
+        entry.pop(r, None)
+      entry['count'] = patch_stats[name]
+      entry['patch_id'] = patch
+      entry['failed-jobs-details'] = patch_stats['failed-jobs-details']
+      entries.append(entry)
+    return entries
 
 
 def sort_by_count(elements):
@@ -507,46 +740,40 @@ def stats_by_count_entry(patch_stats, name, patch, reasons):
 
 
 # "Dangerous default value []": pylint: disable=W0102
-def stats_by_count(patch_stats, name, reasons=[]):
-  return sort_by_count([
-      stats_by_count_entry(patch_stats[p], name, p, reasons)
-      for p in patch_stats if patch_stats[p].get(name)])
+def stats_by_count(patch_stats, name, reasons=[], table=None):
+  """``table`` is an optional PatchStatsTable of ``patch_stats``."""
+  table = table or PatchStatsTable(patch_stats)
+  return table.stats_by_count(name, reasons)
 
 
 def _derive_stats_from_patch_stats(stats):
   patch_stats = stats['patch_stats']
-  stats['attempt-count'] = sum(
-      patch_stats[p]['attempts'] for p in patch_stats)
-  stats['patchset-false-reject-count'] = sum(
-      patch_stats[p]['false-rejections'] for p in patch_stats)
-  stats['attempt-reject-count'] = sum(
-      patch_stats[p]['rejections'] for p in patch_stats)
-  stats['rejected-patches'] = set(
-      p for p in patch_stats if not patch_stats[p]['committed'])
+  table = PatchStatsTable(patch_stats)
+  committed = table.committed()
+  stats['attempt-count'] = table.column('attempts').sum().item()
+  stats['patchset-false-reject-count'] = (
+      table.column('false-rejections').sum().item())
+  stats['attempt-reject-count'] = table.column('rejections').sum().item()
+  stats['rejected-patches'] = set(table.select(~committed))
   stats['false-rejections'] = stats_by_count(
-      patch_stats, 'false-rejections', REASONS)
+      patch_stats, 'false-rejections', REASONS, table)
   stats['infra-false-rejections'] = stats_by_count(
-      patch_stats, 'infra-false-rejections', REASONS)
-  stats['rejections'] = stats_by_count(patch_stats, 'rejections', REASONS)
+      patch_stats, 'infra-false-rejections', REASONS, table)
+  stats['rejections'] = stats_by_count(
+      patch_stats, 'rejections', REASONS, table)
   for r in REASONS:
-    stats[r] = stats_by_count(patch_stats, r, set(REASONS) - set([r]))
-
-  stats['patchset-commit-count'] = len([
-      p for p in patch_stats if patch_stats[p]['committed']])
-  stats['patchset-committed-durations'] = derive_list_stats([
-      patch_stats[p]['patchset-duration'] for p in patch_stats
-      if patch_stats[p]['committed']])
-  stats['patchset-attempts'] = derive_list_stats([
-      patch_stats[p]['attempts'] for p in patch_stats])
-  stats['patchset-committed-attempts'] = derive_list_stats([
-      patch_stats[p]['attempts'] for p in patch_stats
-      if patch_stats[p]['committed']])
-  stats['patchset-committed-tryjob-retries'] = derive_list_stats([
-      patch_stats[p]['tryjob-retries'] for p in patch_stats
-      if patch_stats[p]['committed']])
-  stats['patchset-committed-global-retry-quota'] = derive_list_stats([
-      patch_stats[p]['global-retry-quota'] for p in patch_stats
-      if patch_stats[p]['committed']])
+    stats[r] = stats_by_count(patch_stats, r, set(REASONS) - set([r]), table)
+
+  stats['patchset-commit-count'] = committed.sum().item()
+  stats['patchset-committed-durations'] = derive_list_stats(
+      table.column('patchset-duration')[committed])
+  stats['patchset-attempts'] = derive_list_stats(table.column('attempts'))
+  stats['patchset-committed-attempts'] = derive_list_stats(
+      table.column('attempts')[committed])
+  stats['patchset-committed-tryjob-retries'] = derive_list_stats(
+      table.column('tryjob-retries')[committed])
+  stats['patchset-committed-global-retry-quota'] = derive_list_stats(
+      table.column('global-retry-quota')[committed])
 
 
 def derive_stats(args, begin_date, init_stats=None):
@@ -559,21 +786,33 @@ def derive_stats(args, begin_date, init_stats=None):
   stats = init_stats or default_stats()
   filters = ['project=%s' % args.project, 'action=patch_stop']
   end_date = begin_date + datetime.timedelta(minutes=INTERVALS[args.range])
-  results = fetch_cq_logs(begin_date, end_date, filters=filters)
+  results = fetch_daily_cq_logs(begin_date, end_date, filters=filters)
   if not results:
     return stats
 
   stats['begin'] = date_from_timestamp(results[-1]['timestamp'])
   stats['end'] = date_from_timestamp(results[0]['timestamp'])
 
-  raw_patches = set()
+  # The stats of a patch only depend on its logs up to its last patch_stop,
+  # so they can be cached by the time of that patch_stop.
+  last_stops = {}
   for reason in results:
-    raw_patches.add((reason['fields']['issue'], reason['fields']['patchset']))
+    patch_id = (reason['fields']['issue'], reason['fields']['patchset'])
+    last_stops[patch_id] = max(last_stops.get(patch_id, 0),
+                               reason['timestamp'])
+  raw_patches = set(last_stops)
 
   patch_stats = {}
   # Fetch and process each patchset log
   def get_patch_stats(patch_id):
-    return derive_patch_stats(args, begin_date, end_date, patch_id)
+    cache_key = ['patch_stats', patch_id, last_stops[patch_id],
+                 utc_date_to_timestamp(begin_date), args.path_filter_include,
+                 args.path_filter_exclude, args.use_message_parsing]
+    pstats = result_cache.get(cache_key)
+    if pstats is None:
+      _, pstats = derive_patch_stats(args, begin_date, end_date, patch_id)
+      result_cache.set(cache_key, pstats)
+    return patch_id, pstats
 
   if args.seq or not args.thread_pool:
     iterable = map(get_patch_stats, raw_patches)
@@ -953,110 +1192,144 @@ def print_usage(stats):
   output(fmt_str, *data)
 
 
+# Columns of the try job stats of a builder, see aggregate_try_job_results().
+TRY_JOB_FAILURE_TYPES = collections.OrderedDict([
+    ('COMPILE_FAILURE', 'compile_failures'),
+    ('TEST_FAILURE', 'test_failures'),
+    ('INVALID_TEST_RESULTS', 'invalid_results_failures'),
+    ('PATCH_FAILURE', 'patch_failures'),
+])
+TRY_JOB_CATEGORIES = (
+    ('infra_failures',) + tuple(TRY_JOB_FAILURE_TYPES.values()) +
+    ('other_failures',))
+_INFRA_CATEGORY = 0
+_OTHER_CATEGORY = len(TRY_JOB_CATEGORIES) - 1
+_FAILURE_TYPE_CATEGORIES = dict(
+    (t, TRY_JOB_CATEGORIES.index(c))
+    for t, c in TRY_JOB_FAILURE_TYPES.iteritems())
+# Outcomes of a try job.
+_SUCCEEDED, _FAILED, _OTHER_OUTCOME = range(3)
+
+
+def _bincount(x, length, weights=None):
+  """Like numpy.bincount(x, weights, minlength=length), but also for an empty
+  x, which NumPy < 1.8 rejects."""
+  if not x.size:
+    return numpy.zeros(length, dtype=numpy.int64 if weights is None else float)
+  return numpy.bincount(x, weights=weights, minlength=length)
+
+
+def aggregate_try_job_results(try_job_results_by_patch):
+  """Computes the flakiness of each builder from the try job results of each
+  patch.
+
+  A failure of a builder is a flake if the builder also succeeded on the same
+  patch. The results are flattened into numpy arrays, and counted per
+  (builder, patch) and per builder with bincount, rather than with nested
+  dicts per patch.
+
+  Args:
+    try_job_results_by_patch: An iterable of lists of try job results
+      (from Rietveld's try_job_results API), one list per patch.
+
+  Returns:
+    ``{(master, builder): {'total': ..., 'flakes': ..., <category>: ...,
+    'uncategorized_flakes': [result, ...]}}``, where the categories are
+    TRY_JOB_CATEGORIES, counted among the flakes only.
+  """
+  builder_index = collections.OrderedDict()
+  results = []
+  builders, patches, outcomes, categories = [], [], [], []
+  for patch, try_job_results in enumerate(try_job_results_by_patch):
+    for result in try_job_results:
+      master_builder = (result['master'], result['builder'])
+      builders.append(
+          builder_index.setdefault(master_builder, len(builder_index)))
+      patches.append(patch)
+      results.append(result)
+      if result['result'] in (SUCCESS, WARNINGS):
+        outcomes.append(_SUCCEEDED)
+      elif result['result'] in (FAILURE, EXCEPTION):
+        outcomes.append(_FAILED)
+      else:
+        outcomes.append(_OTHER_OUTCOME)
+      if result['result'] == EXCEPTION:
+        categories.append(_INFRA_CATEGORY)
+      else:
+        build_properties = json.loads(result.get('build_properties', '{}'))
+        categories.append(_FAILURE_TYPE_CATEGORIES.get(
+            build_properties.get('failure_type'), _OTHER_CATEGORY))
+  if not results:
+    return {}
+
+  num_builders = len(builder_index)
+  builders = numpy.array(builders, dtype=numpy.int64)
+  patches = numpy.array(patches, dtype=numpy.int64)
+  outcomes = numpy.array(outcomes, dtype=numpy.int64)
+  categories = numpy.array(categories, dtype=numpy.int64)
+
+  # Group the results by (builder, patch).
+  num_patches = patches.max() + 1
+  _, groups = numpy.unique(builders * num_patches + patches,
+                           return_inverse=True)
+  num_groups = groups.max() + 1
+  group_builders = numpy.zeros(num_groups, dtype=numpy.int64)
+  group_builders[groups] = builders
+  failed = outcomes == _FAILED
+  successes = _bincount(groups[outcomes == _SUCCEEDED], num_groups)
+  failures = _bincount(groups[failed], num_groups)
+  flaky_groups = (successes > 0) & (failures > 0)
+  flaky = failed & flaky_groups[groups]
+
+  totals = _bincount(builders[outcomes != _OTHER_OUTCOME], num_builders)
+  flakes = _bincount(group_builders, num_builders,
+                     weights=failures * flaky_groups).astype(numpy.int64)
+  # Counts the flakes of each (builder, category) pair as one flat index.
+  # (numpy.add.at would need NumPy 1.8.)
+  num_categories = len(TRY_JOB_CATEGORIES)
+  category_counts = _bincount(
+      builders[flaky] * num_categories + categories[flaky],
+      num_builders * num_categories).reshape((num_builders, num_categories))
+  uncategorized = flaky & (categories == _OTHER_CATEGORY)
+
+  try_job_stats = {}
+  for master_builder, b in builder_index.iteritems():
+    builder_stats = {
+        'total': totals[b].item(),
+        'flakes': flakes[b].item(),
+        'uncategorized_flakes': [],
+    }
+    for c, category in enumerate(TRY_JOB_CATEGORIES):
+      builder_stats[category] = category_counts[b, c].item()
+    try_job_stats[master_builder] = builder_stats
+  for i in numpy.flatnonzero(uncategorized):
+    result = results[i]
+    try_job_stats[(result['master'], result['builder'])][
+        'uncategorized_flakes'].append(result)
+  return try_job_stats
+
+
 def print_flakiness_stats(args, stats):
-  def get_flakiness_stats(issue_patchset):
+  def get_try_job_results(issue_patchset):
     issue, patchset = issue_patchset
     try:
-      try_job_results = fetch_json(
+      return fetch_json(
           'https://codereview.chromium.org/api/%d/%d/try_job_results' % (
               issue, patchset))
     except simplejson.JSONDecodeError as e:
       # This can happen e.g. for private issues where we can't fetch the JSON
       # without authentication.
       logging.warn('%r (issue:%d, patchset:%d)', e, issue, patchset)
-      return {}
-
-    result_counts = {}
-    uncategorized_flakes = collections.defaultdict(list)
-    for result in try_job_results:
-      master, builder = result['master'], result['builder']
-      build_properties = json.loads(result.get('build_properties', '{}'))
-      result_counts.setdefault((master, builder), {
-        'successes': 0,
-        'failures': 0,
-        'infra_failures': 0,
-        'compile_failures': 0,
-        'test_failures': 0,
-        'invalid_results_failures': 0,
-        'patch_failures': 0,
-        'other_failures': 0,
-      })
-      if result['result'] in (SUCCESS, WARNINGS):
-        result_counts[(master, builder)]['successes'] += 1
-      elif result['result'] in (FAILURE, EXCEPTION):
-        result_counts[(master, builder)]['failures'] += 1
-        if result['result'] == EXCEPTION:
-          result_counts[(master, builder)]['infra_failures'] += 1
-        elif build_properties.get('failure_type') == 'COMPILE_FAILURE':
-          result_counts[(master, builder)]['compile_failures'] += 1
-        elif build_properties.get('failure_type') == 'TEST_FAILURE':
-          result_counts[(master, builder)]['test_failures'] += 1
-        elif build_properties.get('failure_type') == 'INVALID_TEST_RESULTS':
-          result_counts[(master, builder)]['invalid_results_failures'] += 1
-        elif build_properties.get('failure_type') == 'PATCH_FAILURE':
-          result_counts[(master, builder)]['patch_failures'] += 1
-        else:
-          result_counts[(master, builder)]['other_failures'] += 1
-          uncategorized_flakes[(master, builder)].append(result)
-
-    try_job_stats = {}
-    for master, builder in result_counts.iterkeys():
-      total = (result_counts[(master, builder)]['successes'] +
-               result_counts[(master, builder)]['failures'])
-
-      flakes = 0
-      if result_counts[(master, builder)]['successes'] > 0:
-        flakes = result_counts[(master, builder)]['failures']
-
-      try_job_stats[(master, builder)] = {
-        'total': total,
-        'flakes': flakes,
-        'infra_failures': result_counts[(master, builder)][
-            'infra_failures'] if flakes else 0,
-        'compile_failures': result_counts[(master, builder)][
-            'compile_failures'] if flakes else 0,
-        'test_failures': result_counts[(master, builder)][
-            'test_failures'] if flakes else 0,
-        'invalid_results_failures': result_counts[(master, builder)][
-            'invalid_results_failures'] if flakes else 0,
-        'patch_failures': result_counts[(master, builder)][
-            'patch_failures'] if flakes else 0,
-        'other_failures': result_counts[(master, builder)][
-            'other_failures'] if flakes else 0,
-        'uncategorized_flakes': uncategorized_flakes.get(
-            (master, builder), []) if flakes else [],
-      }
-
-    return try_job_stats
+      return []
 
   if args.seq or not args.thread_pool:
-    iterable = map(get_flakiness_stats, stats['patch_stats'].keys())
+    iterable = map(get_try_job_results, stats['patch_stats'].keys())
   else:
     pool = ThreadPool(min(args.thread_pool, len(stats['patch_stats'].keys())))
     iterable = pool.imap_unordered(
-        get_flakiness_stats, stats['patch_stats'].keys())
+        get_try_job_results, stats['patch_stats'].keys())
 
-  try_job_stats = {}
-  for result in iterable:
-    for master, builder in result.iterkeys():
-      keys = (
-        'total',
-        'flakes',
-        'infra_failures',
-        'compile_failures',
-        'test_failures',
-        'invalid_results_failures',
-        'patch_failures',
-        'other_failures'
-      )
-      init_dict = {key: 0 for key in keys}
-      init_dict['uncategorized_flakes'] = []
-      try_job_stats.setdefault((master, builder), init_dict)
-      for key in keys:
-        try_job_stats[(master, builder)][key] += result[(master, builder)][key]
-
-      try_job_stats[(master, builder)]['uncategorized_flakes'].extend(
-          result[(master, builder)]['uncategorized_flakes'])
+  try_job_stats = aggregate_try_job_results(iterable)
 
   output()
   output('Top flaky builders (which fail and succeed in the same patch):')
@@ -1226,9 +1499,11 @@ def acquire_stats(args, add_tree_stats=True):
   return stats
 
 def main():
+  global result_cache  # pylint: disable=global-statement
   args = parse_args()
   logger = logging.getLogger()
   infra_libs.logs.process_argparse_options(args, logger)
+  result_cache = ResultCache(args.cache_dir, resume=args.resume)
   stats = acquire_stats(args)
   print_stats(args, stats)
 
@@ -8,11 +8,12 @@ import copy
 import datetime
 import itertools
 import logging
+import os
+import shutil
 import subprocess
 import tempfile
 import time
 import unittest
-import urllib2
 
 import dateutil
 import mock
@@ -32,28 +33,35 @@ class Args(object):
     self.list_false_rejections = False
     self.list_uncategorized_flakes = False
     self.use_logs = False
+    self.use_message_parsing = False
     self.date = datetime.datetime(2014, 1, 1)
     self.range = 'week'
     self.verbose = 'error'
     self.seq = 'false'
     self.thread_pool = 3
     self.bots = []
+    self.cache_dir = None
+    self.resume = False
     for name, val in kwargs.iteritems():
       self.__dict__[name] = val
 
 
 class ResponseMock(object):
-  """Mock out Response class for urllib2.urlopen()."""
-  def __init__(self, lines):
-    self.lines = lines
+  """Mock out requests.Response for session.get()."""
+  def __init__(self, lines, status_code=200):
+    self.text = '\n'.join(lines)
+    self.status_code = status_code
 
-  def __iter__(self):
-    return self.lines.__iter__()
+  def raise_for_status(self):
+    if self.status_code != 200:
+      raise cq_stats.requests.HTTPError(self.status_code)
 
 
-def urlopen_mock(lines):
-  obj = ResponseMock(lines)
-  def func(_):
+def session_get_mock(lines, status_code=200, urls=None):
+  obj = ResponseMock(lines, status_code)
+  def func(url):
+    if urls is not None:
+      urls.append(url)
     return obj
   return func
 
@@ -130,15 +138,30 @@ class TestCQStats(auto_stub.TestCase):
     self.assertEqual(cq_stats.fetch_json('foo'), {})
 
   def test_fetch_git_page(self):
-    self.mock(urllib2, 'urlopen', urlopen_mock(['{([bad json']))
+    self.mock(cq_stats.session, 'get', session_get_mock(['{([bad json']))
     self.assertEqual({}, cq_stats.fetch_git_page('url'))
-    self.mock(urllib2, 'urlopen', urlopen_mock([
+    self.mock(cq_stats.session, 'get', session_get_mock(['{}'], 500))
+    self.assertEqual({}, cq_stats.fetch_git_page('url'))
+    self.mock(cq_stats.session, 'get', session_get_mock([
         ")]}'", '{"json": 1}',
     ]))
     self.assertEqual({'json': 1}, cq_stats.fetch_git_page('url'))
     self.assertEqual({'json': 1},
                      cq_stats.fetch_git_page('url', cursor='cursor'))
 
+  def test_fetch_git_page_cached(self):
+    self.mock(cq_stats, 'result_cache', self.make_cache())
+    urls = []
+    self.mock(cq_stats.session, 'get', session_get_mock([
+        ")]}'", '{"json": 1}',
+    ], urls=urls))
+    for _ in range(2):
+      self.assertEqual({'json': 1}, cq_stats.fetch_git_page('url'))
+      self.assertEqual({'json': 1},
+                       cq_stats.fetch_git_page('url', cursor='cursor'))
+    # Only pages with a cursor never change.
+    self.assertEqual(len(urls), 3)
+
   def test_fetch_git_logs(self):
     pages = [
         {'log': [
@@ -250,6 +273,84 @@ class TestCQStats(auto_stub.TestCase):
     self.assertEqual(cq_stats.fetch_cq_logs(end_date=end_date),
                      expected_result)
 
+  def make_cache(self, resume=False):
+    path = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, path)
+    return cq_stats.ResultCache(os.path.join(path, 'cache'), resume=resume)
+
+  def test_result_cache(self):
+    cache = self.make_cache()
+    self.assertTrue(cache.enabled)
+    self.assertIsNone(cache.get(['key', 1]))
+    cache.set(['key', 1], {'value': [1, 2]})
+    cache.set(['key', 2], 'mutable', immutable=False)
+    self.assertEqual(cache.get(['key', 1]), {'value': [1, 2]})
+    self.assertIsNone(cache.get(['key', 2]))
+
+    resumed = cq_stats.ResultCache(cache.path, resume=True)
+    self.assertEqual(resumed.get(['key', 1]), {'value': [1, 2]})
+    self.assertEqual(resumed.get(['key', 2]), 'mutable')
+
+    with open(cache._filename(['key', 1]), 'w') as f:
+      f.write('{bad json')
+    self.assertIsNone(cache.get(['key', 1]))
+
+  def test_result_cache_disabled(self):
+    cache = cq_stats.ResultCache()
+    self.assertFalse(cache.enabled)
+    cache.set(['key'], 1)
+    self.assertIsNone(cache.get(['key']))
+
+  def test_result_cache_write_error(self):
+    cache = self.make_cache()
+    shutil.rmtree(cache.path)
+    cache.set(['key'], 1)
+    self.assertIsNone(cache.get(['key']))
+
+  def test_day_ranges(self):
+    d = datetime.datetime
+    self.assertEqual(
+        list(cq_stats.day_ranges(d(2014, 10, 15, 12), d(2014, 10, 17, 6))),
+        [(d(2014, 10, 15, 12), d(2014, 10, 16)),
+         (d(2014, 10, 16), d(2014, 10, 17)),
+         (d(2014, 10, 17), d(2014, 10, 17, 6))])
+    self.assertEqual(
+        list(cq_stats.day_ranges(d(2014, 10, 15), d(2014, 10, 16))),
+        [(d(2014, 10, 15), d(2014, 10, 16))])
+    self.assertEqual(
+        list(cq_stats.day_ranges(d(2014, 10, 15), d(2014, 10, 15))), [])
+
+  @mock_datetime_utc(2014, 10, 17, 0, 30, 0)
+  def test_fetch_daily_cq_logs(self):
+    midnight = cq_stats.utc_date_to_timestamp(datetime.datetime(2014, 10, 16))
+    calls = []
+    def mock_fetch_cq_logs(start_date=None, end_date=None, filters=None):
+      calls.append((start_date, end_date))
+      begin = cq_stats.utc_date_to_timestamp(start_date)
+      end = cq_stats.utc_date_to_timestamp(end_date)
+      # Inclusive of the end.
+      return [{'timestamp': end}, {'timestamp': begin}]
+    self.mock(cq_stats, 'fetch_cq_logs', mock_fetch_cq_logs)
+
+    begin_date = datetime.datetime(2014, 10, 15, 12)
+    end_date = datetime.datetime(2014, 10, 17)
+    # Without cache.
+    self.assertEqual(
+        cq_stats.fetch_daily_cq_logs(begin_date, end_date, ['f']),
+        [{'timestamp': midnight + 86400}, {'timestamp': midnight - 43200}])
+    self.assertEqual(calls, [(begin_date, end_date)])
+
+    self.mock(cq_stats, 'result_cache', self.make_cache())
+    expected = [
+        {'timestamp': midnight + 86400}, {'timestamp': midnight},
+        {'timestamp': midnight - 43200}]
+    for _ in range(2):
+      calls[:] = []
+      self.assertEqual(
+          cq_stats.fetch_daily_cq_logs(begin_date, end_date, ['f']), expected)
+    # The last day isn't settled yet.
+    self.assertEqual(calls, [(datetime.datetime(2014, 10, 16), end_date)])
+
   def test_organize_stats(self):
     stats = {'results': [
         {'begin': t,
@@ -314,6 +415,90 @@ class TestCQStats(auto_stub.TestCase):
 
     self.assertEqual(cq_stats.derive_list_stats([])['size'], 1)
 
+  def test_derive_list_stats_array(self):
+    stats = cq_stats.derive_list_stats(cq_stats.numpy.array([3, 1, 2]))
+    self.assertEqual(stats['50'], 2.0)
+    self.assertEqual((stats['min'], stats['max'], stats['size']), (1, 3, 3))
+    self.assertIs(type(stats['min']), int)
+    self.assertEqual(stats['raw'], [3, 1, 2])
+    self.assertEqual(
+        cq_stats.derive_list_stats(cq_stats.numpy.array([]))['raw'], [0])
+
+  def test_patch_stats_table(self):
+    patch_stats = collections.OrderedDict([
+        ((1, 1), {'attempts': 2, 'committed': 1, 'rejections': 1,
+                  'patchset-duration': 1.5, 'failed-jobs-details': {},
+                  'failed-jobs': 1, 'manual-cancel': None}),
+        ((2, 1), {'attempts': 1, 'committed': 0, 'rejections': 2,
+                  'failed-jobs-details': {'a': 1}, 'failed-jobs': 0}),
+        ((3, 1), {'attempts': 1, 'committed': 0, 'rejections': 1,
+                  'failed-jobs-details': {}, 'custom': 4}),
+    ])
+    table = cq_stats.PatchStatsTable(patch_stats)
+    self.assertEqual(len(table), 3)
+    self.assertEqual(table.column('attempts').tolist(), [2, 1, 1])
+    self.assertEqual(table.column('manual-cancel').tolist(), [0, 0, 0])
+    self.assertEqual(table.column('patchset-duration').tolist(),
+                     [1.5, 0.0, 0.0])
+    self.assertEqual(table.column('custom').tolist(), [0, 0, 4])
+    self.assertEqual(table.select(~table.committed()), [(2, 1), (3, 1)])
+    # Ties keep the order of the rows.
+    self.assertEqual(table.by_count('rejections'), [(2, 1), (1, 1), (3, 1)])
+
+    self.assertEqual(
+        cq_stats.stats_by_count(patch_stats, 'rejections',
+                                ['failed-jobs', 'manual-cancel'], table),
+        [{'count': 2, 'patch_id': (2, 1), 'failed-jobs-details': {'a': 1},
+          'failed-jobs': 0},
+         {'count': 1, 'patch_id': (1, 1), 'failed-jobs-details': {},
+          'failed-jobs': 1, 'manual-cancel': 0},
+         {'count': 1, 'patch_id': (3, 1), 'failed-jobs-details': {}}])
+    self.assertEqual(
+        cq_stats.stats_by_count(patch_stats, 'custom', ['attempts']),
+        [{'count': 4, 'patch_id': (3, 1), 'failed-jobs-details': {},
+          'attempts': 1}])
+
+  def test_patch_stats_table_empty(self):
+    table = cq_stats.PatchStatsTable({})
+    self.assertEqual(table.column('attempts').tolist(), [])
+    self.assertEqual(cq_stats.stats_by_count({}, 'rejections', ['attempts']),
+                     [])
+
+  def test_aggregate_try_job_results(self):
+    self.assertEqual(cq_stats.aggregate_try_job_results([]), {})
+    flaky = {'master': 'm', 'builder': 'a', 'result': cq_stats.FAILURE,
+             'url': 'flaky'}
+    stats = cq_stats.aggregate_try_job_results([
+        [{'master': 'm', 'builder': 'a', 'result': cq_stats.SUCCESS}, flaky],
+        [{'master': 'm', 'builder': 'a', 'result': cq_stats.FAILURE},
+         {'master': 'm', 'builder': 'b', 'result': cq_stats.EXCEPTION},
+         {'master': 'm', 'builder': 'b', 'result': cq_stats.WARNINGS}],
+        [],
+    ])
+    self.assertEqual(stats[('m', 'a')]['total'], 3)
+    self.assertEqual(stats[('m', 'a')]['flakes'], 1)
+    self.assertEqual(stats[('m', 'a')]['other_failures'], 1)
+    self.assertEqual(stats[('m', 'a')]['uncategorized_flakes'], [flaky])
+    self.assertEqual(stats[('m', 'b')]['total'], 2)
+    self.assertEqual(stats[('m', 'b')]['flakes'], 1)
+    self.assertEqual(stats[('m', 'b')]['infra_failures'], 1)
+    self.assertEqual(stats[('m', 'b')]['other_failures'], 0)
+
+  def test_aggregate_try_job_results_no_flakes(self):
+    stats = cq_stats.aggregate_try_job_results([
+        [{'master': 'm', 'builder': 'a', 'result': cq_stats.SUCCESS}],
+        [{'master': 'm', 'builder': 'a', 'result': cq_stats.FAILURE}],
+        [{'master': 'm', 'builder': 'b', 'result': cq_stats.SKIPPED}],
+    ])
+    self.assertEqual(stats[('m', 'a')]['total'], 2)
+    self.assertEqual(stats[('m', 'a')]['flakes'], 0)
+    self.assertEqual(stats[('m', 'a')]['uncategorized_flakes'], [])
+    self.assertEqual(stats[('m', 'b')]['total'], 0)
+    self.assertEqual(stats[('m', 'b')]['flakes'], 0)
+    for category in cq_stats.TRY_JOB_CATEGORIES:
+      self.assertEqual(stats[('m', 'a')][category], 0)
+      self.assertEqual(stats[('m', 'b')][category], 0)
+
   def get_mock_derive_patch_stats(self, supported=True):
     def mock_derive_patch_stats(_args, _begin_date, _end_date, patch_id):
       # The original function expects patch_id to be a 2-tuple.
@@ -364,6 +549,31 @@ class TestCQStats(auto_stub.TestCase):
     self.assertEqual(dict, type(cq_stats.derive_stats(
         Args(seq=True), datetime.datetime(2014, 10, 15))))
 
+  def test_derive_stats_cached(self):
+    # Unused args: pylint: disable=W0613
+    def mock_fetch_cq_logs(start_date=None, end_date=None, filters=None):
+      return [
+          {'fields': {'issue': 12345, 'patchset': 1},
+           'timestamp': 1413331200 + 3600,
+          },
+      ]
+    calls = []
+    mock_derive_patch_stats = self.get_mock_derive_patch_stats()
+    def counting_derive_patch_stats(*args):
+      calls.append(args[-1])
+      return mock_derive_patch_stats(*args)
+    self.mock(cq_stats, 'fetch_cq_logs', mock_fetch_cq_logs)
+    self.mock(cq_stats, 'derive_patch_stats', counting_derive_patch_stats)
+    self.mock(cq_stats, 'result_cache', self.make_cache())
+
+    first = cq_stats.derive_stats(
+        Args(seq=True, range='day'), datetime.datetime(2014, 10, 15))
+    second = cq_stats.derive_stats(
+        Args(seq=True, range='day'), datetime.datetime(2014, 10, 15))
+    self.assertEqual(calls, [(12345, 1)])
+    self.assertEqual(first['patch_stats'].keys(), [(12345, 1)])
+    self.assertEqual(first['patch_stats'], second['patch_stats'])
+
   def test_stats_by_count_entry(self):
     common = {'failed-jobs-details': 'jobs', 'reason1': 2, 'reason2': 3}
     patch_stats = {'some-count': 5}
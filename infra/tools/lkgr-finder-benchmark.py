@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Measures how long lkgr_finder takes to find an LKGR candidate (and compute
+the status page matrix) for a synthetic build history.
+
+Revisions are git hashes, keyed by a GitWrapper whose commit positions are
+all already known, as they are once its position index is up to date.
+
+Example:
+  ./infra/tools/lkgr-finder-benchmark.py --builders 30 --revisions 5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+from infra.services.lkgr_finder import lkgr_lib
+from infra.services.lkgr_finder import status_generator
+
+
+def load_options():
+  parser = argparse.ArgumentParser(description=sys.modules['__main__'].__doc__)
+  parser.add_argument('--builders', type=int, default=30,
+                      help='Number of builders.')
+  parser.add_argument('--revisions', type=int, default=5000,
+                      help='Number of revisions.')
+  parser.add_argument('--revisions-per-build', type=int, default=3,
+                      help='Average number of revisions per build.')
+  parser.add_argument('--failure-rate', type=float, default=0.05,
+                      help='Fraction of failed builds.')
+  parser.add_argument('--repeat', type=int, default=5,
+                      help='Number of measurements; the best one is shown.')
+  parser.add_argument('--seed', type=int, default=0)
+  return parser.parse_args()
+
+
+def fake_repo(revisions):
+  # Skip __init__, which would clone a checkout.
+  repo = lkgr_lib.GitWrapper.__new__(lkgr_lib.GitWrapper)
+  repo._position_cache = dict(  # pylint: disable=protected-access
+      (r, (i, 'refs/heads/master')) for i, r in enumerate(revisions))
+  return repo
+
+
+def fake_build_history(options, revisions):
+  statuses = (lkgr_lib.STATUS.SUCCESS, lkgr_lib.STATUS.FAILURE)
+  weights = (1 - options.failure_rate, options.failure_rate)
+  build_history = {}
+  for b in xrange(options.builders):
+    builds = []
+    i = random.randrange(options.revisions_per_build)
+    while i < len(revisions):
+      status = statuses[random.random() < weights[1]]
+      builds.append((revisions[i], status, len(builds)))
+      i += random.randint(1, 2 * options.revisions_per_build - 1)
+    master = build_history.setdefault('master%d' % (b % 3), {})
+    master['builder%d' % b] = builds
+  return build_history
+
+
+def measure(fn, repeat):
+  best = None
+  for _ in xrange(repeat):
+    start = time.time()
+    result = fn()
+    elapsed = time.time() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best, result
+
+
+def main():
+  options = load_options()
+  random.seed(options.seed)
+  revisions = ['%040x' % random.getrandbits(160)
+               for _ in xrange(options.revisions)]
+  repo = fake_repo(revisions)
+  build_history = fake_build_history(options, revisions)
+  num_builds = sum(len(builds) for master in build_history.itervalues()
+                   for builds in master.itervalues())
+  print '%d builders, %d revisions, %d builds' % (
+      options.builders, options.revisions, num_builds)
+
+  elapsed, (lkgr_index, _) = measure(
+      lambda: lkgr_lib.ComputeStatusMatrix(
+          build_history, revisions, repo.keyfunc), options.repeat)
+  print '%-24s %8.3fs (lkgr at revision %s)' % (
+      'ComputeStatusMatrix', elapsed, lkgr_index)
+
+  elapsed, _ = measure(
+      lambda: lkgr_lib.FindLKGRCandidate(
+          build_history, revisions, repo.keyfunc,
+          status_generator.StatusGeneratorStub()), options.repeat)
+  print '%-24s %8.3fs' % ('FindLKGRCandidate', elapsed)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Measures how much CPU sysmon spends collecting the system metrics of one
+cycle on this machine, through psutil (system_metrics) and by reading /proc
+(proc_metrics.ProcCollector).
+
+Only works on Linux. Each collector is run for the same number of cycles, and
+the CPU time (user and system) of each get_*_info call is reported per cycle.
+
+Example:
+  ./infra/tools/sysmon-benchmark.py --cycles 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+from infra.services.sysmon import proc_metrics
+from infra.services.sysmon import system_metrics
+
+GETTERS = ('get_uptime', 'get_cpu_info', 'get_disk_info', 'get_mem_info',
+           'get_net_info', 'get_proc_info')
+
+
+def load_options():
+  parser = argparse.ArgumentParser(description=sys.modules['__main__'].__doc__)
+  parser.add_argument('--cycles', type=int, default=1000,
+                      help='Number of collection cycles per collector.')
+  return parser.parse_args()
+
+
+def measure(label, collector, cycles):
+  """Returns the CPU time (in seconds) per cycle of each getter.
+
+  A getter which fails is reported as None.
+  """
+  results = {}
+  for name in GETTERS:
+    getter = getattr(collector, name)
+    # Process CPU time, with a better resolution than os.times() on Linux.
+    start = time.clock()
+    try:
+      for _ in xrange(cycles):
+        getter()
+    except Exception as e:  # pylint: disable=broad-except
+      print '%s %s failed: %s' % (label, name, e)
+      results[name] = None
+      continue
+    results[name] = (time.clock() - start) / cycles
+  return results
+
+
+def format_ms(seconds):
+  return '%10s' % ('failed' if seconds is None else '%.3fms' % (seconds * 1000))
+
+
+def main():
+  options = load_options()
+
+  psutil_results = measure('psutil', system_metrics, options.cycles)
+  collector = proc_metrics.ProcCollector()
+  try:
+    proc_results = measure('proc', collector, options.cycles)
+  finally:
+    collector.close()
+
+  print '%-16s %10s %10s' % ('per cycle', 'psutil', 'proc')
+  for name in GETTERS:
+    print '%-16s %s %s' % (
+        name, format_ms(psutil_results[name]), format_ms(proc_results[name]))
+  totals = [None if None in results.values() else sum(results.values())
+            for results in (psutil_results, proc_results)]
+  print '%-16s %s %s' % ('total', format_ms(totals[0]), format_ms(totals[1]))
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Measures ts_mon CounterMetric.increment() throughput against the number of
+threads incrementing concurrently.
+
+Example:
+  ./infra/tools/ts-mon-increment-benchmark.py --threads 1 2 4 8 --cells 1 100
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+from infra_libs import ts_mon  # pylint: disable=wrong-import-position
+
+
+def load_options():
+  parser = argparse.ArgumentParser(description=sys.modules['__main__'].__doc__)
+  parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8],
+                      help='Thread counts to measure.')
+  parser.add_argument('--cells', type=int, nargs='+', default=[1, 100],
+                      help='Numbers of distinct field values incremented by '
+                           'each thread (1 means every thread hammers the '
+                           'same cell).')
+  parser.add_argument('--increments', type=int, default=100000,
+                      help='Total number of increments per measurement.')
+  return parser.parse_args()
+
+
+def measure(counter, num_threads, num_cells, increments):
+  per_thread = increments // num_threads
+  fields = [{'cell': i} for i in xrange(num_cells)]
+
+  def worker():
+    for i in xrange(per_thread):
+      counter.increment(fields[i % num_cells])
+
+  threads = [threading.Thread(target=worker) for _ in xrange(num_threads)]
+  start = time.time()
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  elapsed = time.time() - start
+
+  assert sum(counter.get(f) or 0 for f in fields) == per_thread * num_threads
+  return per_thread * num_threads / elapsed
+
+
+def main():
+  options = load_options()
+  counter = ts_mon.CounterMetric('benchmark/increments')
+
+  print '%8s %8s %16s' % ('threads', 'cells', 'increments/sec')
+  for num_cells in options.cells:
+    for num_threads in options.threads:
+      ts_mon.reset_for_unittest()
+      rate = measure(counter, num_threads, num_cells, options.increments)
+      print '%8d %8d %16.0f' % (num_threads, num_cells, rate)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -13,6 +13,13 @@ Example::
   from infra_libs import instrumented_requests
   r = instrumented_requests.get('myapi', 'https://example.com/api')
 
+Pass a requests.Session as the 'session' argument to send the request with
+it, and reuse its keep-alive connections::
+
+  session = requests.Session()
+  r = instrumented_requests.get('myapi', 'https://example.com/api',
+                                session=session)
+
 Alternatively you can add the hook manually::
 
   import requests
@@ -68,13 +75,14 @@ def _update_status(name, status):
 
 
 def _wrap(method, name, url, *args, **kwargs):
+  session = kwargs.pop('session', None) or requests
   hooks = {'response': instrumentation_hook(name)}
   if 'hooks' in kwargs:
     hooks.update(kwargs['hooks'])
   kwargs['hooks'] = hooks
 
   try:
-    return getattr(requests, method)(url, *args, **kwargs)
+    return getattr(session, method)(url, *args, **kwargs)
   except requests.exceptions.ReadTimeout:
     _update_status(name, http_metrics.STATUS_TIMEOUT)
     raise
@@ -110,6 +110,18 @@ class InstrumentedRequestsTest(unittest.TestCase):
     self.assertTrue(hasattr(f.call_args[1]['hooks']['response'], '__call__'))
     self.assertEquals(42, f.call_args[1]['hooks']['foo']())
 
+  def test_wrap_with_session(self):
+    session = mock.create_autospec(requests.Session, spec_set=True)
+    with mock.patch('requests.get') as module_get:
+      instrumented_requests._wrap('get', 'foo', 'http://example.com',
+                                  session=session)
+
+    self.assertFalse(module_get.called)
+    self.assertTrue(session.get.called)
+    self.assertEquals(('http://example.com',), session.get.call_args[0])
+    self.assertNotIn('session', session.get.call_args[1])
+    self.assertIn('response', session.get.call_args[1]['hooks'])
+
   def test_wrap_times_out(self):
     with self.assertRaises(requests.exceptions.ReadTimeout):
       self._setup_wrap(side_effect=requests.exceptions.ReadTimeout)
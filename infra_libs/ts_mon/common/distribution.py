@@ -3,7 +3,16 @@
 # found in the LICENSE file.
 
 import bisect
-import collections
+
+try:
+  import numpy
+except ImportError:  # pragma: no cover
+  numpy = None
+
+
+# Distribution.add_many only uses NumPy for batches of at least this many
+# values, below which converting to and from arrays costs more than it saves.
+NUMPY_MIN_BATCH_SIZE = 16
 
 
 class Bucketer(object):
@@ -40,6 +49,7 @@ class Bucketer(object):
     self.overflow_bucket = self.total_buckets - 1
 
     self._lower_bounds = list(self._generate_lower_bounds())
+    self._lower_bounds_array = None  # Created by bucket_counts_for_values.
 
   def _generate_lower_bounds(self):
     yield float('-Inf')
@@ -62,6 +72,24 @@ class Bucketer(object):
     # bisect.bisect_left is wrong because the buckets are of [lower, upper) form
     return bisect.bisect(self._lower_bounds, value) - 1
 
+  def bucket_counts_for_values(self, values):
+    """Returns a list of the number of ``values`` which belong to each bucket.
+
+    Uses NumPy (if available) to bucket large batches of values.
+    """
+    if numpy is not None and len(values) >= NUMPY_MIN_BATCH_SIZE:
+      if self._lower_bounds_array is None:
+        self._lower_bounds_array = numpy.array(self._lower_bounds, dtype=float)
+      indices = numpy.searchsorted(
+          self._lower_bounds_array, numpy.asarray(values, dtype=float),
+          side='right') - 1
+      return numpy.bincount(indices, minlength=self.total_buckets).tolist()
+
+    counts = [0] * self.total_buckets
+    for value in values:
+      counts[self.bucket_for_value(value)] += 1
+    return counts
+
   def bucket_boundaries(self, bucket):
     """Returns a tuple that is the [lower, upper) bounds of this bucket.
 
@@ -109,16 +137,30 @@ def GeometricBucketer(growth_factor=10**0.2, num_finite_buckets=100):
 class Distribution(object):
   """Holds a histogram distribution.
 
-  Buckets are chosen for values by the provided Bucketer.
+  Buckets are chosen for values by the provided Bucketer. The count for each
+  bucket (including the underflow and overflow buckets) is kept in the
+  fixed-size ``bucket_counts`` list.
   """
 
   def __init__(self, bucketer):
     self.bucketer = bucketer
     self.sum = 0
     self.count = 0
-    self.buckets = collections.defaultdict(int)
+    self.bucket_counts = [0] * bucketer.total_buckets
+
+  @property
+  def buckets(self):
+    """A dict of {bucket index: count} for the non-empty buckets."""
+    return {i: c for i, c in enumerate(self.bucket_counts) if c}
 
   def add(self, value):
-    self.buckets[self.bucketer.bucket_for_value(value)] += 1
+    self.bucket_counts[self.bucketer.bucket_for_value(value)] += 1
     self.sum += value
     self.count += 1
+
+  def add_many(self, values):
+    """Adds every value in the ``values`` sequence."""
+    counts = self.bucketer.bucket_counts_for_values(values)
+    self.bucket_counts = [a + b for a, b in zip(self.bucket_counts, counts)]
+    self.sum += sum(values)
+    self.count += len(values)
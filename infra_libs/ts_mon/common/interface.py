@@ -77,17 +77,31 @@ class State(object):
     self.store = store_ctor(self)
     # Cached time of the last flush. Useful mostly in AppEngine apps.
     self.last_flushed = datetime.datetime.utcfromtimestamp(0)
+    # If set, flush() only sends the metric values which changed since the
+    # previous flush, but resends every value at least this often (in seconds).
+    self.full_resend_interval_secs = None
+    # The store's generation at the previous flush, and the time.time() of the
+    # last flush which sent every value.
+    self.last_flushed_generation = None
+    self.last_full_flush_time = 0
 
   def reset_for_unittest(self):
     self.metrics = {}
     self.last_flushed = datetime.datetime.utcfromtimestamp(0)
+    self.last_flushed_generation = None
+    self.last_full_flush_time = 0
     self.store.reset_for_unittest()
 
 state = State()
 
 
 def flush():
-  """Send all metrics that are registered in the application."""
+  """Send all metrics that are registered in the application.
+
+  If state.full_resend_interval_secs is set, only the metric values which
+  changed since the previous flush are sent, except for a full flush at least
+  once per interval.
+  """
   if not state.global_monitor or not state.target:
     raise errors.MonitoringNoConfiguredMonitorError(None)
 
@@ -95,9 +109,20 @@ def flush():
     logging.debug('ts_mon: sending metrics is disabled.')
     return
 
+  # Read the generation before the values, so that anything modified while
+  # flushing is sent again next time.
+  generation = state.store.generation
+  now = time.time()
+  since = None
+  if (state.full_resend_interval_secs and generation is not None and
+      state.last_flushed_generation is not None and
+      now - state.last_full_flush_time < state.full_resend_interval_secs):
+    since = state.last_flushed_generation
+
   proto = metrics_pb2.MetricsCollection()
 
-  for target, metric, start_time, fields_values in state.store.get_all():
+  for target, metric, start_time, fields_values in state.store.get_all(
+      since=since):
     for fields, value in fields_values.iteritems():
       if len(proto.data) >= METRICS_DATA_LENGTH_LIMIT:
         state.global_monitor.send(proto)
@@ -105,8 +130,12 @@ def flush():
 
       metric.serialize_to(proto, start_time, fields, value, target)
 
-  state.global_monitor.send(proto)
+  if proto.data or since is None:
+    state.global_monitor.send(proto)
   state.last_flushed = datetime.datetime.utcnow()
+  state.last_flushed_generation = generation
+  if since is None:
+    state.last_full_flush_time = now
 
 
 def register(metric):
@@ -135,6 +164,8 @@ def close():
   """Stops any background threads and waits for them to exit."""
   if state.flush_thread is not None:
     state.flush_thread.stop()
+  if state.global_monitor is not None:
+    state.global_monitor.close()
 
 
 def reset_for_unittest(disable=False):
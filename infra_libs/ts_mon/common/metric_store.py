@@ -75,11 +75,26 @@ class MetricStore(object):
     """
     raise NotImplementedError
 
-  def get_all(self):
+  @property
+  def generation(self):
+    """An opaque token which changes every time a metric value is modified, or
+    None if this store doesn't track modifications.
+
+    Pass it back as get_all's ``since`` argument to fetch only the values
+    modified since it was read.
+    """
+    return None
+
+  def get_all(self, since=None):
     """Returns an iterator over all the metrics present in the store.
 
     The iterator yields 4-tuples:
       (target, metric, start_time, field_values)
+
+    Args:
+      since: if given, a previous value of ``generation``. Only the field
+          values modified after it are included. Ignored by stores which don't
+          track modifications.
     """
     raise NotImplementedError
 
@@ -163,13 +178,32 @@ class MetricFieldsValues(object):
   def __init__(self):
     # Map normalized fields to single metric values.
     self._values = {}
+    # Map normalized fields to the (stripe, stripe generation) of their last
+    # modification, or None if it wasn't tracked.
+    self._generations = {}
     self._thread_lock = threading.Lock()
 
   def get_value(self, fields, default=None):
     return self._values.get(fields, default)
 
-  def set_value(self, fields, value):
+  def set_value(self, fields, value, generation=None):
     self._values[fields] = value
+    self._generations[fields] = generation
+
+  def changed_since(self, generation):
+    """Returns a new MetricFieldsValues holding only the values modified after
+    ``generation``, a sequence of stripe generations."""
+    with self._thread_lock:
+      values = copy.copy(self._values)
+      generations = copy.copy(self._generations)
+    ret = MetricFieldsValues()
+    for fields, value_generation in generations.iteritems():
+      if value_generation is not None and fields in values:
+        stripe, stripe_generation = value_generation
+        if stripe_generation > generation[stripe]:
+          ret._values[fields] = values[fields]
+          ret._generations[fields] = value_generation
+    return ret
 
   def iteritems(self):
     # Make a copy of the metric values in case another thread (or this
@@ -189,14 +223,19 @@ class TargetFieldsValues(object):
 
   def get_target_values(self, target_fields):
     key = self._store._normalize_target_fields(target_fields)
-    return self._values[key]
+    values = self._values.get(key)
+    if values is None:
+      # Two threads racing to create the same entry must not both succeed.
+      with self._thread_lock:
+        values = self._values[key]
+    return values
 
   def get_value(self, fields, target_fields, default=None):
     return self.get_target_values(target_fields).get_value(
         fields, default)
 
-  def set_value(self, fields, target_fields, value):
-    self.get_target_values(target_fields).set_value(fields, value)
+  def set_value(self, fields, target_fields, value, generation=None):
+    self.get_target_values(target_fields).set_value(fields, value, generation)
 
   def iter_targets(self):
     # Make a copy of the values in case another thread (or this
@@ -225,29 +264,67 @@ class MetricValues(object):
   def get_value(self, fields, target_fields, default=None):
     return self.values.get_value(fields, target_fields, default)
 
-  def set_value(self, fields, target_fields, value):
-    self.values.set_value(fields, target_fields, value)
+  def set_value(self, fields, target_fields, value, generation=None):
+    self.values.set_value(fields, target_fields, value, generation)
 
 
 class InProcessMetricStore(MetricStore):
-  """A thread-safe metric store that keeps values in memory."""
+  """A thread-safe metric store that keeps values in memory.
+
+  Modifications of a single cell (metric name and fields) are serialized by
+  one of NUM_CELL_LOCKS locks, chosen by hashing the cell, so that threads
+  updating different cells rarely contend with each other.
+
+  Each of these stripes also counts its own modifications, under its lock, so
+  the store's generation is the list of stripe generations.
+  """
+
+  NUM_CELL_LOCKS = 64
 
   def __init__(self, state, time_fn=None):
     super(InProcessMetricStore, self).__init__(state, time_fn=time_fn)
 
     self._values = {}
+    # Guards self._values. Cell values are guarded by self._cell_locks.
     self._thread_lock = threading.Lock()
+    self._cell_locks = [threading.Lock() for _ in xrange(self.NUM_CELL_LOCKS)]
+    # The number of modifications in each stripe, guarded by its cell lock.
+    self._stripe_generations = [0] * self.NUM_CELL_LOCKS
 
-  def _entry(self, name):
-    if name not in self._values:
-      self._reset(name)
+  @property
+  def generation(self):
+    # Hold every stripe's lock, so that every value stamped with one of these
+    # generations is in the store, and later modifications get later ones.
+    for lock in self._cell_locks:
+      lock.acquire()
+    try:
+      return tuple(self._stripe_generations)
+    finally:
+      for lock in self._cell_locks:
+        lock.release()
+
+  def _stripe(self, name, fields):
+    return hash((name, fields)) % self.NUM_CELL_LOCKS
+
+  def _next_generation(self, stripe):
+    """Returns the generation of a modification in ``stripe``, whose lock must
+    be held."""
+    self._stripe_generations[stripe] += 1
+    return stripe, self._stripe_generations[stripe]
 
-    return self._values[name]
+  def _entry(self, name):
+    entry = self._values.get(name)
+    if entry is None:
+      with self._thread_lock:
+        if name not in self._values:
+          self._reset(name)
+        entry = self._values[name]
+    return entry
 
   def get(self, name, fields, target_fields, default=None):
     return self._entry(name).get_value(fields, target_fields, default)
 
-  def get_all(self):
+  def get_all(self, since=None):
     # Make a copy of the metric values in case another thread (or this
     # generator's consumer) modifies them while we're iterating.
     with self._thread_lock:
@@ -258,16 +335,21 @@ class InProcessMetricStore(MetricStore):
         continue
       start_time = metric_values.start_time
       for target, fields_values in metric_values.values.iter_targets():
+        if since is not None:
+          fields_values = fields_values.changed_since(since)
         yield target, self._state.metrics[name], start_time, fields_values
 
   def set(self, name, fields, target_fields, value, enforce_ge=False):
-    with self._thread_lock:
+    entry = self._entry(name)
+    stripe = self._stripe(name, fields)
+    with self._cell_locks[stripe]:
       if enforce_ge:
-        old_value = self._entry(name).get_value(fields, target_fields, 0)
+        old_value = entry.get_value(fields, target_fields, 0)
         if value < old_value:
           raise errors.MonitoringDecreasingValueError(name, old_value, value)
 
-      self._entry(name).set_value(fields, target_fields, value)
+      entry.set_value(fields, target_fields, value,
+                      self._next_generation(stripe))
 
   def incr(self, name, fields, target_fields, delta, modify_fn=None):
     if delta < 0:
@@ -276,9 +358,12 @@ class InProcessMetricStore(MetricStore):
     if modify_fn is None:
       modify_fn = default_modify_fn(name)
 
-    with self._thread_lock:
-      self._entry(name).set_value(fields, target_fields, modify_fn(
-          self.get(name, fields, target_fields, 0), delta))
+    entry = self._entry(name)
+    stripe = self._stripe(name, fields)
+    with self._cell_locks[stripe]:
+      entry.set_value(fields, target_fields, modify_fn(
+          entry.get_value(fields, target_fields, 0), delta),
+          self._next_generation(stripe))
 
   def modify_multi(self, modifications):
     # This is only used by DeferredMetricStore on top of MemcacheMetricStore,
@@ -4,7 +4,6 @@
 
 """Classes representing individual metrics that can be sent."""
 
-import copy
 import operator
 import threading
 import time
@@ -47,6 +46,9 @@ class Metric(object):
   See http://go/inframon-doc for help designing and using your metrics.
   """
 
+  # Maximum number of distinct fields whose normalized tuple is cached.
+  MAX_NORMALIZED_FIELDS_CACHED = 1000
+
   def __init__(self, name, fields=None, description=None):
     """Create an instance of a Metric.
 
@@ -62,6 +64,9 @@ class Metric(object):
     if len(fields) > 7:
       raise errors.MonitoringTooManyFieldsError(self._name, fields)
     self._fields = fields
+    # Maps the items of the fields dicts passed to set() and increment() to
+    # their normalized tuple.
+    self._normalized_fields_cache = {}
     self._normalized_fields = self._normalize_fields(self._fields)
     self._description = description
 
@@ -148,13 +153,30 @@ class Metric(object):
     if fields is None:
       return self._normalized_fields
 
-    all_fields = copy.copy(self._fields)
-    all_fields.update(fields)
+    # This is on the hot path of every set() and increment(), which are mostly
+    # called with the same few fields, so look them up before merging them
+    # with the default fields and sorting them. Field values are hashable
+    # anyway, since the normalized tuple is a dict key in the metric store.
+    key = tuple(fields.iteritems())
+    normalized = self._normalized_fields_cache.get(key)
+    if normalized is not None:
+      return normalized
+
+    # Avoid copying the default fields unless there are some.
+    if self._fields:
+      all_fields = dict(self._fields)
+      all_fields.update(fields)
+    else:
+      all_fields = fields
 
     if len(all_fields) > 7:
       raise errors.MonitoringTooManyFieldsError(self._name, all_fields)
 
-    return tuple(sorted(all_fields.iteritems()))
+    normalized = tuple(sorted(all_fields.iteritems()))
+    # Bounded, in case a field takes unboundedly many values.
+    if len(self._normalized_fields_cache) < self.MAX_NORMALIZED_FIELDS_CACHED:
+      self._normalized_fields_cache[key] = normalized
+    return normalized
 
   def _populate_value(self, metric, value, start_time):
     """Fill in the the data values of a metric protocol buffer.
@@ -368,36 +390,38 @@ class DistributionMetric(Metric):
 
     # Copy the distribution bucket values.  Only include the finite buckets, not
     # the overflow buckets on each end.
-    pb.bucket.extend(self._running_zero_generator(
-        value.buckets.get(i, 0) for i in
-        xrange(1, value.bucketer.total_buckets - 1)))
+    counts = value.bucket_counts
+    pb.bucket.extend(self._compress_zeroes(
+        counts, 1, value.bucketer.total_buckets - 1))
 
     # Add the overflow buckets if present.
-    if value.bucketer.underflow_bucket in value.buckets:
-      pb.underflow = value.buckets[value.bucketer.underflow_bucket]
-    if value.bucketer.overflow_bucket in value.buckets:
-      pb.overflow = value.buckets[value.bucketer.overflow_bucket]
+    if counts[value.bucketer.underflow_bucket]:
+      pb.underflow = counts[value.bucketer.underflow_bucket]
+    if counts[value.bucketer.overflow_bucket]:
+      pb.overflow = counts[value.bucketer.overflow_bucket]
 
     if value.count != 0:
       pb.mean = float(value.sum) / value.count
 
   @staticmethod
-  def _running_zero_generator(iterable):
-    """Compresses sequences of zeroes in the iterable into negative zero counts.
+  def _compress_zeroes(counts, start, stop):
+    """Returns counts[start:stop] with runs of zeroes compressed into negative
+    zero counts, and trailing zeroes removed.
 
     For example an input of [1, 0, 0, 0, 2] is converted to [1, -3, 2].
     """
-
-    count = 0
-
-    for value in iterable:
-      if value == 0:
-        count += 1
-      else:
-        if count != 0:
-          yield -count
-          count = 0
-        yield value
+    ret = []
+    zeroes = 0
+    for i in xrange(start, stop):
+      count = counts[i]
+      if count == 0:
+        zeroes += 1
+        continue
+      if zeroes:
+        ret.append(-zeroes)
+        zeroes = 0
+      ret.append(count)
+    return ret
 
   def add(self, value, fields=None, target_fields=None):
     def modify_fn(dist, value):
@@ -408,6 +432,22 @@ class DistributionMetric(Metric):
 
     self._incr(fields, target_fields, value, modify_fn=modify_fn)
 
+  def add_many(self, values, fields=None, target_fields=None):
+    """Adds every value in the ``values`` sequence in a single update.
+
+    This is much cheaper than calling add() for each value.
+    """
+    if len(values) == 0:
+      return
+
+    def modify_fn(dist, _count):
+      if dist == 0:
+        dist = distribution.Distribution(self.bucketer)
+      dist.add_many(values)
+      return dist
+
+    self._incr(fields, target_fields, len(values), modify_fn=modify_fn)
+
   def set(self, value, fields=None, target_fields=None):
     """Replaces the distribution with the given fields with another one.
 
@@ -6,9 +6,11 @@
 
 
 import base64
+import collections
 import json
 import logging
 import socket
+import threading
 import traceback
 
 from googleapiclient import discovery
@@ -20,6 +22,7 @@ import httplib2
 
 from infra_libs import httplib2_utils
 from infra_libs.ts_mon.common import http_metrics
+from infra_libs.ts_mon.common import metrics
 from infra_libs.ts_mon.protos import metrics_pb2
 
 
@@ -29,6 +32,14 @@ APPENGINE_CREDENTIALS = ':appengine'
 GCE_CREDENTIALS = ':gce'
 
 
+send_queue_depth = metrics.GaugeMetric('ts_mon/send_queue/depth',
+    description='Number of metric batches waiting to be sent by the '
+                'background sender.')
+send_queue_dropped = metrics.CounterMetric('ts_mon/send_queue/dropped',
+    description='Number of metric batches dropped by the background sender, '
+                'by reason (queue_full, send_failed or closed).')
+
+
 class Monitor(object):
   """Abstract base class encapsulating the ability to collect and send metrics.
 
@@ -59,6 +70,21 @@ class Monitor(object):
   def send(self, metric_pb):
     raise NotImplementedError()
 
+  def send_many(self, metric_pbs):
+    """Sends several MetricsCollections.
+
+    Monitors which can send more than one collection per request override this.
+
+    Returns:
+      True if the metrics were sent, False if they should be retried.
+    """
+    for metric_pb in metric_pbs:
+      self.send(metric_pb)
+    return True
+
+  def close(self):
+    """Stops any background work, sending any metrics still pending."""
+
 
 class PubSubMonitor(Monitor):
   """Class which publishes metrics to a Cloud Pub/Sub topic."""
@@ -146,13 +172,27 @@ class PubSubMonitor(Monitor):
     Args:
       metric_pb (MetricsData or MetricsCollection): the metric protobuf to send
     """
+    self.send_many([metric_pb])
+
+  def send_many(self, metric_pbs):
+    """Send several metric protos to the monitoring api in a single request,
+    one Pub/Sub message per proto.
+
+    Args:
+      metric_pbs (list): MetricsData or MetricsCollection protobufs to send.
+
+    Returns:
+      True if the request succeeded, False otherwise.
+    """
     if not self._check_initialize():
-      return
-    proto = self._wrap_proto(metric_pb)
-    logging.debug('ts_mon: sending %d metrics to PubSub', len(proto.data))
+      return False
+    protos = [self._wrap_proto(pb) for pb in metric_pbs]
+    logging.debug('ts_mon: sending %d metrics to PubSub in %d messages',
+                  sum(len(proto.data) for proto in protos), len(protos))
     body = {
         'messages': [
-          {'data': base64.b64encode(proto.SerializeToString())},
+          {'data': base64.b64encode(proto.SerializeToString())}
+          for proto in protos
         ],
     }
     # Occasionally, client fails to receive a proper internal JSON
@@ -169,6 +209,8 @@ class PubSubMonitor(Monitor):
       # Log a warning, not error, to avoid false alarms in AppEngine apps.
       logging.warning('PubSubMonitor.send failed:\n%s',
                       traceback.format_exc())
+      return False
+    return True
 
 
 class DebugMonitor(Monitor):
@@ -191,3 +233,116 @@ class NullMonitor(Monitor):
   """Class that doesn't send metrics anywhere."""
   def send(self, metric_pb):
     pass
+
+
+class AsyncMonitor(Monitor):
+  """Wraps another Monitor and sends metrics to it from a background thread.
+
+  send() copies the metrics into a bounded queue and returns immediately, so
+  flush() no longer blocks on the network. The background thread sends up to
+  ``batches_per_request`` queued collections per request (via the wrapped
+  monitor's send_many), retrying failed requests with exponential backoff.
+
+  If the queue is full, the oldest collection is dropped: newer values of
+  cumulative metrics supersede older ones. Queue depth and dropped collections
+  are reported by the 'ts_mon/send_queue/depth' and 'ts_mon/send_queue/dropped'
+  metrics.
+  """
+
+  def __init__(self, monitor, max_queue_size=100, batches_per_request=10,
+               max_attempts=5, initial_backoff_secs=1.0, max_backoff_secs=60.0):
+    """
+    Args:
+      monitor (Monitor): the monitor which actually sends the metrics.
+      max_queue_size (int): maximum number of MetricsCollections to hold.
+      batches_per_request (int): maximum number of MetricsCollections to send
+          in each request.
+      max_attempts (int): number of times to try sending each request before
+          dropping it.
+      initial_backoff_secs (float): delay before the first retry. Doubles on
+          each subsequent retry.
+      max_backoff_secs (float): maximum delay between retries.
+    """
+    assert max_queue_size > 0
+    assert batches_per_request > 0
+    assert max_attempts > 0
+    self._monitor = monitor
+    self._max_queue_size = max_queue_size
+    self._batches_per_request = batches_per_request
+    self._max_attempts = max_attempts
+    self._initial_backoff_secs = initial_backoff_secs
+    self._max_backoff_secs = max_backoff_secs
+
+    self._queue = collections.deque()
+    self._cond = threading.Condition()
+    self._stop_event = threading.Event()
+
+    self._thread = threading.Thread(target=self._run, name='ts_mon_sender')
+    self._thread.daemon = True
+    self._thread.start()
+
+  def send(self, metric_pb):
+    """Queues a copy of ``metric_pb`` to be sent by the background thread.
+
+    Args:
+      metric_pb (MetricsData or MetricsCollection): the metric protobuf to send
+    """
+    proto = metrics_pb2.MetricsCollection()
+    proto.CopyFrom(self._wrap_proto(metric_pb))
+    with self._cond:
+      if self._stop_event.is_set():
+        logging.warning('ts_mon: metrics sent after the monitor was closed')
+        send_queue_dropped.increment({'reason': 'closed'})
+        return
+      if len(self._queue) >= self._max_queue_size:
+        self._queue.popleft()
+        send_queue_dropped.increment({'reason': 'queue_full'})
+      self._queue.append(proto)
+      send_queue_depth.set(len(self._queue))
+      self._cond.notify()
+
+  def close(self):
+    """Sends everything still queued (without retries) and stops the thread."""
+    with self._cond:
+      self._stop_event.set()
+      self._cond.notify()
+    self._thread.join()
+    self._monitor.close()
+
+  def _take(self):
+    """Blocks until there's something to send, and returns it.
+
+    Returns an empty list once the monitor is closed and the queue is empty.
+    """
+    with self._cond:
+      while not self._queue and not self._stop_event.is_set():
+        self._cond.wait()
+      batch = []
+      while self._queue and len(batch) < self._batches_per_request:
+        batch.append(self._queue.popleft())
+      send_queue_depth.set(len(self._queue))
+      return batch
+
+  def _send_with_retries(self, batch):
+    delay = self._initial_backoff_secs
+    for attempt in xrange(1, self._max_attempts + 1):
+      try:
+        if self._monitor.send_many(batch):
+          return
+      except Exception:
+        logging.exception('ts_mon: sending metrics failed')
+      if attempt == self._max_attempts or self._stop_event.is_set():
+        break
+      logging.warning('ts_mon: retrying metrics send in %.1f seconds', delay)
+      self._stop_event.wait(delay)
+      delay = min(delay * 2, self._max_backoff_secs)
+    logging.error('ts_mon: dropping %d metric batches after %d attempts',
+                  len(batch), attempt)
+    send_queue_dropped.increment_by(len(batch), {'reason': 'send_failed'})
+
+  def _run(self):
+    while True:
+      batch = self._take()
+      if not batch:
+        return
+      self._send_with_retries(batch)
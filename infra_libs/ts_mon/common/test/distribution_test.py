@@ -4,6 +4,8 @@
 
 import unittest
 
+import mock
+
 from infra_libs.ts_mon.common import distribution
 
 
@@ -162,3 +164,29 @@ class DistributionTest(unittest.TestCase):
     self.assertEqual(1000100, d.sum)
     self.assertEqual(2, d.count)
     self.assertEqual({11: 2}, d.buckets)
+
+  def test_add_many(self):
+    values = [-5, 0, 1, 9.5, 10, 55, 99, 1000] * 3
+    for num_finite_buckets in (0, 10):
+      bucketer = distribution.FixedWidthBucketer(
+          width=10, num_finite_buckets=num_finite_buckets)
+      expected = distribution.Distribution(bucketer)
+      for value in values:
+        expected.add(value)
+
+      with mock.patch('infra_libs.ts_mon.common.distribution.numpy', None):
+        d = distribution.Distribution(bucketer)
+        d.add_many(values)
+      self.assertEqual(expected.buckets, d.buckets)
+      self.assertEqual(expected.sum, d.sum)
+      self.assertEqual(expected.count, d.count)
+
+      d = distribution.Distribution(bucketer)
+      d.add(5)
+      d.add_many(values)
+      d.add_many(values[:2])  # Too few values to use NumPy.
+      self.assertEqual(expected.count + 3, d.count)
+      self.assertEqual(expected.sum + 5 - 5, d.sum)
+      self.assertEqual(expected.bucket_counts[0] + 1, d.bucket_counts[0])
+      self.assertEqual(expected.bucket_counts[1] + 2, d.bucket_counts[1])
+
@@ -95,6 +95,39 @@ class GlobalsTest(unittest.TestCase):
     self.assertEqual(1000, data_lengths[0])
     self.assertEqual(1, data_lengths[1])
 
+  @mock.patch('time.time', autospec=True)
+  def test_flush_changed_only(self, fake_time):
+    interface.state.global_monitor = stubs.MockMonitor()
+    interface.state.target = stubs.MockTarget()
+    interface.state.full_resend_interval_secs = 100
+    fake_time.return_value = 1000
+
+    # pylint: disable=unused-argument
+    def serialize_to(pb, start_time, fields, value, target):
+      pb.data.add().name = str(value)
+
+    sent = []
+    def send(proto):
+      sent.append(sorted(d.name for d in proto.data))
+    interface.state.global_monitor.send.side_effect = send
+
+    fake_metric = mock.create_autospec(metrics.Metric, spec_set=True)
+    fake_metric.name = 'fake'
+    fake_metric.serialize_to.side_effect = serialize_to
+    interface.register(fake_metric)
+    interface.state.store.set('fake', ('field', 1), None, 1)
+    interface.state.store.set('fake', ('field', 2), None, 2)
+
+    interface.flush()  # The first flush sends everything.
+    interface.state.store.set('fake', ('field', 2), None, 3)
+    fake_time.return_value = 1050
+    interface.flush()  # Only the changed value.
+    interface.flush()  # Nothing changed, so nothing is sent.
+    fake_time.return_value = 1100
+    interface.flush()  # The full resend interval has passed.
+
+    self.assertEqual([['1', '2'], ['3'], ['1', '3']], sent)
+
   def test_send_modifies_metric_values(self):
     interface.state.global_monitor = stubs.MockMonitor()
     interface.state.target = stubs.MockTarget()
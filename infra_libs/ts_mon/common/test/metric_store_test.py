@@ -4,6 +4,7 @@
 
 import functools
 import operator
+import threading
 import time
 import unittest
 
@@ -37,6 +38,18 @@ class MetricFieldsValuesTest(unittest.TestCase):
     mfv.set_value(fields, 84)
     self.assertEqual([(fields, 84)], list(mfv.iteritems()))
 
+  def test_changed_since(self):
+    mfv = metric_store.MetricFieldsValues()
+    fields1 = (('field', 'value1'),)
+    fields2 = (('field', 'value2'),)
+    fields3 = (('field', 'value3'),)
+    mfv.set_value(fields1, 1, (0, 1))
+    mfv.set_value(fields2, 2, (1, 1))
+    mfv.set_value(fields3, 3)
+    self.assertEqual([(fields2, 2)],
+                     list(mfv.changed_since((1, 0)).iteritems()))
+    self.assertEqual([], list(mfv.changed_since((1, 1)).iteritems()))
+
 
 class MetricStoreTestBase(object):
   """Abstract base class for testing MetricStore implementations.
@@ -168,6 +181,18 @@ class MetricStoreTestBase(object):
     self.store.reset_for_unittest(name='foo')
     self.assertIsNone(self.store.get('foo', (('field', 'value'),), None))
 
+  def test_concurrent_incr(self):
+    fields = (('field', 'value'),)
+    def incr():
+      for _ in xrange(1000):
+        self.store.incr('foo', fields, None, 1)
+    threads = [threading.Thread(target=incr) for _ in xrange(4)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    self.assertEquals(4000, self.store.get('foo', fields, None))
+
   def test_unregister_metric(self):
     fields = (('field', 'value'),)
     self.store.set('foo', fields, None, 42)  # Registered in setUp().
@@ -179,3 +204,46 @@ class MetricStoreTestBase(object):
 
 class InProcessMetricStoreTest(MetricStoreTestBase, unittest.TestCase):
   METRIC_STORE_CLASS = metric_store.InProcessMetricStore
+
+  def test_get_all_since(self):
+    fields1 = (('field', 'value1'),)
+    fields2 = (('field', 'value2'),)
+    self.store.set('foo', fields1, None, 42)
+    self.store.incr('foo', fields2, None, 1)
+    generation = self.store.generation
+
+    all_metrics = list(self.store.get_all(since=generation))
+    self.assertEqual(1, len(all_metrics))
+    self.assertEqual([], list(all_metrics[0][3].iteritems()))
+
+    self.store.incr('foo', fields2, None, 1)
+    self.assertNotEqual(self.store.generation, generation)
+    all_metrics = list(self.store.get_all(since=generation))
+    self.assertEqual([(fields2, 2)], list(all_metrics[0][3].iteritems()))
+
+    all_metrics = list(self.store.get_all())
+    self.assertEqual({fields1: 42, fields2: 2},
+                     dict(all_metrics[0][3].iteritems()))
+
+  def test_concurrent_generations(self):
+    generations = []
+    def incr(i):
+      fields = (('field', i),)
+      for _ in xrange(1000):
+        self.store.incr('foo', fields, None, 1)
+        generations.append(self.store.generation)
+    threads = [threading.Thread(target=incr, args=(i,)) for i in xrange(4)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    # Every modification got its own generation.
+    generation = self.store.generation
+    self.assertEqual(4000, sum(generation))
+    self.assertEqual(generation, max(generations))
+    all_metrics = list(self.store.get_all(since=generation))
+    self.assertEqual([], list(all_metrics[0][3].iteritems()))
+    self.store.incr('foo', (('field', 0),), None, 1)
+    all_metrics = list(self.store.get_all(since=generation))
+    self.assertEqual([((('field', 0),), 1001)],
+                     list(all_metrics[0][3].iteritems()))
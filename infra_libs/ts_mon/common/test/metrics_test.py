@@ -46,6 +46,28 @@ class MetricTest(TestBase):
     self.assertEquals(e.exception.metric, 'test')
     self.assertEquals(len(e.exception.fields), 8)
 
+  def test_normalize_fields_cached(self):
+    m = metrics.Metric('test', fields={'b': 1})
+    normalized = m._normalize_fields({'a': 'x'})
+    self.assertEqual((('a', 'x'), ('b', 1)), normalized)
+    self.assertIs(normalized, m._normalize_fields({'a': 'x'}))
+    self.assertEqual((('a', 'y'), ('b', 1)), m._normalize_fields({'a': 'y'}))
+    self.assertEqual((('b', 2),), m._normalize_fields({'b': 2}))
+
+  def test_normalize_fields_cache_bounded(self):
+    m = metrics.Metric('test')
+    with mock.patch.object(metrics.Metric, 'MAX_NORMALIZED_FIELDS_CACHED', 2):
+      for i in xrange(3):
+        self.assertEqual((('a', i),), m._normalize_fields({'a': i}))
+    self.assertEqual(2, len(m._normalized_fields_cache))
+
+  def test_normalize_too_many_fields(self):
+    m = metrics.Metric('test', fields={'a': 1})
+    fields = {str(i): i for i in xrange(7)}
+    for _ in xrange(2):
+      with self.assertRaises(errors.MonitoringTooManyFieldsError):
+        m._normalize_fields(fields)
+
   def test_serialize(self):
     t = targets.DeviceTarget('reg', 'role', 'net', 'host')
     m = metrics.StringMetric('test')
@@ -318,11 +340,15 @@ class FloatMetricTest(TestBase):
     self.assertFalse(m.is_cumulative())
 
 
-class RunningZeroGeneratorTest(TestBase):
+class CompressZeroesTest(TestBase):
 
   def assertZeroes(self, expected, sequence):
-    self.assertEquals(expected,
-        list(metrics.DistributionMetric._running_zero_generator(sequence)))
+    self.assertEquals(expected, metrics.DistributionMetric._compress_zeroes(
+        sequence, 0, len(sequence)))
+
+  def test_slice(self):
+    self.assertEquals([1, -1, 2], metrics.DistributionMetric._compress_zeroes(
+        [5, 1, 0, 2, 0, 5], 1, 5))
 
   def test_running_zeroes(self):
     self.assertZeroes([1, -1, 1], [1, 0, 1])
@@ -468,6 +494,18 @@ class DistributionMetricTest(TestBase):
     self.assertEquals(111, m.get().sum)
     self.assertEquals(3, m.get().count)
 
+  def test_add_many(self):
+    m = metrics.DistributionMetric('test')
+    m.add_many([])
+    self.assertIsNone(m.get())
+    m.add_many([1, 10])
+    m.add_many([100], {'foo': 'bar'})
+    m.add_many([100])
+    self.assertEquals({2: 1, 6: 1, 11: 1}, m.get().buckets)
+    self.assertEquals(111, m.get().sum)
+    self.assertEquals(3, m.get().count)
+    self.assertEquals(1, m.get({'foo': 'bar'}).count)
+
   def test_add_custom_bucketer(self):
     m = metrics.DistributionMetric('test',
         bucketer=distribution.FixedWidthBucketer(10))
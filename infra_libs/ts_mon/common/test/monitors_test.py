@@ -5,6 +5,7 @@
 import base64
 import os
 import tempfile
+import threading
 import unittest
 
 from googleapiclient import errors
@@ -25,6 +26,15 @@ class MonitorTest(unittest.TestCase):
     with self.assertRaises(NotImplementedError):
       m.send(metric1)
 
+  def test_send_many(self):
+    m = monitors.Monitor()
+    m.send = mock.Mock()
+    metric1 = metrics_pb2.MetricsData(name='m1')
+    metric2 = metrics_pb2.MetricsData(name='m2')
+    self.assertTrue(m.send_many([metric1, metric2]))
+    m.send.assert_has_calls([mock.call(metric1), mock.call(metric2)])
+    m.close()
+
 
 class PubSubMonitorTest(unittest.TestCase):
 
@@ -195,6 +205,164 @@ class PubSubMonitorTest(unittest.TestCase):
         ])
 
 
+  @mock.patch('infra_libs.ts_mon.common.monitors.PubSubMonitor.'
+              '_load_credentials', autospec=True)
+  @mock.patch('googleapiclient.discovery.build', autospec=True)
+  def test_send_many(self, _discovery, _load_creds):
+    mon = monitors.PubSubMonitor('/path/to/creds.p8.json', 'myproject',
+                                 'mytopic')
+    mon._api = mock.MagicMock()
+    topic = 'projects/myproject/topics/mytopic'
+
+    metric1 = metrics_pb2.MetricsData(name='m1')
+    collection = metrics_pb2.MetricsCollection(data=[metric1, metric1])
+    self.assertTrue(mon.send_many([metric1, collection]))
+
+    publish = mon._api.projects.return_value.topics.return_value.publish
+    publish.assert_called_once_with(topic=topic, body={'messages': [
+        {'data': base64.b64encode(
+            monitors.Monitor._wrap_proto(metric1).SerializeToString())},
+        {'data': base64.b64encode(collection.SerializeToString())},
+    ]})
+
+    publish.side_effect = ValueError()
+    self.assertFalse(mon.send_many([metric1]))
+
+  @mock.patch('googleapiclient.discovery.build', autospec=True)
+  def test_send_many_uninitialized(self, discovery):
+    discovery.side_effect = EnvironmentError()
+    mon = monitors.PubSubMonitor('/path/to/creds.p8.json', 'myproject',
+                                 'mytopic', use_instrumented_http=False)
+    self.assertFalse(mon.send_many([metrics_pb2.MetricsData(name='m1')]))
+
+
+class AsyncMonitorTest(unittest.TestCase):
+
+  def setUp(self):
+    super(AsyncMonitorTest, self).setUp()
+    interface.reset_for_unittest()
+    self.sent = []
+    self.sent_cond = threading.Condition()
+    self.results = []
+    self.inner = mock.create_autospec(monitors.Monitor, spec_set=True)
+    def send_many(pbs):
+      with self.sent_cond:
+        self.sent.append([pb.data[0].name for pb in pbs])
+        self.sent_cond.notify()
+      if self.results:
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+          raise result
+        return result
+      return True
+    self.inner.send_many.side_effect = send_many
+
+  def tearDown(self):
+    interface.reset_for_unittest()
+    super(AsyncMonitorTest, self).tearDown()
+
+  def make_monitor(self, **kwargs):
+    kwargs.setdefault('initial_backoff_secs', 0)
+    mon = monitors.AsyncMonitor(self.inner, **kwargs)
+    # Stall the background thread until the test has queued everything.
+    mon._cond.acquire()
+    self.addCleanup(self.close_monitor, mon)
+    return mon
+
+  @staticmethod
+  def close_monitor(mon):
+    """Stops the background thread, even if the test failed while stalling
+    it."""
+    if mon._cond._is_owned():
+      mon._cond.release()
+    mon.close()
+
+  def wait_for_sends(self, count):
+    with self.sent_cond:
+      while len(self.sent) < count:
+        self.sent_cond.wait()
+
+  @staticmethod
+  def metric(name):
+    return metrics_pb2.MetricsData(name=name)
+
+  def test_batches(self):
+    mon = self.make_monitor(batches_per_request=2)
+    for name in ('m1', 'm2', 'm3'):
+      mon.send(self.metric(name))
+    self.assertEqual(3, monitors.send_queue_depth.get())
+    mon._cond.release()
+    mon.close()
+
+    self.assertEqual([['m1', 'm2'], ['m3']], self.sent)
+    self.assertEqual(0, monitors.send_queue_depth.get())
+    self.inner.close.assert_called_once_with()
+
+  def test_copies_proto(self):
+    mon = self.make_monitor()
+    collection = metrics_pb2.MetricsCollection(data=[self.metric('m1')])
+    mon.send(collection)
+    del collection.data[:]
+    mon._cond.release()
+    mon.close()
+    self.assertEqual([['m1']], self.sent)
+
+  def test_queue_full(self):
+    mon = self.make_monitor(max_queue_size=2)
+    for name in ('m1', 'm2', 'm3'):
+      mon.send(self.metric(name))
+    mon._cond.release()
+    mon.close()
+
+    self.assertEqual([['m2', 'm3']], self.sent)
+    self.assertEqual(
+        1, monitors.send_queue_dropped.get({'reason': 'queue_full'}))
+
+  def test_retries(self):
+    self.results = [False, Exception('boom'), True]
+    mon = self.make_monitor(max_backoff_secs=0)
+    mon.send(self.metric('m1'))
+    mon._cond.release()
+    self.wait_for_sends(3)
+    mon.close()
+
+    self.assertEqual([['m1']] * 3, self.sent)
+    self.assertIsNone(
+        monitors.send_queue_dropped.get({'reason': 'send_failed'}))
+
+  def test_gives_up(self):
+    self.results = [False, False]
+    mon = self.make_monitor(max_attempts=2)
+    mon.send(self.metric('m1'))
+    mon._cond.release()
+    self.wait_for_sends(2)
+    mon.close()
+
+    self.assertEqual([['m1']] * 2, self.sent)
+    self.assertEqual(
+        1, monitors.send_queue_dropped.get({'reason': 'send_failed'}))
+
+  def test_no_retries_when_closing(self):
+    self.results = [False]
+    mon = self.make_monitor()
+    mon.send(self.metric('m1'))
+    mon._stop_event.set()
+    mon._cond.release()
+    mon.close()
+
+    self.assertEqual([['m1']], self.sent)
+    self.assertEqual(
+        1, monitors.send_queue_dropped.get({'reason': 'send_failed'}))
+
+  def test_send_after_close(self):
+    mon = self.make_monitor()
+    mon._cond.release()
+    mon.close()
+    mon.send(self.metric('m1'))
+
+    self.assertEqual([], self.sent)
+    self.assertEqual(1, monitors.send_queue_dropped.get({'reason': 'closed'}))
+
 
 class DebugMonitorTest(unittest.TestCase):
 
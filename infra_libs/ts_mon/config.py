@@ -101,6 +101,22 @@ def add_argparse_options(parser):
       default=60,
       help=('automatically push metrics on this interval if '
             '--ts-mon-flush=auto.'))
+  parser.add_argument(
+      '--ts-mon-send-queue-size',
+      type=int,
+      default=0,
+      help=('if positive, send metrics from a background thread, keeping at '
+            'most this many flushed batches queued while the endpoint is '
+            'slow or unavailable. If 0, flush() sends metrics synchronously. '
+            '(default: %(default)s)'))
+  parser.add_argument(
+      '--ts-mon-full-resend-interval-secs',
+      type=int,
+      default=0,
+      help=('if positive, each flush only sends the metric values which '
+            'changed since the previous flush, and every value is resent at '
+            'least this often. If 0, every flush sends every value. '
+            '(default: %(default)s)'))
 
   parser.add_argument(
       '--ts-mon-target-type',
@@ -220,7 +236,14 @@ def process_argparse_options(args):
     logging.error('ts_mon monitoring is disabled because the endpoint provided'
                   ' is invalid or not supported: %s', endpoint)
 
+  if args.ts_mon_send_queue_size > 0:
+    interface.state.global_monitor = monitors.AsyncMonitor(
+        interface.state.global_monitor,
+        max_queue_size=args.ts_mon_send_queue_size)
+
   interface.state.flush_mode = args.ts_mon_flush
+  interface.state.full_resend_interval_secs = (
+      args.ts_mon_full_resend_interval_secs or None)
 
   if args.ts_mon_flush == 'auto':
     interface.state.flush_thread = interface._FlushThread(
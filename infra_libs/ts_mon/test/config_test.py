@@ -149,6 +149,30 @@ class GlobalsTest(auto_stub.TestCase):
         use_instrumented_http=True)
     self.assertIs(interface.state.global_monitor, singleton)
 
+  @mock.patch('infra_libs.ts_mon.common.monitors.PubSubMonitor', autospec=True)
+  def test_send_queue_size(self, fake_monitor):
+    singleton = mock.Mock()
+    fake_monitor.return_value = singleton
+    p = argparse.ArgumentParser()
+    config.add_argparse_options(p)
+    args = p.parse_args(['--ts-mon-credentials', '/path/to/creds.p8.json',
+                         '--ts-mon-endpoint', 'pubsub://mytopic/myproject',
+                         '--ts-mon-send-queue-size', '5'])
+    config.process_argparse_options(args)
+    mon = interface.state.global_monitor
+    self.assertIsInstance(mon, monitors.AsyncMonitor)
+    self.addCleanup(mon.close)
+    self.assertIs(mon._monitor, singleton)
+    self.assertEqual(mon._max_queue_size, 5)
+
+  def test_full_resend_interval(self):
+    p = argparse.ArgumentParser()
+    config.add_argparse_options(p)
+    args = p.parse_args(['--ts-mon-endpoint', 'none',
+                         '--ts-mon-full-resend-interval-secs', '600'])
+    config.process_argparse_options(args)
+    self.assertEqual(600, interface.state.full_resend_interval_secs)
+
   @mock.patch('infra_libs.ts_mon.common.monitors.PubSubMonitor', autospec=True)
   def test_pubsub_without_credentials(self, fake_monitor):
     # safety net, not supposed to be called.